@@ -1,8 +1,9 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, Tuple
 
+from services import admission, result_cache
 from services.file_manager import file_manager
 from core.bates import apply_bates_stamping
 
@@ -21,30 +22,42 @@ class BatesRequest(BaseModel):
 
 
 @router.post("/bates")
-async def bates(req: BatesRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def bates(req: BatesRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     info = file_manager.get_info(req.file_id)
     base_name = info["filename"].rsplit(".", 1)[0] if info else "resultado"
+
+    key = await result_cache.key_for("bates", [req.file_id], req)
+    hit = await result_cache.get(key, f"{base_name}_bates.pdf")
+    if hit is not None:
+        return hit
     color = req.color or (0, 0, 0)
 
-    result = await asyncio.to_thread(
-        apply_bates_stamping,
-        data,
-        req.text_pattern,
-        req.start_doc_idx,
-        req.start_page_idx,
-        req.position,
-        req.margin,
-        req.font_size,
-        color,
-    )
-    result_id = file_manager.store(result, f"{base_name}_bates.pdf")
-
-    return {
+    with file_manager.scratch() as out:
+        size = await admission.run(
+            "bates",
+            [req.file_id],
+            apply_bates_stamping,
+            path,
+            out,
+            req.text_pattern,
+            req.start_doc_idx,
+            req.start_page_idx,
+            req.position,
+            req.margin,
+            req.font_size,
+            color,
+            request=request,
+        )
+        result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_bates.pdf")
+
+    response = {
         "result_file_id": result_id,
         "filename": f"{base_name}_bates.pdf",
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
+    result_cache.put(key, response)
+    return response
@@ -1,10 +1,13 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from contextlib import ExitStack
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
+from services import admission, workers
 from services.file_manager import file_manager
 from core.pdf_ops import images_to_pdf
+from core.photos import image_to_pdf, passthrough_layouts
 
 router = APIRouter(tags=["converter"])
 
@@ -12,25 +15,47 @@ router = APIRouter(tags=["converter"])
 class ConverterRequest(BaseModel):
     file_ids: List[str]
     optimize: bool = True
+    # Encaixa cada página em A4 e reamostra imagens acima desta resolução.
+    target_dpi: Optional[int] = None
 
 
 @router.post("/images-to-pdf")
-async def convert_images(req: ConverterRequest):
+async def convert_images(req: ConverterRequest, request: Request):
     if not req.file_ids:
         raise HTTPException(status_code=400, detail="Nenhuma imagem fornecida")
+    if req.target_dpi is not None and not 36 <= req.target_dpi <= 1200:
+        raise HTTPException(status_code=400, detail="target_dpi deve estar entre 36 e 1200")
 
-    image_list = []
+    paths = []
     for fid in req.file_ids:
-        data = file_manager.get_bytes(fid)
-        if data is None:
+        path = await asyncio.to_thread(file_manager.get_path, fid)
+        if path is None:
             raise HTTPException(status_code=404, detail=f"Arquivo {fid} não encontrado")
-        image_list.append(data)
-
-    result = await asyncio.to_thread(images_to_pdf, image_list, req.optimize)
-    result_id = file_manager.store(result, "imagens_convertidas.pdf")
+        paths.append(path)
+
+    async with admission.admit("convert", req.file_ids, request):
+        # Cabeçalhos lidos fora do event loop, uma vez: o save reaproveita o resultado.
+        layouts = await admission.to_thread(passthrough_layouts, paths, req.target_dpi)
+        # JPEGs comuns entram direto; o resto é convertido em paralelo nos workers,
+        # cada página gravada num scratch (o merge lê do disco, não da memória).
+        pending = [i for i, layout in enumerate(layouts) if layout is None]
+        with ExitStack() as stack:
+            converted = {i: stack.enter_context(file_manager.scratch()) for i in pending}
+            try:
+                await asyncio.gather(*[
+                    workers.run(image_to_pdf, str(paths[i]), str(converted[i]), req.target_dpi) for i in pending
+                ])
+            except RuntimeError as e:
+                raise HTTPException(status_code=400, detail=f"Imagem inválida: {e}")
+
+            out = stack.enter_context(file_manager.scratch())
+            size = await admission.to_thread(
+                images_to_pdf, paths, out, req.optimize, req.target_dpi, converted, layouts,
+            )
+            result_id = await asyncio.to_thread(file_manager.store_file, out, "imagens_convertidas.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": "imagens_convertidas.pdf",
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
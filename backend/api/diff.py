@@ -1,9 +1,11 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 
+from services import admission
 from services.file_manager import file_manager
+from services.preprocess import TEXT_KEY, cached
 from core.diff import compare_pdfs
 
 router = APIRouter(tags=["diff"])
@@ -15,13 +17,17 @@ class DiffRequest(BaseModel):
 
 
 @router.post("/diff")
-async def diff(req: DiffRequest):
-    data_a = file_manager.get_bytes(req.file_id_a)
-    data_b = file_manager.get_bytes(req.file_id_b)
+async def diff(req: DiffRequest, request: Request):
+    path_a = await asyncio.to_thread(file_manager.get_path, req.file_id_a)
+    path_b = await asyncio.to_thread(file_manager.get_path, req.file_id_b)
 
-    if data_a is None or data_b is None:
+    if path_a is None or path_b is None:
         raise HTTPException(status_code=404, detail="Um ou ambos os arquivos não foram encontrados")
 
-    html = await asyncio.to_thread(compare_pdfs, data_a, data_b)
+    # Texto das páginas já extraído no pré-processamento, quando houver.
+    pages_a, pages_b = cached(req.file_id_a, TEXT_KEY), cached(req.file_id_b, TEXT_KEY)
+    html = await admission.run(
+        "diff", [req.file_id_a, req.file_id_b], compare_pdfs, path_a, path_b, pages_a, pages_b, request=request,
+    )
 
     return HTMLResponse(content=html)
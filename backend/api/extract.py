@@ -1,11 +1,12 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 
+from services import admission
 from services.file_manager import file_manager
 from core.pdf_ops import extract_pages, merge_pdfs
-from core.utils import parse_page_input
+from core.utils import open_pdf, parse_page_input
 
 router = APIRouter(tags=["extract"])
 
@@ -21,9 +22,9 @@ class ExtractRequest(BaseModel):
 
 
 @router.post("/extract")
-async def extract(req: ExtractRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def extract(req: ExtractRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     info = file_manager.get_info(req.file_id)
@@ -31,29 +32,29 @@ async def extract(req: ExtractRequest):
 
     # Extract multiple named segments (legal pieces) → single merged PDF
     if req.segments:
-        parts = []
-        for seg in req.segments:
-            pages = list(range(seg["start"], seg["end"] + 1))
-            part_bytes = await asyncio.to_thread(
-                extract_pages, data, pages, req.optimize, req.password
-            )
-            parts.append(part_bytes)
+        with file_manager.scratch("") as work, file_manager.scratch() as out:
+            work.mkdir()
+            parts = []
+            async with admission.admit("extract", [req.file_id], request):
+                for i, seg in enumerate(req.segments):
+                    pages = list(range(seg["start"], seg["end"] + 1))
+                    part = work / f"{i:04d}.pdf"
+                    await admission.to_thread(extract_pages, path, part, pages, req.optimize, req.password)
+                    parts.append(part)
 
-        merged_bytes = await asyncio.to_thread(merge_pdfs, parts, req.optimize)
-        result_id = file_manager.store(merged_bytes, f"{base_name}_pecas.pdf", "application/pdf")
+                size = await admission.to_thread(merge_pdfs, parts, out, req.optimize)
+            result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_pecas.pdf", "application/pdf")
         return {
             "result_file_id": result_id,
             "filename": f"{base_name}_pecas.pdf",
             "segments": len(req.segments),
-            "size_bytes": len(merged_bytes),
+            "size_bytes": size,
         }
 
     # Resolve page indices
     if req.pages:
-        import fitz
-        doc = fitz.open(stream=data, filetype="pdf")
-        page_indices = parse_page_input(req.pages, doc.page_count)
-        doc.close()
+        with open_pdf(path) as doc:
+            page_indices = parse_page_input(req.pages, doc.page_count)
     elif req.page_indices:
         page_indices = req.page_indices
     else:
@@ -62,12 +63,13 @@ async def extract(req: ExtractRequest):
     if not page_indices:
         raise HTTPException(status_code=400, detail="Nenhuma página válida selecionada")
 
-    result = await asyncio.to_thread(extract_pages, data, page_indices, req.optimize, req.password)
-    result_id = file_manager.store(result, f"{base_name}_extraido.pdf")
+    with file_manager.scratch() as out:
+        size = await admission.run("extract", [req.file_id], extract_pages, path, out, page_indices, req.optimize, req.password, request=request)
+        result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_extraido.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": f"{base_name}_extraido.pdf",
         "pages_extracted": len(page_indices),
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
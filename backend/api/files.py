@@ -1,15 +1,45 @@
+import re
+import asyncio
 import logging
 import fitz
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import Response
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
 
-from services.file_manager import file_manager
+from auth import current_user_email
+from config import settings
+from core.outline import OutlineIndex
+from services import admission
+from services.file_manager import StorageLimitError, file_manager
+from services.preprocess import outline_for, preprocessor, store_outline
+from services.single_flight import flights
+from services.upload_sessions import OffsetMismatch, SessionBusy, upload_sessions
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["files"])
 
 
+def _is_pdf(content_type: str, filename: Optional[str]) -> bool:
+    return content_type == "application/pdf" or bool(filename and filename.lower().endswith(".pdf"))
+
+
+def _pdf_summary(file_id: str, *open_args, **open_kwargs) -> dict:
+    """Pages and bookmarks of an uploaded PDF (zeros if it can't be parsed).
+
+    The outline index is cached here, so metadata, scan and split never re-read the TOC.
+    """
+    try:
+        with fitz.open(*open_args, **open_kwargs) as doc:
+            index = OutlineIndex.from_doc(doc)
+            locked = doc.needs_pass
+        if not locked:
+            store_outline(file_id, index)
+        return {"pages": index.page_count, "bookmarks": index.flat()}
+    except Exception:
+        return {"pages": 0, "bookmarks": []}
+
+
 @router.post("/upload")
 async def upload_files(files: List[UploadFile] = File(...)):
     """Upload one or more files. Returns file_id and metadata for each."""
@@ -18,31 +48,18 @@ async def upload_files(files: List[UploadFile] = File(...)):
         for f in files:
             data = await f.read()
             content_type = f.content_type or "application/octet-stream"
-            file_id = file_manager.store(data, f.filename or "upload", content_type)
+            file_id = await asyncio.to_thread(file_manager.store, data, f.filename or "upload", content_type)
 
             meta = {"file_id": file_id, "filename": f.filename, "size_bytes": len(data)}
 
-            if content_type == "application/pdf" or (f.filename and f.filename.lower().endswith(".pdf")):
-                try:
-                    doc = fitz.open(stream=data, filetype="pdf")
-                    toc = doc.get_toc(simple=False)
-                    bookmarks = []
-                    for i, item in enumerate(toc):
-                        lvl, title, page1 = item[0], item[1], item[2]
-                        bookmarks.append({
-                            "level": lvl,
-                            "title": title,
-                            "page": page1,
-                        })
-                    meta["pages"] = doc.page_count
-                    meta["bookmarks"] = bookmarks
-                    doc.close()
-                except Exception:
-                    meta["pages"] = 0
-                    meta["bookmarks"] = []
+            if _is_pdf(content_type, f.filename):
+                meta.update(_pdf_summary(file_id, stream=data, filetype="pdf"))
+                preprocessor.enqueue(file_id)
 
             results.append(meta)
 
+    except StorageLimitError:
+        raise  # 507 pelo handler do main.py, não um 500 genérico
     except Exception as e:
         logger.error(f"Upload error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro no upload: {str(e)}")
@@ -50,55 +67,218 @@ async def upload_files(files: List[UploadFile] = File(...)):
     return results
 
 
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single ``Range: bytes=`` spec into an inclusive (start, end).
+
+    Returns None for headers we don't honour (multi-range, other units), in
+    which case the full body is sent. Raises 416 for unsatisfiable ranges.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Sufixo: os últimos N bytes ("bytes=-0" não tem como ser atendido).
+        length = int(last)
+        start, end = (max(size - length, 0) if length else size), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Faixa fora do arquivo",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+# Faixas de um backend remoto saem em pedaços deste tamanho (GET com Range cada).
+RANGE_CHUNK_BYTES = 1024 * 1024
+
+
+async def _range_body(file_id: str, first: bytes, start: int, end: int):
+    yield first
+    pos = start + len(first)
+    while pos <= end:
+        data = await asyncio.to_thread(file_manager.read_range, file_id, pos, min(RANGE_CHUNK_BYTES, end - pos + 1))
+        if not data:
+            return  # apagado no meio da transferência
+        yield data
+        pos += len(data)
+
+
 @router.get("/download/{file_id}")
-async def download_file(file_id: str):
-    """Download a processed file by ID."""
-    data = file_manager.get_bytes(file_id)
-    if data is None:
+async def download_file(file_id: str, request: Request):
+    """Download a processed file by ID. Honours a single ``Range`` for resumed transfers."""
+    info = await asyncio.to_thread(file_manager.get_info, file_id)
+    if info is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
 
-    info = file_manager.get_info(file_id)
-    filename = info["filename"] if info else "download"
-    content_type = info["content_type"] if info else "application/octet-stream"
+    headers = {
+        "Content-Disposition": f'attachment; filename="{info["filename"]}"',
+        "Accept-Ranges": "bytes",
+    }
+    size = info["size"]
+    if not file_manager.storage.is_local and "range" in request.headers:
+        # Retomada no S3: só a faixa pedida, em pedaços, sem baixar o objeto inteiro nem bufferizá-la.
+        byte_range = _parse_range(request.headers["range"], size)
+        if byte_range is not None:
+            start, end = byte_range
+            first = await asyncio.to_thread(
+                file_manager.read_range, file_id, start, min(RANGE_CHUNK_BYTES, end - start + 1),
+            )
+            if first is None:
+                raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _range_body(file_id, first, start, end), status_code=206, media_type=info["content_type"], headers=headers,
+            )
 
-    return Response(
-        content=data,
-        media_type=content_type,
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    path = await asyncio.to_thread(file_manager.get_path, file_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado ou expirado")
+    # O FileResponse atende o Range sozinho: 206 lido do disco em blocos, 416 fora do arquivo.
+    return FileResponse(path, media_type=info["content_type"], headers=headers)
+
+
+def _read_metadata(file_id: str) -> dict:
+    index = outline_for(file_id)
+    if index is None:
+        raise FileNotFoundError(file_id)
+    return {"pages": index.page_count, "bookmarks": index.flat()}
 
 
 @router.get("/metadata/{file_id}")
 async def get_metadata(file_id: str):
     """Get metadata for an uploaded PDF."""
-    data = file_manager.get_bytes(file_id)
-    if data is None:
+    path = await asyncio.to_thread(file_manager.get_path, file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     info = file_manager.get_info(file_id)
     try:
-        doc = fitz.open(stream=data, filetype="pdf")
-        toc = doc.get_toc(simple=False)
-        bookmarks = [
-            {"level": item[0], "title": item[1], "page": item[2]}
-            for item in toc
-        ]
-        result = {
-            "file_id": file_id,
-            "filename": info["filename"] if info else "unknown",
-            "pages": doc.page_count,
-            "size_bytes": len(data),
-            "bookmarks": bookmarks,
-        }
-        doc.close()
-        return result
+        # Índice do sumário já em memória ou no cache (upload/pré-processamento) na maioria das vezes.
+        summary = await flights.do(("metadata", file_id), lambda: admission.run("metadata", [file_id], _read_metadata, file_id))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"PDF inválido: {e}")
+    return {
+        "file_id": file_id,
+        "filename": info["filename"] if info else "unknown",
+        "pages": summary["pages"],
+        "size_bytes": path.stat().st_size,
+        "bookmarks": summary["bookmarks"],
+    }
 
 
 @router.delete("/files/{file_id}")
 async def delete_file(file_id: str):
     """Delete a temporary file."""
-    if file_manager.delete(file_id):
+    if await asyncio.to_thread(file_manager.delete, file_id):
         return {"status": "deleted"}
     raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+
+# --- Upload resumível ---
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    content_type: str = "application/pdf"
+
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None
+
+
+def _session_or_404(upload_id: str) -> dict:
+    session = upload_sessions.get(upload_id)
+    # Sessões de outro usuário se comportam como inexistentes.
+    if session is None or (session["owner"] and session["owner"] != current_user_email.get()):
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+    return session
+
+
+def _session_status(session: dict) -> dict:
+    return {
+        "upload_id": session["upload_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "offset": session["received"],
+    }
+
+
+@router.post("/uploads")
+async def create_upload_session(req: UploadSessionRequest):
+    """Open a resumable upload session; chunks are then PUT at increasing offsets."""
+    if req.size <= 0:
+        raise HTTPException(status_code=400, detail="Tamanho inválido")
+    if req.size > settings.max_upload_size_mb * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Arquivo maior que {settings.max_upload_size_mb} MB")
+    session = upload_sessions.create(req.filename, req.size, req.content_type, current_user_email.get())
+    return _session_status(session)
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """Current confirmed offset — where a dropped client resumes from."""
+    return _session_status(_session_or_404(upload_id))
+
+
+@router.put("/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, offset: int, request: Request):
+    """Append the raw request body at ``offset`` (must equal the confirmed offset)."""
+    _session_or_404(upload_id)
+    try:
+        received = await upload_sessions.append(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+    except SessionBusy:
+        raise HTTPException(status_code=409, detail="Outro envio desta sessão está em andamento")
+    except OffsetMismatch as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Offset divergente; retome de {e.expected}",
+            headers={"Upload-Offset": str(e.expected)},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"upload_id": upload_id, "offset": received}
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, req: UploadCompleteRequest):
+    """Verify size (and optional SHA-256) and turn the session into a regular file_id."""
+    _session_or_404(upload_id)
+    try:
+        file_id, digest, session = await upload_sessions.finalize(upload_id, req.sha256)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+    except SessionBusy:
+        raise HTTPException(status_code=409, detail="Outro envio desta sessão está em andamento")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    meta = {"file_id": file_id, "filename": session["filename"], "size_bytes": session["size"], "sha256": digest}
+    if _is_pdf(session["content_type"], session["filename"]):
+        path = await asyncio.to_thread(file_manager.get_path, file_id)
+        meta.update(await asyncio.to_thread(_pdf_summary, file_id, str(path)))
+        preprocessor.enqueue(file_id)
+    return meta
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Discard an unfinished upload session."""
+    _session_or_404(upload_id)
+    try:
+        upload_sessions.abort(upload_id)
+    except SessionBusy:
+        raise HTTPException(status_code=409, detail="Outro envio desta sessão está em andamento")
+    return {"status": "deleted"}
@@ -1,8 +1,9 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 
+from services import admission
 from services.file_manager import file_manager
 from core.pdf_ops import merge_pdfs
 
@@ -16,22 +17,23 @@ class MergeRequest(BaseModel):
 
 
 @router.post("/merge")
-async def merge(req: MergeRequest):
+async def merge(req: MergeRequest, request: Request):
     if len(req.file_ids) < 2:
         raise HTTPException(status_code=400, detail="Pelo menos 2 arquivos são necessários")
 
-    pdf_list = []
+    sources = []
     for fid in req.file_ids:
-        data = file_manager.get_bytes(fid)
-        if data is None:
+        path = await asyncio.to_thread(file_manager.get_path, fid)
+        if path is None:
             raise HTTPException(status_code=404, detail=f"Arquivo {fid} não encontrado")
-        pdf_list.append(data)
+        sources.append(path)
 
-    result = await asyncio.to_thread(merge_pdfs, pdf_list, req.optimize, req.password)
-    result_id = file_manager.store(result, "mesclado.pdf")
+    with file_manager.scratch() as out:
+        size = await admission.run("merge", req.file_ids, merge_pdfs, sources, out, req.optimize, req.password, request=request)
+        result_id = await asyncio.to_thread(file_manager.store_file, out, "mesclado.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": "mesclado.pdf",
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
@@ -1,11 +1,19 @@
 import asyncio
 import fitz
-from fastapi import APIRouter, HTTPException
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
+from services import admission, result_cache, workers
 from services.file_manager import file_manager
-from core.pdf_ops import optimize_pdf
+from core.analysis import analyze_pdf
+from core.pdf_ops import save_incremental, save_pdf
+from core.resources import category_sizes
+from core.utils import open_pdf
+from core.target_size import (
+    LADDER, estimate_sizes, image_inventory, ladder_options, pick_step, sample_images, trial_encode,
+)
 from config import ENCRYPT_AES_256, PERM_PRINT, PERM_COPY, PERM_ANNOTATE
 
 router = APIRouter(tags=["optimize"])
@@ -13,30 +21,47 @@ router = APIRouter(tags=["optimize"])
 PROFILES = {
     "light": {
         "garbage": 2, "deflate": True, "clean": True,
-        "recompress_images": True, "jpeg_quality": 85, "max_image_dim": 2200,
+        "dedupe_images": True, "recompress_images": True, "jpeg_quality": 85, "max_image_dim": 2200,
     },
     "recommended": {
         "garbage": 3, "deflate": True, "clean": True, "deflate_images": True, "deflate_fonts": True,
-        "recompress_images": True, "jpeg_quality": 75, "max_image_dim": 1700,
+        "dedupe_images": True, "recompress_images": True, "jpeg_quality": 75, "max_image_dim": 1700,
+        "reduce_colors": "gray", "subset_fonts": True, "strip_xmp": True, "strip_thumbnails": True,
     },
     "maximum": {
         "garbage": 4, "deflate": True, "clean": True, "deflate_images": True, "deflate_fonts": True,
-        "recompress_images": True, "jpeg_quality": 60, "max_image_dim": 1240,
+        "dedupe_images": True, "recompress_images": True, "jpeg_quality": 60, "max_image_dim": 1240,
+        "reduce_colors": "bilevel", "subset_fonts": True, "strip_xmp": True, "strip_thumbnails": True,
+        "strip_attachments": True,
     },
 }
 
 
+# Perfil sem compressão: só anotações/metadados, acrescentados ao original.
+EDIT_ONLY = "none"
+
+# Opções que mudam o conteúdo, não só a codificação. No modo target_mb elas vêm
+# do perfil pedido: o alvo de tamanho não apaga anexos nem binariza páginas por
+# conta própria, só escolhe resolução e qualidade das imagens.
+CONTENT_OPTIONS = ("reduce_colors", "strip_attachments")
+
+
 class OptimizeRequest(BaseModel):
     file_id: str
-    profile: str = "recommended"  # light, recommended, maximum
+    profile: str = "recommended"  # light, recommended, maximum, none
     password: Optional[str] = None
     remove_annotations: bool = False
     metadata: Optional[Dict[str, str]] = None  # {title, author, subject}
+    # Tamanho máximo desejado (ex.: limite do PJe): resolução e qualidade das
+    # imagens vêm do degrau escolhido; cores e anexos continuam os de `profile`.
+    target_mb: Optional[float] = None
+
 
+# Saves completos no modo target_mb, se a estimativa errar para baixo.
+MAX_TARGET_SAVES = 3
 
-def _optimize(data: bytes, req: OptimizeRequest) -> bytes:
-    doc = fitz.open(stream=data, filetype="pdf")
 
+def _apply_edits(doc: fitz.Document, req: OptimizeRequest):
     if req.remove_annotations:
         for page in doc:
             annots = list(page.annots()) if page.annots() else []
@@ -48,7 +73,11 @@ def _optimize(data: bytes, req: OptimizeRequest) -> bytes:
         current.update({k: v for k, v in req.metadata.items() if v})
         doc.set_metadata(current)
 
-    opts = dict(PROFILES.get(req.profile, PROFILES["recommended"]))
+
+def _optimize(src: Path, dst: Path, req: OptimizeRequest, overrides: Optional[Dict[str, Any]] = None) -> int:
+    opts = {} if req.profile == EDIT_ONLY else dict(PROFILES.get(req.profile, PROFILES["recommended"]))
+    if overrides:
+        opts.update(overrides)
 
     if req.password:
         opts.update({
@@ -58,29 +87,178 @@ def _optimize(data: bytes, req: OptimizeRequest) -> bytes:
             "permissions": PERM_PRINT | PERM_COPY | PERM_ANNOTATE,
         })
 
-    return optimize_pdf(doc, opts)
+    with open_pdf(src) as doc:
+        _apply_edits(doc, req)
+        return save_pdf(doc, dst, opts)
+
+
+def _target_options(profile: str, step: int) -> Dict[str, Any]:
+    """Estrutura do perfil máximo, conteúdo do perfil pedido e imagens do degrau ``step``."""
+    opts = {k: v for k, v in PROFILES["maximum"].items() if k not in CONTENT_OPTIONS}
+    chosen = PROFILES.get(profile, {})
+    opts.update({k: chosen[k] for k in CONTENT_OPTIONS if k in chosen})
+    opts.update(ladder_options(step))
+    return opts
+
+
+def _edit_only(src: Path, dst: Path, req: OptimizeRequest) -> int:
+    """Annotations/metadata only: appended as an incremental update when possible.
+
+    Adding a password rewrites every object, so that case (and files that
+    can't take an incremental update) goes through the full save.
+    """
+    if not req.password:
+        size = save_incremental(src, dst, lambda doc: _apply_edits(doc, req))
+        if size is not None:
+            return size
+    return _optimize(src, dst, req)
+
+
+def _inventory(path: str) -> tuple[list, int]:
+    doc = fitz.open(path)
+    try:
+        return image_inventory(doc)
+    finally:
+        doc.close()
+
+
+def _category_savings(original: Path, result: Path) -> Dict[str, Dict[str, int]]:
+    """Bytes per category (images, fonts, metadata...) before and after."""
+    sizes = []
+    for path in (original, result):
+        doc = open_pdf(path)
+        try:
+            sizes.append(category_sizes(doc, path.stat().st_size) if not doc.needs_pass else None)
+        finally:
+            doc.close()
+    before, after = sizes
+    if before is None or after is None:
+        return {}
+    return {
+        name: {"original_bytes": before[name], "bytes": after[name]}
+        for name in before
+        if before[name] or after[name]
+    }
+
+
+async def _optimize_to_target(path: Path, work: Path, req: OptimizeRequest) -> tuple[Path, Dict[str, Any]]:
+    """Estimate per-step sizes from sampled trial encodes, then save at the mildest step that fits.
+
+    Falls back to harsher steps (re-scaled by the observed estimate error) if
+    the save lands over the target; reports the smallest result otherwise.
+    Each attempt is saved under ``work``; the returned path is the smallest one.
+    """
+    target = int(req.target_mb * 1024 * 1024)
+    inventory, duplicate_bytes = await admission.to_thread(_inventory, str(path))
+    sample = sample_images(inventory)
+    reduce_colors = PROFILES.get(req.profile, {}).get("reduce_colors")
+    trials = await asyncio.gather(*[
+        workers.run(trial_encode, str(path), [xref for xref, _ in batch], LADDER, reduce_colors)
+        for batch in workers.batches(sample, workers.pool_size())
+    ]) if sample else []
+    estimates = estimate_sizes(path.stat().st_size, inventory, list(trials), duplicate_bytes)
+
+    last = len(LADDER) - 1
+    step = pick_step(estimates, target)
+    step = last if step is None else step
+    best: Optional[tuple[Path, int, int]] = None
+    attempts = 0
+    while attempts < MAX_TARGET_SAVES:
+        attempts += 1
+        attempt = work / f"{attempts}.pdf"
+        size = await admission.to_thread(_optimize, path, attempt, req, _target_options(req.profile, step))
+        if best is None or size < best[1]:
+            best = (attempt, size, step)
+        if size <= target or step == last:
+            break
+        error = size / max(estimates[step], 1)
+        corrected = pick_step([round(e * error) for e in estimates], target, step + 1)
+        step = last if corrected is None else corrected
+
+    result, size, step = best
+    max_dim, quality = LADDER[step]
+    return result, {
+        "target_bytes": target,
+        "target_met": size <= target,
+        "jpeg_quality": quality,
+        "max_image_dim": max_dim,
+        "estimated_size_bytes": estimates[step],
+        "attempts": attempts,
+    }
 
 
 @router.post("/optimize")
-async def optimize(req: OptimizeRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def optimize(req: OptimizeRequest, request: Request):
+    if req.target_mb is not None and req.target_mb <= 0:
+        raise HTTPException(status_code=400, detail="target_mb deve ser positivo")
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
-
     info = file_manager.get_info(req.file_id)
     base_name = info["filename"].rsplit(".", 1)[0] if info else "resultado"
 
-    result = await asyncio.to_thread(_optimize, data, req)
-    result_id = file_manager.store(result, f"{base_name}_otimizado.pdf")
+    key = await result_cache.key_for("optimize", [req.file_id], req)
+    hit = await result_cache.get(key, f"{base_name}_otimizado.pdf")
+    if hit is not None:
+        return hit
+
+    if req.target_mb:
+        # Amostras de vários degraus mais um ou mais saves: custa como o perfil máximo.
+        op = "optimize:maximum"
+    elif f"optimize:{req.profile}" in admission.OPERATIONS:
+        op = f"optimize:{req.profile}"
+    else:
+        op = "optimize:recommended"
 
-    original_size = len(data)
-    new_size = len(result)
+    target_info: Dict[str, Any] = {}
+    with file_manager.scratch("") as work:
+        work.mkdir()
+        async with admission.admit(op, [req.file_id], request):
+            if req.target_mb:
+                result, target_info = await _optimize_to_target(path, work, req)
+            else:
+                result = work / "otimizado.pdf"
+                await admission.to_thread(_edit_only if req.profile == EDIT_ONLY else _optimize, path, result, req)
+            categories = await admission.to_thread(_category_savings, path, result)
+        new_size = result.stat().st_size
+        result_id = await asyncio.to_thread(file_manager.store_file, result, f"{base_name}_otimizado.pdf")
+
+    original_size = path.stat().st_size
     reduction = ((original_size - new_size) / original_size * 100) if original_size > 0 else 0
 
-    return {
+    response = {
         "result_file_id": result_id,
         "filename": f"{base_name}_otimizado.pdf",
         "original_size_bytes": original_size,
         "size_bytes": new_size,
         "reduction_percent": round(reduction, 1),
+        "categories": categories,
+        **target_info,
     }
+    result_cache.put(key, response)
+    return response
+
+
+def _analyze(path: Path) -> Optional[Dict[str, Any]]:
+    doc = fitz.open(path)
+    try:
+        if doc.needs_pass:
+            return None
+        return analyze_pdf(doc, path.stat().st_size, PROFILES)
+    finally:
+        doc.close()
+
+
+@router.get("/optimize/{file_id}/analysis")
+async def analyze(file_id: str):
+    """Read-only size breakdown and per-profile size estimates (no decoding, no save)."""
+    path = await asyncio.to_thread(file_manager.get_path, file_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    try:
+        analysis = await admission.run("analysis", [file_id], _analyze, path)
+    except (fitz.FileDataError, RuntimeError):
+        raise HTTPException(status_code=400, detail="Arquivo não é um PDF válido")
+    if analysis is None:
+        raise HTTPException(status_code=400, detail="PDF protegido por senha")
+    return {"file_id": file_id, **analysis}
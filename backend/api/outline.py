@@ -0,0 +1,59 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+
+from core.outline import ROOT, OutlineIndex
+from services import admission
+from services.file_manager import file_manager
+from services.preprocess import outline_for
+from services.single_flight import flights
+
+router = APIRouter(tags=["outline"])
+
+
+async def _index(file_id: str) -> OutlineIndex:
+    if await asyncio.to_thread(file_manager.get_path, file_id) is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    try:
+        index = await flights.do(("outline", file_id), lambda: admission.run("outline", [file_id], outline_for, file_id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"PDF inválido: {e}")
+    if index is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    return index
+
+
+@router.get("/outline/{file_id}")
+async def get_outline(
+    file_id: str,
+    parent: int = Query(ROOT, ge=ROOT),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(200, ge=1, le=1000),
+):
+    """Lazy outline tree: one page of the direct children of ``parent`` (-1 = top level).
+
+    Each node carries its page range and ``child_count``, so the UI expands
+    huge outlines one level at a time.
+    """
+    index = await _index(file_id)
+    if parent != ROOT and parent >= len(index):
+        raise HTTPException(status_code=404, detail="Marcador não encontrado")
+    return {
+        "file_id": file_id,
+        "page_count": index.page_count,
+        "entries": len(index),
+        "parent": parent,
+        "total": len(index.children.get(parent, [])),
+        "offset": offset,
+        "children": index.children_of(parent, offset, limit),
+    }
+
+
+@router.get("/outline/{file_id}/page/{page}")
+async def outline_at_page(file_id: str, page: int):
+    """Path of outline nodes (top level down to the deepest) covering a 0-based page."""
+    index = await _index(file_id)
+    if not 0 <= page < index.page_count:
+        raise HTTPException(status_code=400, detail="Página fora do documento")
+    return {"file_id": file_id, "page": page, "path": index.at_page(page)}
@@ -1,8 +1,9 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 
+from services import admission
 from services.file_manager import file_manager
 from core.redact import redact_text_matches
 
@@ -17,9 +18,9 @@ class RedactRequest(BaseModel):
 
 
 @router.post("/redact")
-async def redact(req: RedactRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def redact(req: RedactRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     if not req.keywords and not req.patterns:
@@ -28,18 +29,23 @@ async def redact(req: RedactRequest):
     info = file_manager.get_info(req.file_id)
     base_name = info["filename"].rsplit(".", 1)[0] if info else "resultado"
 
-    result, count = await asyncio.to_thread(
-        redact_text_matches,
-        data,
-        req.keywords,
-        req.ignore_case,
-        req.patterns if req.patterns else None,
-    )
-    result_id = file_manager.store(result, f"{base_name}_tarjado.pdf")
+    with file_manager.scratch() as out:
+        size, count = await admission.run(
+            "redact",
+            [req.file_id],
+            redact_text_matches,
+            path,
+            out,
+            req.keywords,
+            req.ignore_case,
+            req.patterns if req.patterns else None,
+            request=request,
+        )
+        result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_tarjado.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": f"{base_name}_tarjado.pdf",
         "redactions_applied": count,
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
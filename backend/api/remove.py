@@ -1,11 +1,12 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 
+from services import admission
 from services.file_manager import file_manager
 from core.pdf_ops import remove_pages
-from core.utils import parse_page_input
+from core.utils import open_pdf, parse_page_input
 
 router = APIRouter(tags=["remove"])
 
@@ -19,15 +20,13 @@ class RemoveRequest(BaseModel):
 
 
 @router.post("/remove")
-async def remove(req: RemoveRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def remove(req: RemoveRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
-    import fitz
-    doc = fitz.open(stream=data, filetype="pdf")
-    total = doc.page_count
-    doc.close()
+    with open_pdf(path) as doc:
+        total = doc.page_count
 
     if req.pages:
         page_indices = parse_page_input(req.pages, total)
@@ -45,13 +44,14 @@ async def remove(req: RemoveRequest):
     info = file_manager.get_info(req.file_id)
     base_name = info["filename"].rsplit(".", 1)[0] if info else "resultado"
 
-    result = await asyncio.to_thread(remove_pages, data, page_indices, req.optimize, req.password)
-    result_id = file_manager.store(result, f"{base_name}_editado.pdf")
+    with file_manager.scratch() as out:
+        size = await admission.run("remove", [req.file_id], remove_pages, path, out, page_indices, req.optimize, req.password, request=request)
+        result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_editado.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": f"{base_name}_editado.pdf",
         "pages_removed": len(page_indices),
         "pages_remaining": total - len(page_indices),
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
@@ -1,8 +1,9 @@
 import asyncio
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Dict
 
+from services import admission
 from services.file_manager import file_manager
 from core.pdf_ops import rotate_pages
 
@@ -12,13 +13,14 @@ router = APIRouter(tags=["rotate"])
 class RotateRequest(BaseModel):
     file_id: str
     rotations: Dict[int, int]  # {page_index: angle}
-    optimize: bool = True
+    # False: só acrescenta as rotações ao original (rápido); True: reescreve e comprime tudo.
+    optimize: bool = False
 
 
 @router.post("/rotate")
-async def rotate(req: RotateRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def rotate(req: RotateRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     if not req.rotations:
@@ -30,11 +32,12 @@ async def rotate(req: RotateRequest):
     # Convert string keys to int (JSON sends string keys)
     rotations = {int(k): v for k, v in req.rotations.items()}
 
-    result = await asyncio.to_thread(rotate_pages, data, rotations, req.optimize)
-    result_id = file_manager.store(result, f"{base_name}_rotacionado.pdf")
+    with file_manager.scratch() as out:
+        size = await admission.run("rotate", [req.file_id], rotate_pages, path, out, rotations, req.optimize, request=request)
+        result_id = await asyncio.to_thread(file_manager.store_file, out, f"{base_name}_rotacionado.pdf")
 
     return {
         "result_file_id": result_id,
         "filename": f"{base_name}_rotacionado.pdf",
-        "size_bytes": len(result),
+        "size_bytes": size,
     }
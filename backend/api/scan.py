@@ -1,29 +1,54 @@
+import json
 import asyncio
-import fitz
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from typing import Callable, Dict, List
 
+from config import LEGAL_KEYWORDS, LEGAL_REGEX_PATTERNS
+from services import admission, workers
+from services.doc_pool import doc_pool
 from services.file_manager import file_manager
-from core.pdf_scanner import smart_scan, get_bookmark_ranges
+from services.preprocess import OUTLINE_KEY, SCAN_KEY, cached, outline_for, source_path
+from services.single_flight import flights
+from core.pdf_scanner import smart_scan, scan_path
 
 router = APIRouter(tags=["scan"])
 
+# Teto de arquivos por triagem em lote (um pacote de processo raramente passa de 100).
+MAX_BULK_FILES = 200
+# Ordem das categorias no índice agregado; as desconhecidas vão ao final.
+CATEGORY_ORDER = list(dict.fromkeys([*LEGAL_KEYWORDS, *LEGAL_REGEX_PATTERNS]))
+
+
+class BulkScanRequest(BaseModel):
+    file_ids: List[str]
+
 
 @router.post("/scan")
 async def scan(file_id: str):
-    """Smart scan for legal document pieces."""
-    data = file_manager.get_bytes(file_id)
-    if data is None:
+    """Smart scan for legal document pieces (precomputed after upload when possible)."""
+    path = await asyncio.to_thread(source_path, file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
-    def _scan(pdf_bytes: bytes):
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        pieces = smart_scan(doc)
-        bookmarks = get_bookmark_ranges(doc)
-        page_count = doc.page_count
-        doc.close()
-        return pieces, bookmarks, page_count
+    pre = cached(file_id, SCAN_KEY)
+    if pre is not None:
+        return {"file_id": file_id, **pre}
 
-    pieces, bookmarks, page_count = await asyncio.to_thread(_scan, data)
+    def _scan(pdf_path):
+        outline = outline_for(file_id)
+        if outline is None:
+            raise FileNotFoundError(file_id)  # apagado ou expirado depois da validação
+        with doc_pool.borrow(file_id, pdf_path) as doc:
+            return smart_scan(doc, outline=outline), outline.ranges(), doc.page_count
+
+    try:
+        # Cliques repetidos enquanto o scan roda esperam a mesma execução.
+        pieces, bookmarks, page_count = await flights.do(
+            ("scan", file_id), lambda: admission.run("scan", [file_id], _scan, path),
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     return {
         "file_id": file_id,
@@ -31,3 +56,116 @@ async def scan(file_id: str):
         "pieces": pieces,
         "bookmarks": bookmarks,
     }
+
+
+def _piece_index(files: List[dict]) -> Dict[str, List[dict]]:
+    """Peças de todos os arquivos agrupadas por categoria (na ordem do pacote e das páginas)."""
+    index: Dict[str, List[dict]] = {}
+    for entry in files:
+        for piece in entry["pieces"]:
+            category = piece.get("category") or piece["title"]
+            index.setdefault(category, []).append({
+                "file_id": entry["file_id"],
+                "filename": entry["filename"],
+                "title": piece["title"],
+                "start_page_0_idx": piece["start_page_0_idx"],
+                "end_page_0_idx": piece["end_page_0_idx"],
+                "unique_id": piece.get("unique_id", piece["id"]),
+                "preselect": piece.get("preselect", False),
+            })
+    rank = {category: i for i, category in enumerate(CATEGORY_ORDER)}
+    return dict(sorted(index.items(), key=lambda item: rank.get(item[0], len(rank))))
+
+
+async def _stream_bulk_scan(request: Request, file_ids: List[str], release: Callable[[], None]):
+    """NDJSON: uma linha por arquivo, na ordem em que terminam; a última é o índice agregado.
+
+    Arquivos já escaneados no pré-processamento saem primeiro. Os demais vão
+    para o pool de processos com no máximo ``2 × workers`` em voo; se o
+    cliente desconecta, os pendentes são cancelados.
+    """
+    file_ids = list(dict.fromkeys(file_ids))
+    results: Dict[str, dict] = {}
+    errors = 0
+    in_flight: Dict[asyncio.Future, str] = {}
+
+    def file_line(file_id: str, scanned: dict) -> str:
+        info = file_manager.get_info(file_id)
+        entry = {"type": "file", "file_id": file_id, "filename": info["filename"] if info else file_id, **scanned}
+        results[file_id] = entry
+        return json.dumps(entry) + "\n"
+
+    try:
+        pending = []
+        for file_id in file_ids:
+            pre = cached(file_id, SCAN_KEY)
+            if pre is not None:
+                yield file_line(file_id, pre)
+            else:
+                pending.append(file_id)
+
+        window = 2 * workers.pool_size()
+        queue = iter(pending)
+
+        async def submit():
+            for file_id in queue:
+                path = await asyncio.to_thread(source_path, file_id)
+                if path is None:
+                    continue  # apagado ou expirado depois da validação
+                outline = cached(file_id, OUTLINE_KEY)
+                in_flight[asyncio.ensure_future(workers.run(scan_path, str(path), outline))] = file_id
+                if len(in_flight) >= window:
+                    return
+
+        await submit()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            if await request.is_disconnected():
+                return
+            for fut in done:
+                file_id = in_flight.pop(fut)
+                try:
+                    scanned = fut.result()
+                except Exception as e:
+                    errors += 1
+                    yield json.dumps({"type": "error", "file_id": file_id, "detail": f"PDF inválido: {e}"}) + "\n"
+                    continue
+                # O próximo /scan deste arquivo sai do cache.
+                if file_manager.get_info(file_id) is not None:
+                    await asyncio.to_thread(file_manager.put_derived, file_id, SCAN_KEY, json.dumps(scanned).encode())
+                yield file_line(file_id, scanned)
+            await submit()
+
+        files = [results[fid] for fid in file_ids if fid in results]
+        yield json.dumps({
+            "type": "index",
+            "files": len(files),
+            "errors": errors,
+            "pages": sum(entry["page_count"] for entry in files),
+            "categories": _piece_index(files),
+        }) + "\n"
+    finally:
+        for fut in in_flight:
+            fut.cancel()
+        release()
+
+
+@router.post("/scan/bulk")
+async def bulk_scan(req: BulkScanRequest, request: Request):
+    """Smart scan a whole case package: NDJSON per file as it finishes, then an index by category."""
+    if not req.file_ids:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo fornecido")
+    if len(req.file_ids) > MAX_BULK_FILES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BULK_FILES} arquivos por triagem")
+    for fid in req.file_ids:
+        if await asyncio.to_thread(file_manager.get_path, fid) is None:
+            raise HTTPException(status_code=404, detail=f"Arquivo {fid} não encontrado")
+
+    release = await admission.reserve("scan:bulk", req.file_ids)
+    # A vaga volta quando a resposta termina, mesmo que o corpo nunca seja iterado.
+    return admission.ReservedStream(
+        _stream_bulk_scan(request, req.file_ids, release),
+        release,
+        media_type="application/x-ndjson",
+        headers={"X-Total-Files": str(len(set(req.file_ids)))},
+    )
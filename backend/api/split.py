@@ -1,11 +1,13 @@
-import io
-import zipfile
 import asyncio
-from fastapi import APIRouter, HTTPException
+import zipfile
+from functools import partial
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
 
+from services import admission, result_cache
 from services.file_manager import file_manager
+from services.preprocess import outline_for
 from core.pdf_ops import split_pdf_by_count, split_pdf_by_size, split_pdf_by_bookmarks
 
 router = APIRouter(tags=["split"])
@@ -19,45 +21,55 @@ class SplitRequest(BaseModel):
 
 
 @router.post("/split")
-async def split(req: SplitRequest):
-    data = file_manager.get_bytes(req.file_id)
-    if data is None:
+async def split(req: SplitRequest, request: Request):
+    path = await asyncio.to_thread(file_manager.get_path, req.file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     info = file_manager.get_info(req.file_id)
     base_name = info["filename"].rsplit(".", 1)[0] if info else "split"
 
-    if req.mode == "count":
-        parts = await asyncio.to_thread(split_pdf_by_count, data, int(req.value), req.optimize)
-    elif req.mode == "size":
-        parts = await asyncio.to_thread(split_pdf_by_size, data, req.value, req.optimize)
-    elif req.mode == "bookmark":
-        parts = await asyncio.to_thread(split_pdf_by_bookmarks, data, int(req.value), req.optimize)
-    else:
+    splitters = {"count": split_pdf_by_count, "size": split_pdf_by_size, "bookmark": split_pdf_by_bookmarks}
+    if req.mode not in splitters:
         raise HTTPException(status_code=400, detail=f"Modo inválido: {req.mode}")
+    value = req.value if req.mode == "size" else int(req.value)
+
+    # O nome base vai para dentro do ZIP (e no nome de parte única): entra na chave.
+    key = await result_cache.key_for("split", [req.file_id], req, extra={"base_name": base_name})
+    hit = await result_cache.get(key)
+    if hit is not None:
+        return hit
+
+    with file_manager.scratch("") as parts_dir, file_manager.scratch(".zip") as zip_path:
+        async with admission.admit("split", [req.file_id], request):
+            splitter = splitters[req.mode]
+            if req.mode == "bookmark":
+                # Índice do sumário já calculado no upload: não relê o get_toc.
+                splitter = partial(splitter, outline=await admission.to_thread(outline_for, req.file_id))
+            parts = await admission.to_thread(splitter, path, parts_dir, value, req.optimize)
+
+            if len(parts) == 1:
+                suffix, part = parts[0]
+                filename = f"{base_name}{suffix}.pdf"
+                size = part.stat().st_size
+                result_id = await asyncio.to_thread(file_manager.store_file, part, filename)
+            else:
+                # Multiple parts → ZIP (montado em disco, parte a parte)
+                def _zip():
+                    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                        for suffix, part in parts:
+                            zf.write(part, f"{base_name}{suffix}.pdf")
+                    return zip_path.stat().st_size
+
+                filename = f"{base_name}_partes.zip"
+                size = await admission.to_thread(_zip)
+                result_id = await asyncio.to_thread(file_manager.store_file, zip_path, filename, "application/zip")
 
-    if len(parts) == 1:
-        suffix, part_bytes = parts[0]
-        result_id = file_manager.store(part_bytes, f"{base_name}{suffix}.pdf")
-        return {
-            "result_file_id": result_id,
-            "filename": f"{base_name}{suffix}.pdf",
-            "parts": 1,
-            "size_bytes": len(part_bytes),
-        }
-
-    # Multiple parts → ZIP
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        for suffix, part_bytes in parts:
-            zf.writestr(f"{base_name}{suffix}.pdf", part_bytes)
-
-    zip_bytes = zip_buffer.getvalue()
-    result_id = file_manager.store(zip_bytes, f"{base_name}_partes.zip", "application/zip")
-
-    return {
+    response = {
         "result_file_id": result_id,
-        "filename": f"{base_name}_partes.zip",
+        "filename": filename,
         "parts": len(parts),
-        "size_bytes": len(zip_bytes),
+        "size_bytes": size,
     }
+    result_cache.put(key, response)
+    return response
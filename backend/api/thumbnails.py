@@ -1,35 +1,33 @@
 import io
+import json
+import math
 import asyncio
 import base64
-import fitz
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional
 
+from core.cancel import checkpoint
+from core.render import compose_sprite, render_thumbnail, render_tiles, thumbnail_entry
+from services import admission, workers
+from services.doc_pool import doc_pool
 from services.file_manager import file_manager
+from services.preprocess import cached, source_path, thumbs_key
+from services.single_flight import flights
 from config import settings
 
 router = APIRouter(tags=["thumbnails"])
 
 
-def _generate_thumbnails(pdf_bytes: bytes, page_start: int, page_end: int, dpi: int) -> list[dict]:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    thumbnails = []
-    end = min(page_end, doc.page_count - 1)
-
-    for i in range(page_start, end + 1):
-        page = doc[i]
-        mat = fitz.Matrix(dpi / 72, dpi / 72)
-        pix = page.get_pixmap(matrix=mat)
-        img_bytes = pix.tobytes("png")
-        b64 = base64.b64encode(img_bytes).decode()
-        thumbnails.append({
-            "page": i,
-            "width": pix.width,
-            "height": pix.height,
-            "data": f"data:image/png;base64,{b64}",
-        })
-
-    doc.close()
+def _generate_thumbnails(file_id: str, path: str, page_start: int, page_end: int, dpi: int) -> list[dict]:
+    # Documento do pool: rolar o editor não reabre o PDF a cada janela de páginas.
+    with doc_pool.borrow(file_id, path) as doc:
+        thumbnails = []
+        end = min(page_end, doc.page_count - 1)
+
+        for i in range(page_start, end + 1):
+            checkpoint()
+            thumbnails.append(thumbnail_entry(doc[i], dpi))
+
     return thumbnails
 
 
@@ -41,10 +39,171 @@ async def get_thumbnails(
     dpi: int = Query(72, ge=36, le=150),
 ):
     """Generate page thumbnails for the visual editor."""
-    data = file_manager.get_bytes(file_id)
-    if data is None:
+    path = await asyncio.to_thread(source_path, file_id)
+    if path is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
-    thumbnails = await asyncio.to_thread(_generate_thumbnails, data, page_start, page_end, dpi)
+    # Primeiras páginas já renderizadas após o upload (todas, se o documento é curto).
+    pre = cached(file_id, thumbs_key(dpi)) or []
+    whole_document = 0 < len(pre) < settings.preprocess_thumbnails
+    if pre and (page_end < len(pre) or whole_document):
+        thumbnails = pre[page_start:page_end + 1]
+    else:
+        thumbnails = await flights.do(
+            ("thumbnails", file_id, page_start, page_end, dpi),
+            lambda: admission.run("thumbnails", [file_id], _generate_thumbnails, file_id, str(path), page_start, page_end, dpi),
+        )
 
     return {"file_id": file_id, "thumbnails": thumbnails}
+
+
+async def _stream_thumbnails(
+    request: Request, path: str, pages: list[int], dpi: int, ready: Optional[dict[int, dict]] = None,
+):
+    """NDJSON: uma linha por página, na ordem em que terminam de renderizar.
+
+    As páginas em ``ready`` (pré-processadas após o upload) saem primeiro, sem
+    passar pelo pool. Só ``2 × workers`` páginas ficam em voo; quando o cliente
+    desconecta, as pendentes são canceladas e o resto do intervalo nunca é
+    enviado ao pool.
+    """
+    ready = ready or {}
+    for page in pages:
+        if page in ready:
+            yield json.dumps(ready[page]) + "\n"
+    window = 2 * workers.pool_size()
+    queue = (page for page in pages if page not in ready)
+    in_flight: set[asyncio.Future] = set()
+
+    def submit():
+        for page in queue:
+            in_flight.add(asyncio.ensure_future(workers.run(render_thumbnail, path, page, dpi)))
+            if len(in_flight) >= window:
+                return
+
+    try:
+        submit()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight -= done
+            if await request.is_disconnected():
+                return
+            for fut in done:
+                yield json.dumps(fut.result()) + "\n"
+            submit()
+    finally:
+        for fut in in_flight:
+            fut.cancel()
+
+
+@router.get("/thumbnails/{file_id}/stream")
+async def stream_thumbnails(
+    file_id: str,
+    request: Request,
+    page_start: int = Query(0, ge=0),
+    page_end: int = Query(9, ge=0),
+    dpi: int = Query(72, ge=36, le=150),
+):
+    """Stream thumbnails as NDJSON, each page as soon as a worker finishes it."""
+    path = await asyncio.to_thread(source_path, file_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    page_count = await asyncio.to_thread(_page_count, file_id, str(path))
+    pages = list(range(page_start, min(page_end, page_count - 1) + 1))
+    ready = {t["page"]: t for t in cached(file_id, thumbs_key(dpi)) or []}
+    # Vaga de stream durante todo o stream (ou 429): um cliente não inunda o pool de
+    # processos, e as threads da faixa interativa ficam para metadados, scan e janelas.
+    release = await admission.reserve("thumbnails:stream", [file_id])
+    return admission.ReservedStream(
+        _stream_thumbnails(request, str(path), pages, dpi, ready),
+        release,
+        media_type="application/x-ndjson",
+        headers={"X-Total-Pages": str(page_count)},
+    )
+
+
+# Teto de páginas numa folha (trabalho de renderização).
+MAX_SPRITE_PAGES = 3000
+# Teto de área da folha, células vazias incluídas. O processo principal segura
+# as amostras RGB de todas as miniaturas e a folha montada ao mesmo tempo
+# (~6 bytes por pixel): ~150 MB no pior caso, qualquer que seja o dpi. A 8 dpi
+# cabem as 3.000 páginas A4; a 36 dpi, ~200.
+MAX_SPRITE_PIXELS = 25_000_000
+
+
+def _page_count(file_id: str, path: str) -> int:
+    with doc_pool.borrow(file_id, path) as doc:
+        return doc.page_count
+
+
+def _sprite_pixels(file_id: str, path: str, pages: list[int], dpi: int, columns: int) -> int:
+    """Área (pixels) da folha que ``compose_sprite`` montaria, sem renderizar nada."""
+    width = height = 0.0
+    with doc_pool.borrow(file_id, path) as doc:
+        for i in pages:
+            rect = doc[i].rect
+            width, height = max(width, rect.width), max(height, rect.height)
+    scale = dpi / 72
+    # +1: o pixmap arredonda a área da página para fora.
+    cell_w, cell_h = math.ceil(width * scale) + 1, math.ceil(height * scale) + 1
+    columns = max(1, min(columns, len(pages)))
+    rows = -(-len(pages) // columns)
+    return columns * rows * cell_w * cell_h
+
+
+@router.get("/thumbnails/{file_id}/sprite")
+async def get_thumbnail_sprite(
+    file_id: str,
+    page_start: int = Query(0, ge=0),
+    page_end: Optional[int] = Query(None, ge=0),
+    dpi: int = Query(8, ge=4, le=36),
+    columns: int = Query(25, ge=1, le=100),
+):
+    """Render a whole page range into one JPEG sprite sheet plus its offset map.
+
+    Pages are rendered in parallel on the worker pool; the result is cached
+    per file until the file expires.
+    """
+    path = await asyncio.to_thread(source_path, file_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    page_count = await asyncio.to_thread(_page_count, file_id, str(path))
+    end = min(page_count - 1 if page_end is None else page_end, page_count - 1)
+    if page_start > end:
+        raise HTTPException(status_code=400, detail="Intervalo de páginas inválido")
+    if end - page_start + 1 > MAX_SPRITE_PAGES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_SPRITE_PAGES} páginas por folha")
+    pages = list(range(page_start, end + 1))
+    area = await asyncio.to_thread(_sprite_pixels, file_id, str(path), pages, dpi, columns)
+    if area > MAX_SPRITE_PIXELS:
+        raise HTTPException(status_code=400, detail="Folha grande demais: reduza o dpi ou o intervalo de páginas")
+
+    key = f"sprite-{page_start}-{end}-{dpi}-{columns}.json"
+    stored = file_manager.get_derived(file_id, key)
+    if stored is not None:
+        return json.loads(stored)
+
+    async def _render() -> dict:
+        async with admission.admit("thumbnails", [file_id]):
+            parts = await asyncio.gather(*[
+                workers.run(render_tiles, str(path), batch, dpi)
+                for batch in workers.batches(pages, workers.pool_size())
+            ])
+            tiles = [tile for part in parts for tile in part]
+            image, layout = await admission.to_thread(compose_sprite, tiles, columns)
+
+        result = {
+            "file_id": file_id,
+            "page_start": page_start,
+            "page_end": end,
+            "dpi": dpi,
+            **layout,
+            "sprite": f"data:image/jpeg;base64,{base64.b64encode(image).decode()}",
+        }
+        await asyncio.to_thread(file_manager.put_derived, file_id, key, json.dumps(result).encode())
+        return result
+
+    # Pedidos repetidos antes do cache ficar pronto esperam a mesma renderização.
+    return await flights.do(("sprite", file_id, key), _render)
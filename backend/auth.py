@@ -20,6 +20,7 @@ from __future__ import annotations
 import hmac
 import logging
 import os
+from contextvars import ContextVar
 
 from fastapi import Header, HTTPException
 
@@ -56,6 +57,10 @@ def _email_role_overrides() -> dict[str, set[str]]:
     return out
 
 
+# Email do usuario autenticado na requisicao corrente (setado por get_current_user).
+# Usado pelo FileManager para atribuir arquivos a um dono (cota por usuario).
+current_user_email: ContextVar[str | None] = ContextVar("current_user_email", default=None)
+
 _OVERRIDES = _email_role_overrides()
 logger.info("SSO auth ativo (env=%s, bypass=%s, %d overrides)", ENVIRONMENT, DEV_BYPASS_AUTH, len(_OVERRIDES))
 
@@ -79,6 +84,7 @@ async def get_current_user(
 ) -> dict:
     """Le os headers do oauth2-proxy -> {email, name, role}. 401 se ausentes."""
     if DEV_BYPASS_AUTH and not email:
+        current_user_email.set("dev@soarespicon.adv.br")
         return {"email": "dev@soarespicon.adv.br", "name": "Dev (bypass)", "role": "admin"}
 
     # Anti-spoof (WP-SEC2): exige o segredo injetado pelo Traefik ANTES de
@@ -98,4 +104,5 @@ async def get_current_user(
             detail="auth headers ausentes — oauth2-proxy upstream nao esta configurado",
         )
     name = preferred or email.split("@")[0]
+    current_user_email.set(email.lower())
     return {"email": email, "name": name, "role": _role_for(email)}
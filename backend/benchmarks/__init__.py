@@ -0,0 +1 @@
+"""Suíte de benchmarks do backend (não roda no pytest — ver README, seção Benchmarks)."""
@@ -0,0 +1,45 @@
+"""Substituto local do oauth2-proxy para testes de carga.
+
+Em produção o Traefik/oauth2-proxy injeta ``X-Auth-Request-*`` (e o
+``X-Proxy-Secret``, ver ``auth.py``) antes de a requisição chegar ao app. Este
+wrapper ASGI faz o mesmo localmente, sem ``DEV_BYPASS_AUTH``: o app roda o
+``get_current_user`` real, com headers de identidade reais.
+
+Como no proxy de verdade, headers de identidade vindos do cliente são
+descartados. O usuário é escolhido pelo header ``X-Loadtest-User`` (um número
+ou apelido), o que permite simular N usuários distintos::
+
+    uvicorn benchmarks.auth_standin:app --port 8100
+"""
+from __future__ import annotations
+
+import os
+
+from main import app as backend_app
+
+_STRIP = (b"x-auth-request-", b"x-proxy-secret")
+LOADTEST_DOMAIN = "loadtest.local"
+
+
+class AuthHeaderStandIn:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = [(k, v) for k, v in scope["headers"] if not k.startswith(_STRIP)]
+            user = dict(scope["headers"]).get(b"x-loadtest-user", b"1").decode("latin-1")
+            email = f"carga{user}@{LOADTEST_DOMAIN}"
+            headers += [
+                (b"x-auth-request-email", email.encode()),
+                (b"x-auth-request-user", f"oid-carga-{user}".encode()),
+                (b"x-auth-request-preferred-username", f"carga.{user}".encode()),
+            ]
+            secret = os.environ.get("PROXY_SHARED_SECRET", "")
+            if secret:
+                headers.append((b"x-proxy-secret", secret.encode()))
+            scope = {**scope, "headers": headers}
+        await self.app(scope, receive, send)
+
+
+app = AuthHeaderStandIn(backend_app)
@@ -0,0 +1,291 @@
+"""Gerador determinístico de um corpus sintético de autos judiciais.
+
+Produz documentos representativos do que o escritório processa no dia a dia:
+
+- ``scans.pdf``: páginas escaneadas (JPEG RGB com ruído de papel, texto preto),
+  sem marcadores nem camada de texto, como sai do scanner;
+- ``petition.pdf`` / ``petition_v2.pdf``: petição textual longa com marcadores
+  profundos (4 níveis) e uma segunda versão levemente alterada (para o diff);
+- ``processo.pdf``: autos mesclados de ~1000 páginas, com peças separadas
+  (inicial, contestação, sentença, laudos escaneados...) e um timbre repetido
+  como xref distinto em cada peça — exatamente como sai de um merge real;
+- ``photos/``: fotos de celular (JPEG) e algumas capturas PNG.
+
+Mesma ``seed`` + mesma ``scale`` => mesmos bytes. O corpus é cacheado em disco
+(``manifest.json``) e só é regerado quando a versão, a seed ou a escala mudam.
+"""
+from __future__ import annotations
+
+import json
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+import fitz
+
+CORPUS_VERSION = 1
+DEFAULT_SEED = 20240601
+DEFAULT_ROOT = Path(__file__).resolve().parent / ".corpus"
+
+A4 = fitz.paper_rect("a4")
+TEXT_RECT = fitz.Rect(56, 90, A4.width - 56, A4.height - 56)
+
+_VOCAB = (
+    "autor réu ação processo juízo comarca vara cível direito pedido tutela "
+    "urgência dano moral material indenização contrato cláusula rescisão prazo "
+    "audiência conciliação prova pericial testemunhal documental honorários "
+    "sucumbência recurso apelação agravo embargos decisão sentença acórdão "
+    "tribunal relator voto fundamentação dispositivo mérito preliminar nulidade "
+    "citação intimação petição manifestação requerimento parte advogado procuração "
+    "valor causa custas despesas juros correção monetária termo inicial lei artigo "
+    "código civil processo constituição jurisprudência súmula precedente"
+).split()
+
+# (título do marcador, primeira linha da peça, tipo, páginas)
+_PROCESSO_PIECES: Tuple[Tuple[str, str, str, int], ...] = (
+    ("Capa", "CAPA DO PROCESSO", "text", 1),
+    ("Petição Inicial", "EXCELENTÍSSIMO SENHOR DOUTOR JUIZ DE DIREITO", "text", 12),
+    ("Documentos", "DOCUMENTO", "scan", 8),
+    ("Contestação", "CONTESTAÇÃO", "text", 10),
+    ("Réplica", "RÉPLICA", "text", 5),
+    ("Ata de Audiência", "ATA DE AUDIÊNCIA", "text", 2),
+    ("Laudo Pericial", "LAUDO PERICIAL", "scan", 6),
+    ("Decisão", "DECISÃO", "text", 2),
+    ("Sentença", "SENTENÇA", "text", 6),
+    ("Recurso", "RAZÕES DE APELAÇÃO", "text", 9),
+    ("Acórdão", "ACÓRDÃO", "text", 5),
+    ("Despacho", "DESPACHO", "text", 1),
+)
+
+
+@dataclass
+class Corpus:
+    root: Path
+    scale: float
+    seed: int
+    scans: Path = field(init=False)
+    petition: Path = field(init=False)
+    petition_v2: Path = field(init=False)
+    processo: Path = field(init=False)
+    photos_dir: Path = field(init=False)
+
+    def __post_init__(self):
+        self.scans = self.root / "scans.pdf"
+        self.petition = self.root / "petition.pdf"
+        self.petition_v2 = self.root / "petition_v2.pdf"
+        self.processo = self.root / "processo.pdf"
+        self.photos_dir = self.root / "photos"
+
+    @property
+    def pdfs(self) -> dict:
+        return {
+            "scans": self.scans,
+            "petition": self.petition,
+            "processo": self.processo,
+        }
+
+    @property
+    def photos(self) -> List[Path]:
+        return sorted(self.photos_dir.iterdir())
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCAB) for _ in range(rng.randint(8, 20))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+
+
+def _page_text(rng: random.Random, min_chars: int = 2400) -> str:
+    parts: List[str] = []
+    size = 0
+    while size < min_chars:
+        p = _paragraph(rng)
+        parts.append(p)
+        size += len(p)
+    return "\n\n".join(parts)
+
+
+def _write_text_page(doc: fitz.Document, heading: str, body: str, letterhead: bytes | None = None):
+    page = doc.new_page(width=A4.width, height=A4.height)
+    if letterhead:
+        page.insert_image(fitz.Rect(56, 20, 206, 60), stream=letterhead)
+    page.insert_text((56, 80), heading, fontsize=13, fontname="hebo")
+    page.insert_textbox(TEXT_RECT, body, fontsize=10, fontname="helv")
+    return page
+
+
+def _letterhead(rng: random.Random) -> bytes:
+    """Timbre/brasão pequeno (PNG) que se repete em todas as peças."""
+    w, h = 300, 80
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, w, h), False)
+    pix.clear_with(255)
+    color = (15, 61, 115)
+    for x in range(0, w, 3):
+        for y in range(rng.randint(10, 30), rng.randint(50, 70)):
+            pix.set_pixel(x, y, color)
+    return pix.tobytes("png")
+
+
+def _scan_image(rng: random.Random, heading: str, dpi: int) -> bytes:
+    """Renderiza uma página de texto sobre "papel" ruidoso e devolve JPEG RGB.
+
+    O ruído de fundo impede que o JPEG fique artificialmente pequeno — o peso
+    por página fica próximo ao de um scanner de escritório real.
+    """
+    nw, nh = int(A4.width * dpi / 144), int(A4.height * dpi / 144)
+    paper = bytes(226 + (i * 29) // 256 for i in range(256))
+    noise = rng.randbytes(nw * nh).translate(paper)
+    bg = fitz.Pixmap(fitz.csGRAY, nw, nh, noise, False)
+
+    tmp = fitz.open()
+    page = tmp.new_page(width=A4.width, height=A4.height)
+    page.insert_image(page.rect, stream=bg.tobytes("png"))
+    page.insert_text((56, 80), heading, fontsize=13, fontname="hebo")
+    page.insert_textbox(TEXT_RECT, _page_text(rng, 1800), fontsize=10, fontname="helv")
+    pix = page.get_pixmap(dpi=dpi)
+    tmp.close()
+    return pix.tobytes("jpeg", jpg_quality=80)
+
+
+def _write_scan_page(doc: fitz.Document, jpeg: bytes):
+    page = doc.new_page(width=A4.width, height=A4.height)
+    page.insert_image(page.rect, stream=jpeg)
+    return page
+
+
+def build_scans(rng: random.Random, pages: int, dpi: int = 150) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        _write_scan_page(doc, _scan_image(rng, f"DOCUMENTO {i + 1}", dpi))
+    out = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return out
+
+
+def build_petition(seed: int, pages: int, variant: int = 0) -> bytes:
+    """Petição textual com marcadores em 4 níveis (capítulo/seção/item/subitem).
+
+    ``variant=1`` gera a mesma petição com um parágrafo trocado a cada 5 páginas,
+    para alimentar o ``compare_pdfs``.
+    """
+    rng = random.Random(seed)
+    mut = random.Random(seed + 1)
+    doc = fitz.open()
+    toc: List[list] = []
+    counters = [0, 0, 0, 0]
+    for i in range(pages):
+        body = _page_text(rng)
+        if variant and i % 5 == 0:
+            body = _paragraph(mut) + "\n\n" + body
+        heading = "PETIÇÃO INICIAL" if i == 0 else f"{counters[0] + 1}. DOS FATOS E DO DIREITO"
+        _write_text_page(doc, heading, body)
+
+        # Profundidade: capítulo a cada 12 págs, seção a cada 4, item a cada 2, subitem em toda página.
+        if i % 12 == 0:
+            counters[0] += 1
+            counters[1:] = [0, 0, 0]
+            toc.append([1, f"{counters[0]}. Capítulo {counters[0]}", i + 1])
+        if i % 4 == 0:
+            counters[1] += 1
+            counters[2:] = [0, 0]
+            toc.append([2, f"{counters[0]}.{counters[1]} Seção", i + 1])
+        if i % 2 == 0:
+            counters[2] += 1
+            counters[3] = 0
+            toc.append([3, f"{counters[0]}.{counters[1]}.{counters[2]} Item", i + 1])
+        counters[3] += 1
+        toc.append([4, f"{counters[0]}.{counters[1]}.{counters[2]}.{counters[3]} Subitem", i + 1])
+    doc.set_toc(toc)
+    out = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return out
+
+
+def build_processo(rng: random.Random, pages: int, scan_pool: List[bytes], letterhead: bytes) -> bytes:
+    """Autos mesclados: cada peça é um documento próprio inserido via ``insert_pdf``."""
+    merged = fitz.open()
+    toc: List[list] = []
+    piece_idx = 0
+    while merged.page_count < pages:
+        title, heading, kind, n = _PROCESSO_PIECES[piece_idx % len(_PROCESSO_PIECES)]
+        n = min(n, pages - merged.page_count)
+        piece = fitz.open()
+        for p in range(n):
+            if kind == "scan":
+                _write_scan_page(piece, rng.choice(scan_pool))
+            else:
+                first = heading if p == 0 else ""
+                _write_text_page(piece, first, _page_text(rng), letterhead=letterhead)
+        toc.append([1, f"{title} (Fls. {merged.page_count + 1})", merged.page_count + 1])
+        merged.insert_pdf(piece)
+        piece.close()
+        piece_idx += 1
+    merged.set_toc(toc)
+    out = merged.tobytes(garbage=1, deflate=True)
+    merged.close()
+    return out
+
+
+def build_photos(rng: random.Random, count: int) -> List[Tuple[str, bytes]]:
+    """Fotos de celular (JPEG 1600x1200) e, a cada quatro, uma captura de tela PNG."""
+    out: List[Tuple[str, bytes]] = []
+    for i in range(count):
+        nw, nh = 200, 150
+        noise = fitz.Pixmap(fitz.csRGB, nw, nh, rng.randbytes(nw * nh * 3), False)
+        tmp = fitz.open()
+        page = tmp.new_page(width=1600, height=1200)
+        page.insert_image(page.rect, stream=noise.tobytes("png"))
+        page.draw_rect(fitz.Rect(300, 200, 1300, 1000), color=(0, 0, 0), fill=(0.95, 0.95, 0.9), width=4)
+        page.insert_text((340, 280), f"Evidência {i + 1}", fontsize=48, fontname="hebo")
+        if i % 4 == 3:
+            pix = page.get_pixmap(dpi=36)
+            out.append((f"captura_{i:03d}.png", pix.tobytes("png")))
+        else:
+            pix = page.get_pixmap(dpi=72)
+            out.append((f"foto_{i:03d}.jpg", pix.tobytes("jpeg", jpg_quality=85)))
+        tmp.close()
+    return out
+
+
+def _scaled(n: int, scale: float, minimum: int = 2) -> int:
+    return max(minimum, int(round(n * scale)))
+
+
+def generate(root: Path = DEFAULT_ROOT, scale: float = 1.0, seed: int = DEFAULT_SEED) -> Corpus:
+    """Gera (ou reaproveita do cache em disco) o corpus na escala pedida."""
+    corpus = Corpus(root=Path(root), scale=scale, seed=seed)
+    manifest_path = corpus.root / "manifest.json"
+    manifest = {"version": CORPUS_VERSION, "seed": seed, "scale": scale}
+
+    if manifest_path.exists():
+        try:
+            if json.loads(manifest_path.read_text()) == manifest and all(
+                p.exists() for p in (corpus.scans, corpus.petition, corpus.petition_v2, corpus.processo)
+            ):
+                return corpus
+        except ValueError:
+            pass
+
+    corpus.root.mkdir(parents=True, exist_ok=True)
+    corpus.photos_dir.mkdir(exist_ok=True)
+    for old in corpus.photos_dir.iterdir():
+        old.unlink()
+
+    rng = random.Random(seed)
+    letterhead = _letterhead(rng)
+    scan_pool = [_scan_image(rng, "DOCUMENTO", 100) for _ in range(8)]
+
+    corpus.scans.write_bytes(build_scans(rng, _scaled(60, scale)))
+    corpus.petition.write_bytes(build_petition(seed, _scaled(120, scale, 12)))
+    corpus.petition_v2.write_bytes(build_petition(seed, _scaled(120, scale, 12), variant=1))
+    corpus.processo.write_bytes(build_processo(rng, _scaled(1000, scale, 20), scan_pool, letterhead))
+    for name, data in build_photos(rng, _scaled(40, scale)):
+        (corpus.photos_dir / name).write_bytes(data)
+
+    manifest_path.write_text(json.dumps(manifest))
+    return corpus
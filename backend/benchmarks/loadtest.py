@@ -0,0 +1,233 @@
+"""Teste de carga ponta a ponta da API com fluxos realistas.
+
+Sobe o app localmente (uvicorn + ``benchmarks.auth_standin``, que faz o papel
+do oauth2-proxy) e dispara usuários virtuais concorrentes, cada um repetindo
+fluxos completos:
+
+- ``scan``:     upload → /scan → /extract (págs. 1-5) → download
+- ``optimize``: upload → /optimize (recommended) → download
+
+Para cada nível de concorrência reporta fluxos/s, requisições/s e
+p50/p95/p99 por endpoint — o ponto em que a latência dispara é quantos
+usuários simultâneos uma réplica aguenta.
+
+Uso (a partir de ``backend/``)::
+
+    python -m benchmarks.loadtest --concurrency 1,4,8,16 --duration 30
+    python -m benchmarks.loadtest --workers 4
+    python -m benchmarks.loadtest --url http://localhost:8000   # instância já rodando
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from benchmarks.corpus import DEFAULT_ROOT, DEFAULT_SEED, generate
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por interpolação linear (``values`` não precisa estar ordenado)."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.flows = 0
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kw) -> httpx.Response:
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kw)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            raise
+        self.latencies[name].append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            self.errors[name] += 1
+            resp.raise_for_status()
+        return resp
+
+
+async def flow_scan(client: httpx.AsyncClient, rec: Recorder, pdf: bytes):
+    r = await rec.call(client, "POST /upload", "POST", "/api/upload",
+                       files={"files": ("peticao.pdf", pdf, "application/pdf")})
+    file_id = r.json()[0]["file_id"]
+    await rec.call(client, "POST /scan", "POST", "/api/scan", params={"file_id": file_id})
+    r = await rec.call(client, "POST /extract", "POST", "/api/extract",
+                       json={"file_id": file_id, "pages": "1-5"})
+    await rec.call(client, "GET /download", "GET", f"/api/download/{r.json()['result_file_id']}")
+
+
+async def flow_optimize(client: httpx.AsyncClient, rec: Recorder, pdf: bytes):
+    r = await rec.call(client, "POST /upload", "POST", "/api/upload",
+                       files={"files": ("scan.pdf", pdf, "application/pdf")})
+    file_id = r.json()[0]["file_id"]
+    r = await rec.call(client, "POST /optimize", "POST", "/api/optimize",
+                       json={"file_id": file_id, "profile": "recommended"})
+    await rec.call(client, "GET /download", "GET", f"/api/download/{r.json()['result_file_id']}")
+
+
+async def virtual_user(base_url: str, user: int, deadline: float, rec: Recorder, docs: Dict[str, bytes]):
+    flows = [(flow_scan, docs["text"]), (flow_optimize, docs["scan"])]
+    headers = {"X-Loadtest-User": str(user)}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=300) as client:
+        i = user
+        while time.perf_counter() < deadline:
+            fn, pdf = flows[i % len(flows)]
+            i += 1
+            try:
+                await fn(client, rec, pdf)
+                rec.flows += 1
+            except httpx.HTTPError:
+                pass
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, docs: Dict[str, bytes]) -> dict:
+    rec = Recorder()
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+    await asyncio.gather(*(virtual_user(base_url, u, deadline, rec, docs) for u in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    endpoints = {}
+    for name, lat in sorted(rec.latencies.items()):
+        endpoints[name] = {
+            "requests": len(lat),
+            "errors": rec.errors.get(name, 0),
+            "p50_ms": round(percentile(lat, 50) * 1000, 1),
+            "p95_ms": round(percentile(lat, 95) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        }
+    total = sum(len(v) for v in rec.latencies.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "flows": rec.flows,
+        "flows_per_sec": round(rec.flows / elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 3),
+        "errors": sum(rec.errors.values()),
+        "endpoints": endpoints,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_server(workers: int) -> Iterator[str]:
+    """Sobe ``uvicorn benchmarks.auth_standin:app`` num TEMP_DIR descartável."""
+    port = _free_port()
+    tmp = tempfile.TemporaryDirectory(prefix="pdf-loadtest-")
+    env = {**os.environ, "TEMP_DIR": tmp.name}
+    env.pop("DEV_BYPASS_AUTH", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.auth_standin:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                if httpx.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn encerrou antes de ficar pronto")
+            time.sleep(0.2)
+        else:
+            raise RuntimeError("uvicorn não respondeu /api/health a tempo")
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        tmp.cleanup()
+
+
+def _load_docs(scale: float, seed: int, corpus_dir: Path) -> Dict[str, bytes]:
+    import fitz
+
+    corpus = generate(corpus_dir, scale=scale, seed=seed)
+    # Scan de ~10 páginas: tamanho típico de um anexo, não o pior caso.
+    with fitz.open(corpus.scans) as src:
+        part = fitz.open()
+        part.insert_pdf(src, from_page=0, to_page=min(9, src.page_count - 1))
+        scan = part.tobytes(garbage=1)
+        part.close()
+    return {"text": corpus.petition.read_bytes(), "scan": scan}
+
+
+def print_level(r: dict):
+    print(f"\nconcorrência {r['concurrency']}: {r['flows_per_sec']:.2f} fluxos/s, "
+          f"{r['requests_per_sec']:.2f} req/s, {r['errors']} erros")
+    print(f"  {'endpoint':<16} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, e in r["endpoints"].items():
+        print(f"  {name:<16} {e['requests']:>6} {e['p50_ms']:>9.1f} {e['p95_ms']:>9.1f} {e['p99_ms']:>9.1f}")
+
+
+async def _run(base_url: str, levels: List[int], duration: float, docs: Dict[str, bytes]) -> List[dict]:
+    results = []
+    for c in levels:
+        r = await run_level(base_url, c, duration, docs)
+        print_level(r)
+        results.append(r)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="usa uma instância já rodando (com headers de auth resolvidos por ela)")
+    ap.add_argument("--workers", type=int, default=1, help="workers do uvicorn local")
+    ap.add_argument("--concurrency", default="1,2,4,8", help="níveis de usuários simultâneos")
+    ap.add_argument("--duration", type=float, default=20.0, help="segundos por nível")
+    ap.add_argument("--scale", type=float, default=0.1, help="escala do corpus usado como carga")
+    ap.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    ap.add_argument("--corpus-dir", type=Path, default=DEFAULT_ROOT)
+    ap.add_argument("--output", type=Path, help="grava os resultados em JSON")
+    args = ap.parse_args(argv)
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    docs = _load_docs(args.scale, args.seed, args.corpus_dir)
+
+    if args.url:
+        results = asyncio.run(_run(args.url.rstrip("/"), levels, args.duration, docs))
+    else:
+        with local_server(args.workers) as base_url:
+            results = asyncio.run(_run(base_url, levels, args.duration, docs))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
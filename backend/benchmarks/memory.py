@@ -0,0 +1,280 @@
+"""Harness de pico de memória por operação de ``core/``.
+
+Cada (operação, tamanho de entrada) roda num subprocesso isolado — o pico de
+RSS de um processo não "desce", então medir tudo no mesmo interpretador
+contaminaria as medições seguintes. O filho reporta:
+
+- ``rss_mb``: pico de RSS (``VmHWM``, zerado após os imports) menos o RSS
+  após os imports, ou seja, o que a operação custou de fato (MuPDF + Python);
+- ``py_mb``: pico de alocações Python (``tracemalloc``) — bytes de entrada,
+  ``tobytes()`` de saída, cópias intermediárias.
+
+As entradas são prefixos crescentes do ``processo.pdf`` do corpus. Ao final,
+imprime a curva memória × tamanho, ajusta a inclinação (MB de RSS por MB de
+entrada), grava CSV (e PNG, se o matplotlib estiver instalado) e verifica os
+orçamentos de ``BUDGETS``: exit 1 se algum ponto estourar.
+
+Uso (a partir de ``backend/``)::
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --scale 0.2 --only merge
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("TEMP_DIR", str(Path(tempfile.gettempdir()) / "pdf-bench-tmp"))
+
+import fitz  # noqa: E402
+
+from benchmarks.corpus import DEFAULT_ROOT, DEFAULT_SEED, generate  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MB = 1024 * 1024
+SIZE_FRACTIONS = (0.125, 0.25, 0.5, 1.0)
+
+# Orçamento de pico de RSS por operação: (MB por MB de entrada, MB fixos).
+# Calibrado sobre a medição de referência (corpus escala 1.0) para ficar entre
+# 1.3x e 1.9x do pico medido em todos os tamanhos — uma mudança que dobre o
+# pico estoura o orçamento. A parte fixa cobre o que qualquer operação custa
+# mesmo com entrada mínima (~5-6 MB de MuPDF e buffers de save); sem ela,
+# ``--scale`` pequeno acusa estouro falso. Ao reduzir memória de propósito,
+# aperte aqui.
+BUDGETS: Dict[str, Tuple[float, float]] = {
+    "merge_pdfs": (6.1, 8.0),
+    "split_pdf_by_size": (0.7, 26.0),
+    "split_pdf_by_count": (0.1, 18.0),
+    "optimize_pdf": (1.6, 64.0),
+    "rotate_pages": (2.6, 8.0),
+    "extract_pages": (2.8, 8.0),
+    "remove_pages": (2.3, 11.0),
+    "apply_bates_stamping": (1.5, 8.0),
+    "redact_text_matches": (2.6, 16.0),
+}
+
+
+def _merge(path: str, out: Path):
+    from core.pdf_ops import merge_pdfs
+    return merge_pdfs([path, path], out / "out.pdf")
+
+
+def _split_size(path: str, out: Path):
+    from core.pdf_ops import split_pdf_by_size
+    return split_pdf_by_size(path, out / "parts", 5)
+
+
+def _split_count(path: str, out: Path):
+    from core.pdf_ops import split_pdf_by_count
+    return split_pdf_by_count(path, out / "parts", 50)
+
+
+def _optimize(path: str, out: Path):
+    from api.optimize import OptimizeRequest, _optimize as run
+    return run(Path(path), out / "out.pdf", OptimizeRequest(file_id="bench", profile="recommended"))
+
+
+def _rotate(path: str, out: Path):
+    from core.pdf_ops import rotate_pages
+    return rotate_pages(path, out / "out.pdf", {0: 90})
+
+
+def _extract(path: str, out: Path):
+    from core.pdf_ops import extract_pages
+    with fitz.open(path) as doc:
+        n = doc.page_count
+    return extract_pages(path, out / "out.pdf", list(range(0, n, 2)))
+
+
+def _remove(path: str, out: Path):
+    from core.pdf_ops import remove_pages
+    return remove_pages(path, out / "out.pdf", [0])
+
+
+def _bates(path: str, out: Path):
+    from core.bates import apply_bates_stamping
+    return apply_bates_stamping(path, out / "out.pdf")
+
+
+def _redact(path: str, out: Path):
+    from core.redact import redact_text_matches
+    return redact_text_matches(path, out / "out.pdf", ["contrato"], True, ["cpf"])
+
+
+# Cada operação recebe o PDF de entrada e um diretório temporário para gravar
+# o resultado em disco, como a API faz.
+OPS: Dict[str, Callable[[str, Path], object]] = {
+    "merge_pdfs": _merge,
+    "split_pdf_by_size": _split_size,
+    "split_pdf_by_count": _split_count,
+    "optimize_pdf": _optimize,
+    "rotate_pages": _rotate,
+    "extract_pages": _extract,
+    "remove_pages": _remove,
+    "apply_bates_stamping": _bates,
+    "redact_text_matches": _redact,
+}
+
+
+def _proc_status_mb(field: str) -> float | None:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Zera o VmHWM do processo (Linux >= 4.0) para medir só o pico da operação."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _maxrss_mb() -> float:
+    # Linux reporta ru_maxrss em KB; macOS, em bytes.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / MB if sys.platform == "darwin" else rss / 1024
+
+
+def run_child(op: str, path: str) -> dict:
+    """Executa a operação no processo atual e mede (chamado pelo subprocesso)."""
+    import core.pdf_ops, core.bates, core.redact, api.optimize  # noqa: F401,E401 — imports fora da medição
+    if _reset_peak_rss():
+        base = _proc_status_mb("VmRSS")
+        peak = lambda: _proc_status_mb("VmHWM")  # noqa: E731
+    else:
+        # Sem clear_refs o pico dos imports vira piso da medição (subestima ops pequenas).
+        base = _maxrss_mb()
+        peak = _maxrss_mb
+    with tempfile.TemporaryDirectory(prefix="pdf-bench-out-") as out:
+        tracemalloc.start()
+        OPS[op](path, Path(out))
+        _, py_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"rss_mb": round(peak() - base, 2), "py_mb": round(py_peak / MB, 2)}
+
+
+def measure(op: str, path: Path) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.memory", "--child", op, str(path)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def build_inputs(source: Path, dest: Path) -> List[Tuple[Path, int, float]]:
+    """Gera prefixos crescentes do documento de origem: [(caminho, páginas, MB)]."""
+    dest.mkdir(parents=True, exist_ok=True)
+    out = []
+    with fitz.open(source) as src:
+        for frac in SIZE_FRACTIONS:
+            n = max(1, int(src.page_count * frac))
+            path = dest / f"{source.stem}_{n}.pdf"
+            if not path.exists():
+                part = fitz.open()
+                part.insert_pdf(src, from_page=0, to_page=n - 1)
+                part.save(path, garbage=1, deflate=True)
+                part.close()
+            out.append((path, n, path.stat().st_size / MB))
+    return out
+
+
+def slope(points: List[Tuple[float, float]]) -> float:
+    """Inclinação por mínimos quadrados (MB de pico por MB de entrada)."""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    den = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / den if den else 0.0
+
+
+def _plot(rows: List[dict], png: Path) -> bool:
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    fig, ax = plt.subplots(figsize=(9, 6))
+    for op in sorted({r["op"] for r in rows}):
+        pts = [(r["input_mb"], r["rss_mb"]) for r in rows if r["op"] == op]
+        ax.plot(*zip(*pts), marker="o", label=op)
+    ax.set_xlabel("entrada (MB)")
+    ax.set_ylabel("pico de RSS acima da base (MB)")
+    ax.legend(fontsize=8)
+    ax.grid(alpha=0.3)
+    fig.savefig(png, dpi=110, bbox_inches="tight")
+    return True
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--child", nargs=2, metavar=("OP", "PATH"), help=argparse.SUPPRESS)
+    ap.add_argument("--scale", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    ap.add_argument("--corpus-dir", type=Path, default=DEFAULT_ROOT)
+    ap.add_argument("--only", default="")
+    ap.add_argument("--out-dir", type=Path, default=Path(tempfile.gettempdir()) / "pdf-bench-memory")
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return 0
+
+    corpus = generate(args.corpus_dir, scale=args.scale, seed=args.seed)
+    inputs = build_inputs(corpus.processo, corpus.root / "memory")
+
+    rows: List[dict] = []
+    failures: List[str] = []
+    print(f"{'operação':<24} {'págs':>6} {'entrada MB':>11} {'RSS MB':>9} {'Python MB':>10} {'orçamento':>10}")
+    for op in OPS:
+        if args.only and args.only not in op:
+            continue
+        factor, fixed = BUDGETS[op]
+        for path, pages, size_mb in inputs:
+            m = measure(op, path)
+            budget = factor * size_mb + fixed
+            rows.append({"op": op, "pages": pages, "input_mb": round(size_mb, 2), **m, "budget_mb": round(budget, 1)})
+            flag = "" if m["rss_mb"] <= budget else "  ESTOUROU"
+            print(f"{op:<24} {pages:>6} {size_mb:>11.1f} {m['rss_mb']:>9.1f} {m['py_mb']:>10.1f} {budget:>10.1f}{flag}")
+            if flag:
+                failures.append(f"{op} @ {size_mb:.1f} MB: {m['rss_mb']:.1f} MB > orçamento {budget:.1f} MB")
+        pts = [(r["input_mb"], r["rss_mb"]) for r in rows if r["op"] == op]
+        print(f"{'':<24} inclinação: {slope(pts):.2f} MB de RSS por MB de entrada")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    csv_path = args.out_dir / "memory.csv"
+    with csv_path.open("w", newline="") as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0].keys()) if rows else ["op"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\ncurvas em {csv_path}")
+    if _plot(rows, args.out_dir / "memory.png"):
+        print(f"gráfico em {args.out_dir / 'memory.png'}")
+
+    if failures:
+        print("\nORÇAMENTOS ESTOURADOS:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,58 @@
 import fitz
+from typing import Dict
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     cors_origins: str = "*"
     temp_file_ttl_minutes: int = 30
+    # Teto de ocupação do TEMP_DIR (0 = só o limite físico do volume). Acima
+    # disso, os arquivos usados há mais tempo são evictados antes de gravar.
+    temp_disk_budget_mb: int = 0
+    # Cota por usuário (0 = sem cota): excedida, evicta os arquivos LRU do próprio usuário.
+    temp_user_quota_mb: int = 2048
     max_upload_size_mb: int = 200
     thumbnail_dpi: int = 72
+    # Processos do pool de renderização (0 = número de CPUs).
+    render_workers: int = 0
+    # Pré-processamento após o upload (metadados, miniaturas, texto, scan): processos
+    # de prioridade baixa (0 = desligado), tamanho da fila e miniaturas por arquivo.
+    preprocess_workers: int = 1
+    preprocess_queue_size: int = 64
+    preprocess_thumbnails: int = 20
+    # Admissão (services/admission.py): threads da faixa interativa (miniaturas,
+    # metadados, scan), execuções simultâneas da faixa de lote (otimizar, dividir...)
+    # e custo máximo (MB-equivalentes × peso da operação) à espera antes do 429.
+    interactive_threads: int = 4
+    interactive_backlog_cost: float = 200
+    batch_slots: int = 2
+    batch_backlog_cost: float = 1000
+    # Streams de miniaturas abertos ao mesmo tempo (renderizam no pool de processos,
+    # sem thread da faixa interativa) e custo máximo à espera antes do 429.
+    stream_slots: int = 16
+    stream_backlog_cost: float = 200
+    # Prazo (s) por operação admitida (chave sem o perfil: "optimize", "diff"...).
+    # Estourado, a API responde 504 e o core para no próximo ponto de verificação.
+    operation_deadline_s: float = 600
+    operation_deadlines: Dict[str, float] = {"metadata": 30, "thumbnails": 60, "analysis": 60, "scan": 120}
+    # Intervalo (s) entre verificações de cliente desconectado nas operações em lote.
+    disconnect_poll_s: float = 0.5
+    # Documentos abertos reaproveitados entre leituras (miniaturas, metadados, scan);
+    # 0 = abre o PDF a cada pedido.
+    document_pool_size: int = 16
+    # Backend dos arquivos temporários: "local" (TEMP_DIR) ou "s3" (vários nós; requer boto3).
+    storage_backend: str = "local"
+    s3_bucket: str = ""
+    s3_prefix: str = "pdf-tmp/"
+    s3_endpoint_url: str = ""  # ex.: http://minio:9000 (vazio = AWS)
+    s3_region: str = ""
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    # Teto do cache local read-through do backend S3.
+    storage_cache_mb: int = 2048
+    # Segundos em que uma cópia do cache vale sem reconsultar o bucket (HEAD);
+    # 0 = confere a cada leitura. Apagar/substituir em outro nó aparece depois disso.
+    storage_revalidate_s: float = 2.0
     visual_preview_size_limit_mb: int = 50
 
     class Config:
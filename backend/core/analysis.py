@@ -0,0 +1,211 @@
+"""Análise de tamanho (pré-voo) a partir só dos metadados dos xrefs.
+
+Não decodifica imagens nem salva o documento: lê dicionários, ``/Length`` e a
+posição das imagens nas páginas. As estimativas por perfil são grosseiras (a
+classificação cinza/1 bit e o ganho real do JPEG dependem dos pixels), mas
+bastam para saber se vale rodar ``/optimize``.
+"""
+import fitz
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.pdf_ops import is_recompressible
+from core.resources import FONT_FILE_KEYS, category_sizes, stream_length
+
+# Razão (bytes novos / antigos, por pixel mantido) ao recodificar um JPEG de
+# scanner: medida no corpus de benchmarks (q85 ~1.07, q75 ~0.9, q60 ~0.67).
+_JPEG_REQUANT = ((60, 0.67), (75, 0.9), (85, 1.07))
+# Bits por pixel de luminância de um JPEG vindo de imagem sem perdas (Flate/raw).
+_JPEG_LUMA_BPP = ((60, 0.87), (75, 1.13), (85, 1.4))
+# Cor com subamostragem de croma custa ~1,5x o cinza.
+_CHROMA_FACTOR = 1.5
+# Fonte inteira -> subconjunto (documentos de texto usam poucos glifos).
+FONT_SUBSET_RATIO = 0.15
+# Conteúdo sem filtro comprimido com Flate.
+DEFLATE_RATIO = 0.3
+
+
+def _interpolate(table, x: float) -> float:
+    if x <= table[0][0]:
+        return table[0][1]
+    for (x0, y0), (x1, y1) in zip(table, table[1:]):
+        if x <= x1:
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+    return table[-1][1]
+
+
+def _shrunk(width: int, height: int, max_dim: int) -> Tuple[int, int]:
+    """Dimensões depois dos ``shrink(1)`` de ``encode_jpeg``."""
+    while max(width, height) > max_dim and width > 4 and height > 4:
+        width, height = width // 2, height // 2
+    return width, height
+
+
+def _image_filter(doc: fitz.Document, xref: int) -> str:
+    kind, value = doc.xref_get_key(xref, "Filter")
+    if kind == "array":
+        value = value.strip("[]").split()[-1] if value.strip("[]") else ""
+    return value.lstrip("/") if kind in ("name", "array") else ""
+
+
+def _gray(colorspace: str, doc: fitz.Document, xref: int) -> bool:
+    if colorspace == "DeviceGray":
+        return True
+    if colorspace == "ICCBased":
+        kind, value = doc.xref_get_key(xref, "ColorSpace")
+        if kind == "array":
+            parts = value.strip("[]").split()
+            if len(parts) >= 3 and parts[0] == "/ICCBased":
+                return doc.xref_get_key(int(parts[1]), "N")[1] == "1"
+    return False
+
+
+def analyze_pdf(
+    doc: fitz.Document, file_size: int, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Onde estão os bytes: categorias, grupos de imagens, fontes, custo por página.
+
+    Com ``profiles`` (nome -> opções de ``optimize_pdf``), inclui o tamanho
+    estimado do resultado de cada perfil.
+    """
+    images: Dict[int, Dict[str, Any]] = {}
+    pages: List[Dict[str, int]] = []
+    raw_content = 0
+    for page in doc:
+        content = 0
+        for xref in page.get_contents():
+            length = stream_length(doc, xref)
+            content += length
+            if doc.xref_get_key(xref, "Filter")[0] == "null":
+                raw_content += length
+        cost = content
+        for img in page.get_images(full=True):
+            xref, _smask, width, height, bpc, cs = img[:6]
+            try:
+                bbox = page.get_image_bbox(img)
+            except Exception:
+                bbox = None
+            dpi = None
+            if bbox is not None and bbox.is_valid and not bbox.is_infinite and bbox.width > 0 and bbox.height > 0:
+                dpi = round(max(width / (bbox.width / 72), height / (bbox.height / 72)))
+            if xref in images:
+                if dpi is not None:
+                    images[xref]["dpi"].append(dpi)
+                continue
+            size = stream_length(doc, xref)
+            cost += size
+            images[xref] = {
+                "xref": xref, "width": width, "height": height, "bpc": bpc,
+                "colorspace": cs, "filter": _image_filter(doc, xref), "bytes": size,
+                "gray": bpc == 1 or _gray(cs, doc, xref),
+                "recompressible": is_recompressible(img),
+                "dpi": [dpi] if dpi is not None else [],
+            }
+        pages.append({"page": page.number, "bytes": cost})
+
+    groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for info in images.values():
+        key = (info["filter"], info["colorspace"])
+        group = groups.setdefault(key, {
+            "filter": key[0], "colorspace": key[1], "count": 0, "bytes": 0, "dpi_min": None, "dpi_max": None,
+        })
+        group["count"] += 1
+        group["bytes"] += info["bytes"]
+        if info["dpi"]:
+            low, high = min(info["dpi"]), max(info["dpi"])
+            group["dpi_min"] = low if group["dpi_min"] is None else min(group["dpi_min"], low)
+            group["dpi_max"] = high if group["dpi_max"] is None else max(group["dpi_max"], high)
+
+    categories = category_sizes(doc, file_size)
+    fonts = _fonts(doc)
+    estimates = {}
+    for name, options in (profiles or {}).items():
+        estimate = min(_estimate(options, categories, list(images.values()), fonts, raw_content), file_size)
+        estimates[name] = {
+            "estimated_size_bytes": estimate,
+            "estimated_reduction_percent": round((file_size - estimate) / file_size * 100, 1) if file_size else 0.0,
+        }
+
+    return {
+        "size_bytes": file_size,
+        "page_count": doc.page_count,
+        "categories": categories,
+        "images": sorted(groups.values(), key=lambda g: -g["bytes"]),
+        "fonts": fonts,
+        "pages": pages,
+        "estimates": estimates,
+    }
+
+
+def _fonts(doc: fitz.Document) -> List[Dict[str, Any]]:
+    """Fontes embutidas (``subset``: já recortada, prefixo ``ABCDEF+`` no nome)."""
+    fonts = []
+    for xref in range(1, doc.xref_length()):
+        if doc.xref_get_key(xref, "Type")[1] != "/FontDescriptor":
+            continue
+        for key in FONT_FILE_KEYS:
+            kind, ref = doc.xref_get_key(xref, key)
+            if kind != "xref":
+                continue
+            name = doc.xref_get_key(xref, "FontName")[1].lstrip("/")
+            fonts.append({
+                "name": name,
+                "bytes": stream_length(doc, int(ref.split()[0])),
+                "subset": len(name) > 7 and name[6] == "+" and name[:6].isupper(),
+            })
+    return sorted(fonts, key=lambda f: -f["bytes"])
+
+
+def _image_estimate(info: Dict[str, Any], quality: int, max_dim: int) -> int:
+    old = info["bytes"]
+    if not info["recompressible"]:
+        return old
+    width, height = _shrunk(info["width"], info["height"], max_dim)
+    kept = width * height / max(info["width"] * info["height"], 1)
+    if info["filter"] == "DCTDecode":
+        new = old * kept * _interpolate(_JPEG_REQUANT, quality)
+    else:
+        bpp = _interpolate(_JPEG_LUMA_BPP, quality) * (1 if info["gray"] else _CHROMA_FACTOR)
+        new = width * height * bpp / 8
+    # recompress_images só troca a imagem se ficar menor.
+    return min(old, round(new))
+
+
+def _estimate(
+    options: Dict[str, Any],
+    categories: Dict[str, int],
+    images: List[Dict[str, Any]],
+    fonts: List[Dict[str, Any]],
+    raw_content: int,
+) -> int:
+    """Tamanho estimado do resultado de ``optimize_pdf`` com ``options``."""
+    # Streams de imagem fora da lista (SMask, imagens dentro de forms) ficam como estão.
+    untouched = categories["images"] - sum(info["bytes"] for info in images)
+    if options.get("dedupe_images"):
+        # Sem ler os streams: mesmas dimensões/cor/filtro/tamanho = provável cópia.
+        unique: Dict[tuple, Dict[str, Any]] = {}
+        for info in images:
+            key = (info["width"], info["height"], info["bpc"], info["colorspace"], info["filter"], info["bytes"])
+            unique.setdefault(key, info)
+        images = list(unique.values())
+    if options.get("recompress_images"):
+        quality, max_dim = options.get("jpeg_quality", 75), options.get("max_image_dim", 1700)
+        image_bytes = sum(_image_estimate(info, quality, max_dim) for info in images)
+    else:
+        image_bytes = sum(info["bytes"] for info in images)
+    image_bytes += max(untouched, 0)
+
+    font_bytes = categories["fonts"]
+    if options.get("subset_fonts"):
+        font_bytes = sum(f["bytes"] if f["subset"] else round(f["bytes"] * FONT_SUBSET_RATIO) for f in fonts)
+
+    content = categories["content"]
+    if options.get("deflate", True):
+        content -= round(raw_content * (1 - DEFLATE_RATIO))
+
+    dropped = {
+        "metadata": options.get("strip_xmp"),
+        "thumbnails": options.get("strip_thumbnails"),
+        "attachments": options.get("strip_attachments"),
+    }
+    kept = sum(categories[name] for name, drop in dropped.items() if not drop)
+    return image_bytes + font_bytes + content + kept + categories["other"]
@@ -0,0 +1,70 @@
+"""Cancelamento cooperativo das operações do ``core``.
+
+Uma chamada do MuPDF (``save``, ``insert_pdf``) não pode ser interrompida no
+meio, mas os laços por página ou por imagem podem parar entre uma iteração e
+outra. Quem agenda o trabalho (``services.admission``) instala um
+``CancelToken`` no contexto da thread; o ``core`` só chama ``checkpoint()``,
+que não faz nada quando não há token (workers, pré-processamento, testes).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+DEADLINE = "deadline"
+DISCONNECTED = "disconnected"
+CANCELLED = "cancelled"
+
+
+class OperationCancelled(Exception):
+    """A operação foi interrompida num ``checkpoint()``; ``reason`` diz por quê."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Sinal de parada compartilhado entre o event loop e a thread do ``core``."""
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline  # time.monotonic()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = CANCELLED):
+        if self.reason is None:
+            self.reason = reason
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = DEADLINE
+        return self.reason is not None
+
+    def check(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+@contextmanager
+def installed(token: CancelToken) -> Iterator[CancelToken]:
+    """Torna ``token`` o alvo dos ``checkpoint()`` neste contexto (e nas threads que o copiarem)."""
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current() -> Optional[CancelToken]:
+    return _current.get()
+
+
+def checkpoint():
+    """Levanta ``OperationCancelled`` se a operação em curso foi cancelada ou estourou o prazo."""
+    token = _current.get()
+    if token is not None:
+        token.check()
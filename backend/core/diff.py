@@ -1,23 +1,22 @@
-import fitz
 import difflib
+from typing import List, Optional
 
+from core.cancel import checkpoint
+from core.utils import PdfSource, open_pdf
 
-def compare_pdfs(pdf1_bytes: bytes, pdf2_bytes: bytes) -> str:
-    """Compara o texto de dois PDFs e retorna um HTML com as diferenças."""
-    doc1 = fitz.open(stream=pdf1_bytes, filetype="pdf")
-    doc2 = fitz.open(stream=pdf2_bytes, filetype="pdf")
 
-    text1 = ""
-    for page in doc1:
-        text1 += page.get_text() + "\n"
+def compare_pdfs(
+    src1: PdfSource, src2: PdfSource, pages1: Optional[List[str]] = None, pages2: Optional[List[str]] = None,
+) -> str:
+    """Compara o texto de dois PDFs e retorna um HTML com as diferenças.
 
-    text2 = ""
-    for page in doc2:
-        text2 += page.get_text() + "\n"
-
-    doc1.close()
-    doc2.close()
+    ``pages1``/``pages2`` (texto de cada página, já extraído no
+    pré-processamento) evitam abrir o PDF correspondente.
+    """
+    text1 = _document_text(src1) if pages1 is None else "".join(t + "\n" for t in pages1)
+    text2 = _document_text(src2) if pages2 is None else "".join(t + "\n" for t in pages2)
 
+    checkpoint()
     d = difflib.HtmlDiff(wrapcolumn=80)
     html_diff = d.make_file(
         text1.splitlines(),
@@ -28,3 +27,12 @@ def compare_pdfs(pdf1_bytes: bytes, pdf2_bytes: bytes) -> str:
         numlines=2,
     )
     return html_diff
+
+
+def _document_text(src: PdfSource) -> str:
+    with open_pdf(src) as doc:
+        text = ""
+        for page in doc:
+            checkpoint()
+            text += page.get_text() + "\n"
+    return text
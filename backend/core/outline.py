@@ -0,0 +1,125 @@
+"""Índice do sumário (outline) de um PDF, calculado numa única passada.
+
+``get_toc`` devolve a lista achatada ``[nível, título, página]``. Uma pilha
+com os marcadores ainda "abertos" dá, em O(n), o pai de cada entrada e a
+entrada que encerra o seu intervalo: a primeira seguinte de nível igual ou
+menor — mesmo que ela aponte para uma página inválida (a regra de sempre de
+``get_bookmark_ranges``). A busca antiga, para a frente a partir de cada
+entrada, era O(n²) em sumários com dezenas de milhares de marcadores.
+
+O índice é serializável (``to_dict``/``from_dict``) para ficar no cache de
+derivados e ser compartilhado por upload, metadados, scan, split e pela
+árvore sob demanda do editor.
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import fitz
+
+ROOT = -1
+
+
+class OutlineIndex:
+    def __init__(self, toc: Sequence[Sequence], page_count: int):
+        self.page_count = page_count
+        self.levels = [int(item[0]) for item in toc]
+        self.titles = [str(item[1]) for item in toc]
+        self.pages = [int(item[2]) for item in toc]
+        self.parents: List[int] = []
+        self.children: Dict[int, List[int]] = {ROOT: []}
+        self.ends: List[Optional[int]] = []
+        self._sorted: Dict[int, Tuple[List[int], List[int]]] = {}
+
+        ends = [page_count - 1] * len(toc)
+        stack: List[int] = []
+        for j, level in enumerate(self.levels):
+            while stack and self.levels[stack[-1]] >= level:
+                ends[stack.pop()] = self.pages[j] - 2
+            parent = stack[-1] if stack else ROOT
+            self.parents.append(parent)
+            self.children.setdefault(parent, []).append(j)
+            stack.append(j)
+
+        for i, end in enumerate(ends):
+            start = self.pages[i] - 1
+            self.ends.append(max(start, min(end, page_count - 1)) if self.valid(i) else None)
+
+    @classmethod
+    def from_doc(cls, doc: fitz.Document) -> "OutlineIndex":
+        return cls(doc.get_toc(simple=False), doc.page_count)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OutlineIndex":
+        return cls(data["toc"], data["page_count"])
+
+    def to_dict(self) -> dict:
+        return {"page_count": self.page_count, "toc": [list(item) for item in zip(self.levels, self.titles, self.pages)]}
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def valid(self, i: int) -> bool:
+        return 1 <= self.pages[i] <= self.page_count
+
+    def flat(self) -> List[dict]:
+        """Marcadores como o upload e ``/metadata`` sempre devolveram."""
+        return [{"level": lvl, "title": title, "page": page} for lvl, title, page in zip(self.levels, self.titles, self.pages)]
+
+    def ranges(self) -> List[dict]:
+        """Intervalo de páginas de cada marcador válido (formato de ``get_bookmark_ranges``)."""
+        res = []
+        for i, (lvl, title, page1) in enumerate(zip(self.levels, self.titles, self.pages)):
+            if not self.valid(i):
+                continue
+            start0, end0 = page1 - 1, self.ends[i]
+            disp = f"{'→' * (lvl - 1)}{'↪' if lvl > 1 else ''} {title} (Págs. {start0 + 1}-{end0 + 1})"
+            res.append({
+                "id": f"bm_{i}_{page1}",
+                "display_text": disp,
+                "start_page_0_idx": start0,
+                "end_page_0_idx": end0,
+                "title": title,
+                "level": lvl,
+                "source": "bookmark",
+            })
+        return res
+
+    def splits(self, level: int) -> List[Tuple[str, int]]:
+        """``(título, página inicial 0-based)`` dos marcadores até ``level``, para o split."""
+        return [(self.titles[i], self.pages[i] - 1) for i in range(len(self)) if self.levels[i] <= level]
+
+    def node(self, i: int) -> dict:
+        return {
+            "id": i,
+            "title": self.titles[i],
+            "level": self.levels[i],
+            "page": self.pages[i],
+            "start_page_0_idx": self.pages[i] - 1 if self.valid(i) else None,
+            "end_page_0_idx": self.ends[i],
+            "child_count": len(self.children.get(i, ())),
+        }
+
+    def children_of(self, parent: int = ROOT, offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Filhos diretos de ``parent`` (``ROOT`` = primeiro nível), paginados."""
+        kids = self.children.get(parent, [])
+        end = None if limit is None else offset + limit
+        return [self.node(i) for i in kids[offset:end]]
+
+    def at_page(self, page0: int) -> List[dict]:
+        """Caminho da raiz até o marcador mais profundo cujo intervalo contém ``page0``."""
+        path = []
+        parent = ROOT
+        while True:
+            starts, ids = self._sorted_children(parent)
+            pos = bisect_right(starts, page0) - 1
+            if pos < 0 or self.ends[ids[pos]] < page0:
+                return path
+            parent = ids[pos]
+            path.append(self.node(parent))
+
+    def _sorted_children(self, parent: int) -> Tuple[List[int], List[int]]:
+        # Irmãos válidos por página inicial; montado na primeira busca de cada nó.
+        if parent not in self._sorted:
+            kids = sorted((self.pages[i] - 1, i) for i in self.children.get(parent, []) if self.valid(i))
+            self._sorted[parent] = ([start for start, _ in kids], [i for _, i in kids])
+        return self._sorted[parent]
@@ -1,19 +1,75 @@
+import os
+import shutil
+import hashlib
 import fitz
-from typing import List, Optional, Tuple, Any, Dict
-from core.utils import insert_pages
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Any, Dict, Union
+from core.cancel import checkpoint
+from core.outline import OutlineIndex
+from core.utils import PdfSource, insert_pages, open_pdf, safe_slug
+from core.images import bilevel_stream, classify_tones, dedupe_images, to_gray, write_bilevel
+from core.photos import add_jpeg_page, image_document, passthrough_layout
+from core.resources import scrub_resources, subset_fonts
 
 
 # Filtros que já são eficientes (ou não-foto) — recomprimir em JPEG pioraria.
 _SKIP_IMAGE_FILTERS = {"CCITTFaxDecode", "JBIG2Decode", "JPXDecode"}
 
 
-def recompress_images(doc: fitz.Document, jpeg_quality: int = 75, max_dim: int = 1700) -> int:
+def is_recompressible(img: tuple) -> bool:
+    """Entrada de ``page.get_images(full=True)`` que vale recomprimir em JPEG."""
+    # Pula imagens 1-bit (fax/preto-e-branco) e formatos já eficientes.
+    return img[4] != 1 and img[8] not in _SKIP_IMAGE_FILTERS
+
+
+def encode_jpeg(pix: fitz.Pixmap, jpeg_quality: int, max_dim: int) -> bytes:
+    """Reamostra até ``max_dim`` e codifica em JPEG.
+
+    Pixmaps sem alpha/CMYK são reduzidos no lugar (``shrink``): chamadas com
+    ``max_dim`` decrescente sobre o mesmo pixmap reaproveitam a redução anterior.
+    """
+    # Normaliza CMYK/alpha para RGB (JPEG não suporta alpha/CMYK aqui).
+    if pix.alpha or (pix.colorspace is not None and pix.n - pix.alpha >= 4):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+
+    # Reamostra reduzindo pela metade até caber em max_dim (shrink só halva).
+    while max(pix.width, pix.height) > max_dim and pix.width > 4 and pix.height > 4:
+        pix.shrink(1)
+
+    return pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+
+
+def prepare_tones(pix: fitz.Pixmap, reduce_colors: Optional[str], has_smask: bool = False) -> Tuple[fitz.Pixmap, str]:
+    """Decide o modo de codificação (``"color"``, ``"gray"``, ``"bilevel"``) e converte para cinza se couber."""
+    tones = classify_tones(pix) if reduce_colors else "color"
+    if tones == "bilevel" and (reduce_colors != "bilevel" or has_smask):
+        tones = "gray"
+    return (pix if tones == "color" else to_gray(pix)), tones
+
+
+def encode_prepared(pix: fitz.Pixmap, tones: str, jpeg_quality: int, max_dim: int) -> bytes:
+    """JPEG (cor/cinza) ou Flate de 1 bit, reduzindo ``pix`` no lugar como ``encode_jpeg``."""
+    if tones != "bilevel":
+        return encode_jpeg(pix, jpeg_quality, max_dim)
+    # Traço fino precisa de resolução: o 1 bit mantém até o dobro de max_dim.
+    while max(pix.width, pix.height) > 2 * max_dim and pix.width > 4 and pix.height > 4:
+        pix.shrink(1)
+    return bilevel_stream(pix)
+
+
+def recompress_images(
+    doc: fitz.Document, jpeg_quality: int = 75, max_dim: int = 1700, reduce_colors: Optional[str] = None,
+) -> int:
     """Reamostra e reencoda em JPEG as imagens grandes do documento.
 
     O `deflate` do PyMuPDF não reduz imagens já comprimidas (JPEG). Em PDFs
     escaneados as imagens dominam o tamanho, então a única forma de reduzir é
     recomprimir/reamostrar. Preserva texto e estrutura — só troca os streams
     de imagem. Retorna a quantidade de imagens efetivamente recomprimidas.
+
+    ``reduce_colors``: ``"gray"`` grava imagens que são cinza na prática (texto
+    preto em papel branco salvo em RGB) como JPEG DeviceGray de 1 canal;
+    ``"bilevel"`` também converte as que são preto-e-branco para 1 bit (Flate).
     """
     replaced = 0
     seen: set = set()
@@ -23,11 +79,9 @@ def recompress_images(doc: fitz.Document, jpeg_quality: int = 75, max_dim: int =
             if xref in seen:
                 continue
             seen.add(xref)
+            checkpoint()
 
-            bpc = img[4]
-            img_filter = img[8]
-            # Pula imagens 1-bit (fax/preto-e-branco) e formatos já eficientes.
-            if bpc == 1 or img_filter in _SKIP_IMAGE_FILTERS:
+            if not is_recompressible(img):
                 continue
 
             try:
@@ -41,17 +95,10 @@ def recompress_images(doc: fitz.Document, jpeg_quality: int = 75, max_dim: int =
                 continue
 
             try:
-                # Normaliza CMYK/alpha para RGB (JPEG não suporta alpha/CMYK aqui).
-                if pix.alpha or (pix.colorspace is not None and pix.n - pix.alpha >= 4):
-                    pix = fitz.Pixmap(fitz.csRGB, pix)
-
-                # Reamostra reduzindo pela metade até caber em max_dim (shrink só halva).
-                while max(pix.width, pix.height) > max_dim and pix.width > 4 and pix.height > 4:
-                    pix.shrink(1)
-
-                new_bytes = pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+                pix, tones = prepare_tones(pix, reduce_colors, has_smask=bool(img[1]))
+                new_bytes = encode_prepared(pix, tones, jpeg_quality, max_dim)
+                size = (pix.width, pix.height)
             except Exception:
-                pix = None
                 continue
             finally:
                 pix = None
@@ -61,7 +108,10 @@ def recompress_images(doc: fitz.Document, jpeg_quality: int = 75, max_dim: int =
                 continue
 
             try:
-                page.replace_image(xref, stream=new_bytes)
+                if tones == "bilevel":
+                    write_bilevel(doc, xref, *size, new_bytes)
+                else:
+                    page.replace_image(xref, stream=new_bytes)
                 replaced += 1
             except Exception:
                 continue
@@ -69,191 +119,262 @@ def recompress_images(doc: fitz.Document, jpeg_quality: int = 75, max_dim: int =
     return replaced
 
 
-def optimize_pdf(doc: fitz.Document, options: Optional[Dict[str, Any]] = None) -> bytes:
-    """Salva o documento com opções de otimização."""
-    if options is None:
-        options = {}
-    options = dict(options)
+def _save_options(doc: fitz.Document, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aplica as etapas de fontes/recursos/imagens e devolve as opções de save do PyMuPDF."""
+    options = dict(options or {})
 
-    # Recompressão de imagens (separada das opções de save do PyMuPDF).
+    dedupe = options.pop("dedupe_images", False)
     recompress = options.pop("recompress_images", False)
     jpeg_quality = options.pop("jpeg_quality", 75)
     max_dim = options.pop("max_image_dim", 1700)
+    reduce_colors = options.pop("reduce_colors", None)
+    subset = options.pop("subset_fonts", False)
+    scrub_resources(
+        doc,
+        xmp=options.pop("strip_xmp", False),
+        thumbnails=options.pop("strip_thumbnails", False),
+        attachments=options.pop("strip_attachments", False),
+    )
+    if subset:
+        subset_fonts(doc)
+    if dedupe:
+        # Antes da recompressão: cada imagem repetida é recodificada uma vez só.
+        dedupe_images(doc)
     if recompress:
-        recompress_images(doc, jpeg_quality=jpeg_quality, max_dim=max_dim)
+        recompress_images(doc, jpeg_quality=jpeg_quality, max_dim=max_dim, reduce_colors=reduce_colors)
 
+    checkpoint()
     save_opts: Dict[str, Any] = dict(garbage=4, deflate=True, clean=True)
     save_opts.update(options)
     # MuPDF removeu suporte a linearização ("Linearisation is no longer supported").
     save_opts.pop("linear", None)
-    return doc.tobytes(**save_opts)
+    return save_opts
 
 
-def rotate_pages(pdf_bytes: bytes, rotations: Dict[int, int], optimize: bool = True) -> bytes:
-    """Aplica rotação nas páginas especificadas."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    for page_idx, angle in rotations.items():
-        if 0 <= page_idx < doc.page_count:
-            doc[page_idx].set_rotation(angle)
-    opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
-    return optimize_pdf(doc, opts)
-
+def optimize_pdf(doc: fitz.Document, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """Salva o documento com opções de otimização (em memória)."""
+    return doc.tobytes(**_save_options(doc, options))
 
-def merge_pdfs(pdf_list: List[bytes], optimize: bool = True, password: Optional[str] = None) -> bytes:
-    """Mescla uma lista de PDFs (bytes)."""
-    merged = fitz.open()
-    for pdf_bytes in pdf_list:
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as src:
-            merged.insert_pdf(src)
 
-    opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
+def save_pdf(doc: fitz.Document, dst: Path, options: Optional[Dict[str, Any]] = None) -> int:
+    """Como ``optimize_pdf``, mas grava direto em ``dst``; retorna o tamanho em bytes.
 
-    if password:
-        from config import ENCRYPT_AES_256, PERM_PRINT, PERM_COPY, PERM_ANNOTATE
-        opts.update({
-            "encryption": ENCRYPT_AES_256,
-            "user_pw": password,
-            "owner_pw": password,
-            "permissions": PERM_PRINT | PERM_COPY | PERM_ANNOTATE,
-        })
+    Evita manter a saída inteira em memória junto com o documento.
+    """
+    doc.save(str(dst), **_save_options(doc, options))
+    return os.path.getsize(dst)
 
-    return optimize_pdf(merged, opts)
 
+def save_incremental(src: PdfSource, dst: Path, edit: Callable[[fitz.Document], None]) -> Optional[int]:
+    """Copia o original para ``dst`` e acrescenta só os objetos alterados por ``edit``.
 
-def remove_pages(pdf_bytes: bytes, pages_to_remove: List[int], optimize: bool = True, password: Optional[str] = None) -> bytes:
+    Para edições baratas (``/Rotate``, Info, anotações) o custo é a cópia mais
+    os objetos mudados, não a reserialização do arquivo inteiro. Retorna o
+    tamanho, ou ``None`` se o PDF não aceita atualização incremental (reparado
+    na abertura, protegido por senha) — aí o chamador faz o save completo.
+    """
+    if isinstance(src, bytes):
+        Path(dst).write_bytes(src)
+    else:
+        shutil.copyfile(src, dst)
+    with fitz.open(str(dst)) as doc:
+        if doc.needs_pass or not doc.can_save_incrementally():
+            return None
+        edit(doc)
+        doc.saveIncr()
+    return os.path.getsize(dst)
+
+
+def _password_options(password: Optional[str]) -> Dict[str, Any]:
+    if not password:
+        return {}
+    from config import ENCRYPT_AES_256, PERM_PRINT, PERM_COPY, PERM_ANNOTATE
+    return {
+        "encryption": ENCRYPT_AES_256,
+        "user_pw": password,
+        "owner_pw": password,
+        "permissions": PERM_PRINT | PERM_COPY | PERM_ANNOTATE,
+    }
+
+
+def rotate_pages(src: PdfSource, dst: Path, rotations: Dict[int, int], optimize: bool = False) -> int:
+    """Aplica rotação nas páginas especificadas.
+
+    Por padrão só acrescenta os ``/Rotate`` alterados ao original (atualização
+    incremental); com ``optimize`` reescreve e comprime o arquivo inteiro.
+    """
+    def _rotate(doc: fitz.Document):
+        for page_idx, angle in rotations.items():
+            if 0 <= page_idx < doc.page_count:
+                doc[page_idx].set_rotation(angle)
+
+    if not optimize:
+        size = save_incremental(src, dst, _rotate)
+        if size is not None:
+            return size
+    with open_pdf(src) as doc:
+        _rotate(doc)
+        opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
+        return save_pdf(doc, dst, opts)
+
+
+def merge_pdfs(sources: List[PdfSource], dst: Path, optimize: bool = True, password: Optional[str] = None) -> int:
+    """Mescla uma lista de PDFs (caminhos ou bytes)."""
+    with fitz.open() as merged:
+        for src in sources:
+            checkpoint()
+            with open_pdf(src) as doc:
+                merged.insert_pdf(doc)
+
+        opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
+        opts.update(_password_options(password))
+        return save_pdf(merged, dst, opts)
+
+
+def remove_pages(
+    src: PdfSource, dst: Path, pages_to_remove: List[int], optimize: bool = True, password: Optional[str] = None,
+) -> int:
     """Remove páginas especificadas de um PDF."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    doc.delete_pages(pages_to_remove)
+    with open_pdf(src) as doc:
+        doc.delete_pages(pages_to_remove)
+        opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
+        opts.update(_password_options(password))
+        return save_pdf(doc, dst, opts)
 
-    opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
-    if password:
-        from config import ENCRYPT_AES_256, PERM_PRINT, PERM_COPY, PERM_ANNOTATE
-        opts.update({
-            "encryption": ENCRYPT_AES_256,
-            "user_pw": password,
-            "owner_pw": password,
-            "permissions": PERM_PRINT | PERM_COPY | PERM_ANNOTATE,
-        })
 
-    return optimize_pdf(doc, opts)
+def extract_pages(
+    src: PdfSource, dst: Path, pages_to_extract: List[int], optimize: bool = True, password: Optional[str] = None,
+) -> int:
+    """Extrai páginas específicas para um novo PDF."""
+    with open_pdf(src) as src_doc, fitz.open() as new_doc:
+        insert_pages(new_doc, src_doc, pages_to_extract)
+        opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
+        opts.update(_password_options(password))
+        return save_pdf(new_doc, dst, opts)
 
 
-def extract_pages(pdf_bytes: bytes, pages_to_extract: List[int], optimize: bool = True, password: Optional[str] = None) -> bytes:
-    """Extrai páginas específicas para um novo PDF."""
-    src_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    new_doc = fitz.open()
-    insert_pages(new_doc, src_doc, pages_to_extract)
-
-    opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
-    if password:
-        from config import ENCRYPT_AES_256, PERM_PRINT, PERM_COPY, PERM_ANNOTATE
-        opts.update({
-            "encryption": ENCRYPT_AES_256,
-            "user_pw": password,
-            "owner_pw": password,
-            "permissions": PERM_PRINT | PERM_COPY | PERM_ANNOTATE,
-        })
-
-    return optimize_pdf(new_doc, opts)
-
-
-def split_pdf_by_count(pdf_bytes: bytes, pages_per_part: int, optimize: bool = True) -> List[Tuple[str, bytes]]:
-    """Divide o PDF a cada N páginas."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    parts = []
-    total_pages = doc.page_count
-
-    for i in range(0, total_pages, pages_per_part):
-        part_doc = fitz.open()
-        rng = list(range(i, min(i + pages_per_part, total_pages)))
-        insert_pages(part_doc, doc, rng)
-        part_bytes = part_doc.tobytes(
-            garbage=3, deflate=True, clean=True,
-            deflate_images=optimize, deflate_fonts=optimize,
-        )
-        part_name_suffix = f"_parte_{i // pages_per_part + 1}"
-        parts.append((part_name_suffix, part_bytes))
-        part_doc.close()
+def _save_part(doc: fitz.Document, dst_dir: Path, parts: List[Tuple[str, Path]], suffix: str, optimize: bool):
+    """Grava a próxima parte em ``dst_dir`` e a acrescenta a ``parts``."""
+    checkpoint()
+    path = dst_dir / f"{len(parts) + 1:04d}.pdf"
+    doc.save(str(path), garbage=3, deflate=True, clean=True, deflate_images=optimize, deflate_fonts=optimize)
+    parts.append((suffix, path))
 
+
+def split_pdf_by_count(src: PdfSource, dst_dir: Path, pages_per_part: int, optimize: bool = True) -> List[Tuple[str, Path]]:
+    """Divide o PDF a cada N páginas; as partes são gravadas em ``dst_dir``."""
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    parts = []
+    with open_pdf(src) as doc:
+        total_pages = doc.page_count
+        for i in range(0, total_pages, pages_per_part):
+            with fitz.open() as part_doc:
+                rng = list(range(i, min(i + pages_per_part, total_pages)))
+                insert_pages(part_doc, doc, rng)
+                _save_part(part_doc, dst_dir, parts, f"_parte_{i // pages_per_part + 1}", optimize)
     return parts
 
 
-def split_pdf_by_size(pdf_bytes: bytes, max_mb: float, optimize: bool = True) -> List[Tuple[str, bytes]]:
+def split_pdf_by_size(src: PdfSource, dst_dir: Path, max_mb: float, optimize: bool = True) -> List[Tuple[str, Path]]:
     """Divide o PDF tentando respeitar um tamanho máximo em MB."""
+    dst_dir.mkdir(parents=True, exist_ok=True)
     parts = []
     max_bytes = int(max_mb * 1024 * 1024)
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     cur_doc = fitz.open()
-
-    for p in range(doc.page_count):
-        cur_doc.insert_pdf(doc, from_page=p, to_page=p)
-        tmp_bytes = cur_doc.tobytes(garbage=1, deflate=True)
-
-        if len(tmp_bytes) > max_bytes:
-            if cur_doc.page_count > 1:
-                final_part = fitz.open()
-                final_part.insert_pdf(cur_doc, from_page=0, to_page=cur_doc.page_count - 2)
-                parts.append((
-                    f"_parte_{len(parts) + 1}",
-                    final_part.tobytes(garbage=3, deflate=True, clean=True, deflate_images=optimize, deflate_fonts=optimize),
-                ))
-                final_part.close()
-
-                last_page_doc = fitz.open()
-                last_page_doc.insert_pdf(cur_doc, from_page=cur_doc.page_count - 1, to_page=cur_doc.page_count - 1)
-                cur_doc.close()
-                cur_doc = last_page_doc
-            else:
-                parts.append((
-                    f"_parte_{len(parts) + 1}",
-                    cur_doc.tobytes(garbage=3, deflate=True, clean=True, deflate_images=optimize, deflate_fonts=optimize),
-                ))
-                cur_doc.close()
-                cur_doc = fitz.open()
-
-    if cur_doc.page_count > 0:
-        parts.append((
-            f"_parte_{len(parts) + 1}",
-            cur_doc.tobytes(garbage=3, deflate=True, clean=True, deflate_images=optimize, deflate_fonts=optimize),
-        ))
-    cur_doc.close()
+    try:
+        with open_pdf(src) as doc:
+            for p in range(doc.page_count):
+                checkpoint()
+                cur_doc.insert_pdf(doc, from_page=p, to_page=p)
+                tmp_size = len(cur_doc.tobytes(garbage=1, deflate=True))
+
+                if tmp_size > max_bytes:
+                    if cur_doc.page_count > 1:
+                        with fitz.open() as final_part:
+                            final_part.insert_pdf(cur_doc, from_page=0, to_page=cur_doc.page_count - 2)
+                            _save_part(final_part, dst_dir, parts, f"_parte_{len(parts) + 1}", optimize)
+
+                        last_page_doc = fitz.open()
+                        last_page_doc.insert_pdf(cur_doc, from_page=cur_doc.page_count - 1, to_page=cur_doc.page_count - 1)
+                        cur_doc.close()
+                        cur_doc = last_page_doc
+                    else:
+                        _save_part(cur_doc, dst_dir, parts, f"_parte_{len(parts) + 1}", optimize)
+                        cur_doc.close()
+                        cur_doc = fitz.open()
+
+        if cur_doc.page_count > 0:
+            _save_part(cur_doc, dst_dir, parts, f"_parte_{len(parts) + 1}", optimize)
+    finally:
+        cur_doc.close()
     return parts
 
 
-def split_pdf_by_bookmarks(pdf_bytes: bytes, level: int = 1, optimize: bool = True) -> List[Tuple[str, bytes]]:
-    """Divide o PDF pelos marcadores de nível especificado."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    toc = doc.get_toc(simple=False)
-    parts = []
+def split_pdf_by_bookmarks(
+    src: PdfSource, dst_dir: Path, level: int = 1, optimize: bool = True, outline: Optional[OutlineIndex] = None,
+) -> List[Tuple[str, Path]]:
+    """Divide o PDF pelos marcadores de nível especificado.
 
-    splits = [(item[1], item[2] - 1) for item in toc if item[0] <= level]
-    if not splits:
-        return [("_completo", doc.tobytes(garbage=3, deflate=True, clean=True))]
-
-    for i, (title, start_page) in enumerate(splits):
-        end_page = splits[i + 1][1] - 1 if i + 1 < len(splits) else doc.page_count - 1
-        part_doc = fitz.open()
-        rng = list(range(start_page, end_page + 1))
-        insert_pages(part_doc, doc, rng)
-        from core.utils import safe_slug
-        slug = safe_slug(title, maxlen=40)
-        parts.append((
-            f"_{slug}",
-            part_doc.tobytes(garbage=3, deflate=True, clean=True, deflate_images=optimize, deflate_fonts=optimize),
-        ))
-        part_doc.close()
+    ``outline`` (índice do sumário já calculado para o arquivo) evita reler o ``get_toc``.
+    """
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    with open_pdf(src) as doc:
+        parts = []
+
+        splits = (outline if outline is not None else OutlineIndex.from_doc(doc)).splits(level)
+        if not splits:
+            path = dst_dir / "completo.pdf"
+            doc.save(str(path), garbage=3, deflate=True, clean=True)
+            return [("_completo", path)]
+
+        for i, (title, start_page) in enumerate(splits):
+            end_page = splits[i + 1][1] - 1 if i + 1 < len(splits) else doc.page_count - 1
+            with fitz.open() as part_doc:
+                rng = list(range(start_page, end_page + 1))
+                insert_pages(part_doc, doc, rng)
+                slug = safe_slug(title, maxlen=40)
+                _save_part(part_doc, dst_dir, parts, f"_{slug}", optimize)
 
     return parts
 
 
-def images_to_pdf(image_list: List[bytes], optimize: bool = True) -> bytes:
-    """Converte lista de imagens (bytes) em um único PDF."""
+def images_to_pdf(
+    images: List[Union[str, Path]],
+    dst: Path,
+    optimize: bool = True,
+    target_dpi: Optional[int] = None,
+    converted: Optional[Dict[int, Union[str, Path]]] = None,
+    layouts: Optional[List[Optional[Tuple[Dict[str, int], fitz.Rect]]]] = None,
+) -> int:
+    """Converte imagens (caminhos no disco) em um único PDF gravado em ``dst``.
+
+    Lê uma imagem por vez. JPEGs comuns são embutidos sem recodificar (com o
+    ``layouts`` já calculado por ``passthrough_layouts``, se vier); os demais
+    usam os PDFs de ``converted`` (caminhos por índice, gravados nos workers com
+    ``image_to_pdf``) ou são convertidos aqui mesmo.
+    """
     doc = fitz.open()
-    for img_bytes in image_list:
-        with fitz.open(stream=img_bytes) as img_doc:
-            pdf_bytes = img_doc.convert_to_pdf()
-            with fitz.open("pdf", pdf_bytes) as pdf_page:
+    try:
+        # Mesma foto enviada duas vezes vira um xref só (o save não usa garbage=4,
+        # que compararia todos os streams de imagem).
+        xrefs: Dict[str, int] = {}
+        for i, source in enumerate(images):
+            checkpoint()
+            pdf_path = (converted or {}).get(i)
+            if pdf_path is not None:
+                with fitz.open(str(pdf_path)) as pdf_page:
+                    doc.insert_pdf(pdf_page)
+                continue
+            data = Path(source).read_bytes()
+            layout = layouts[i] if layouts is not None else passthrough_layout(data, target_dpi)
+            if layout is not None:
+                digest = hashlib.sha256(data).hexdigest()
+                xrefs[digest] = add_jpeg_page(doc, data, *layout, xref=xrefs.get(digest, 0))
+                continue
+            with image_document(str(source), target_dpi) as pdf_page:
                 doc.insert_pdf(pdf_page)
 
-    opts: Dict[str, Any] = {"deflate_images": optimize, "deflate_fonts": optimize}
-    return optimize_pdf(doc, opts)
+        opts: Dict[str, Any] = {"garbage": 3, "deflate_images": optimize, "deflate_fonts": optimize}
+        return save_pdf(doc, dst, opts)
+    finally:
+        doc.close()
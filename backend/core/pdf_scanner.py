@@ -1,54 +1,33 @@
 import fitz
 import re
+from typing import List, Optional
 from unidecode import unidecode
 from config import LEGAL_KEYWORDS, PRE_SELECTED, LEGAL_REGEX_PATTERNS
+from core.cancel import checkpoint
+from core.outline import OutlineIndex
 
 
 def get_bookmark_ranges(doc: fitz.Document):
     """Extrai marcadores e calcula os intervalos de páginas que eles cobrem."""
-    toc = doc.get_toc(simple=False)
-    res = []
-    for i, item in enumerate(toc):
-        lvl, title, page1 = item[0], item[1], item[2]
-        if not (1 <= page1 <= doc.page_count):
-            continue
-
-        start0 = page1 - 1
-        end0 = doc.page_count - 1
-
-        for j in range(i + 1, len(toc)):
-            if toc[j][0] <= lvl:
-                end0 = toc[j][2] - 2
-                break
-
-        end0 = max(start0, min(end0, doc.page_count - 1))
-        disp = f"{'→' * (lvl - 1)}{'↪' if lvl > 1 else ''} {title} (Págs. {start0 + 1}-{end0 + 1})"
+    return OutlineIndex.from_doc(doc).ranges()
 
-        res.append({
-            "id": f"bm_{i}_{page1}",
-            "display_text": disp,
-            "start_page_0_idx": start0,
-            "end_page_0_idx": end0,
-            "title": title,
-            "level": lvl,
-            "source": "bookmark",
-        })
-    return res
 
-
-def smart_scan(doc: fitz.Document):
+def smart_scan(doc: fitz.Document, page_texts: Optional[List[str]] = None, outline: Optional[OutlineIndex] = None):
     """
     Varre o conteúdo textual das páginas para identificar inícios de peças.
     Retorna lista de dicionários compatível com bookmarks.
+    ``page_texts`` (texto já extraído de cada página) evita extrair de novo;
+    ``outline`` (índice do sumário já calculado) evita reler o ``get_toc``.
     """
-    bookmarks = get_bookmark_ranges(doc)
+    bookmarks = (outline if outline is not None else OutlineIndex.from_doc(doc)).ranges()
     if bookmarks and len(bookmarks) >= 3:
         return find_legal_sections(bookmarks)
 
     found_items = []
     for page_num in range(doc.page_count):
-        page = doc[page_num]
-        text = page.get_text("text").strip()
+        checkpoint()
+        text = page_texts[page_num] if page_texts is not None else doc[page_num].get_text("text")
+        text = text.strip()
         if not text:
             continue
 
@@ -105,6 +84,22 @@ def smart_scan(doc: fitz.Document):
     return found_items
 
 
+def scan_path(path: str, outline: Optional[dict] = None) -> dict:
+    """``smart_scan`` e marcadores de um PDF aberto pelo caminho (roda nos workers).
+
+    ``outline`` é o índice do sumário já serializado no cache, se houver.
+    """
+    with fitz.open(path) as doc:
+        if doc.needs_pass:
+            raise ValueError("PDF protegido por senha")
+        outline = OutlineIndex.from_dict(outline) if outline is not None else OutlineIndex.from_doc(doc)
+        return {
+            "page_count": doc.page_count,
+            "pieces": smart_scan(doc, outline=outline),
+            "bookmarks": outline.ranges(),
+        }
+
+
 def find_legal_sections(bookmarks):
     """Identifica peças jurídicas nos marcadores baseando-se em palavras-chave."""
     out = []
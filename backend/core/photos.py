@@ -0,0 +1,186 @@
+"""Imagens (fotos, capturas de tela) -> páginas PDF.
+
+JPEGs comuns entram como estão: o stream DCT é embutido sem decodificar nem
+recodificar, numa página do tamanho dado pelos metadados da imagem. O resto
+(PNG, TIFF, JPEG CMYK/aritmético, EXIF espelhado, redução para ``target_dpi``)
+passa pela conversão do MuPDF em ``image_to_pdf``, que roda nos workers.
+"""
+import fitz
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# SOF baseline, estendido e progressivo (Huffman): o que todo leitor de PDF decodifica.
+_SOF_PASSTHROUGH = {0xC0, 0xC1, 0xC2}
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# EXIF Orientation -> ``rotate`` de insert_image (anti-horário). Espelhadas (2, 4, 5, 7) vão para a conversão.
+_ORIENTATION_ROTATE = {1: 0, 3: 180, 6: 270, 8: 90}
+_COLORSPACES = {1: "/DeviceGray", 3: "/DeviceRGB"}
+
+# Com ``target_dpi`` a página é encaixada em A4 (na orientação da imagem), sem ampliar.
+A4 = fitz.paper_rect("a4")
+# Folga antes de reamostrar: imagens só um pouco acima do alvo ficam como estão.
+DPI_TOLERANCE = 1.1
+
+
+def _exif_orientation(tiff: bytes) -> int:
+    """Tag 0x0112 do IFD0 de um bloco EXIF (cabeçalho TIFF)."""
+    if tiff[:2] == b"II":
+        order = "little"
+    elif tiff[:2] == b"MM":
+        order = "big"
+    else:
+        return 1
+    ifd = int.from_bytes(tiff[4:8], order)
+    if ifd + 2 > len(tiff):
+        return 1
+    for i in range(int.from_bytes(tiff[ifd:ifd + 2], order)):
+        entry = ifd + 2 + 12 * i
+        if entry + 12 > len(tiff):
+            break
+        if int.from_bytes(tiff[entry:entry + 2], order) == 0x0112:
+            return int.from_bytes(tiff[entry + 8:entry + 10], order)
+    return 1
+
+
+def jpeg_header(data: bytes) -> Optional[Dict[str, int]]:
+    """Lê os marcadores até o SOF: dimensões, componentes, tipo de SOF e orientação EXIF."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    orientation = 1
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            pos += 2
+            continue
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            orientation = _exif_orientation(segment[6:])
+        elif marker in _SOF and len(segment) >= 6:
+            return {
+                "sof": marker,
+                "precision": segment[0],
+                "height": int.from_bytes(segment[1:3], "big"),
+                "width": int.from_bytes(segment[3:5], "big"),
+                "components": segment[5],
+                "orientation": orientation,
+            }
+        pos += 2 + length
+    return None
+
+
+def fit_page(rect: fitz.Rect, target_dpi: Optional[int]) -> fitz.Rect:
+    """Tamanho da página: o da imagem ou, com ``target_dpi``, encaixado em A4 sem ampliar."""
+    if not target_dpi:
+        return fitz.Rect(0, 0, rect.width, rect.height)
+    paper = A4 if rect.height >= rect.width else fitz.Rect(0, 0, A4.height, A4.width)
+    scale = min(1, paper.width / rect.width, paper.height / rect.height)
+    return fitz.Rect(0, 0, rect.width * scale, rect.height * scale)
+
+
+def passthrough_layout(data: bytes, target_dpi: Optional[int] = None) -> Optional[Tuple[Dict[str, int], fitz.Rect]]:
+    """``(cabeçalho JPEG, página)`` se a imagem pode ser embutida como está; senão ``None``."""
+    header = jpeg_header(data)
+    if (
+        header is None
+        or header["sof"] not in _SOF_PASSTHROUGH
+        or header["precision"] != 8
+        or header["components"] not in _COLORSPACES
+        or header["orientation"] not in _ORIENTATION_ROTATE
+        or not header["width"] or not header["height"]
+    ):
+        return None
+    # Tamanho pelos metadados, com as mesmas regras de resolução do MuPDF (só lê o cabeçalho).
+    try:
+        with fitz.open(stream=data, filetype="jpeg") as img:
+            rect = fit_page(img[0].rect, target_dpi)
+    except Exception:
+        return None
+    if target_dpi:
+        long_px = max(header["width"], header["height"])
+        if long_px > max(rect.width, rect.height) / 72 * target_dpi * DPI_TOLERANCE:
+            return None
+    return header, rect
+
+
+def passthrough_layouts(
+    paths: Sequence[Union[str, Path]], target_dpi: Optional[int] = None,
+) -> List[Optional[Tuple[Dict[str, int], fitz.Rect]]]:
+    """``passthrough_layout`` de cada arquivo, lendo uma imagem por vez."""
+    return [passthrough_layout(Path(path).read_bytes(), target_dpi) for path in paths]
+
+
+def add_jpeg_page(doc: fitz.Document, data: bytes, header: Dict[str, int], rect: fitz.Rect, xref: int = 0) -> int:
+    """Nova página com o JPEG ``data`` embutido como stream DCT (ou reaproveitando ``xref``)."""
+    if not xref:
+        xref = doc.get_new_xref()
+        doc.update_object(xref, (
+            f"<</Type/XObject/Subtype/Image/Width {header['width']}/Height {header['height']}"
+            f"/ColorSpace{_COLORSPACES[header['components']]}/BitsPerComponent 8>>"
+        ))
+        # update_stream sem compressão apaga /Filter: define depois.
+        doc.update_stream(xref, data, compress=False)
+        doc.xref_set_key(xref, "Filter", "/DCTDecode")
+    page = doc.new_page(width=rect.width, height=rect.height)
+    page.insert_image(page.rect, xref=xref, rotate=_ORIENTATION_ROTATE[header["orientation"]])
+    return xref
+
+
+def image_document(source: Union[str, bytes], target_dpi: Optional[int] = None,
+                   jpeg_quality: int = 85) -> fitz.Document:
+    """Converte uma imagem (caminho ou bytes) num documento PDF pelo MuPDF.
+
+    Sem ``target_dpi`` é o ``convert_to_pdf`` de sempre (uma página por quadro,
+    EXIF aplicado). Com ``target_dpi``, cada página é encaixada em A4 e a imagem
+    reamostrada para no máximo essa resolução: JPEG se a origem era JPEG, sem
+    perdas caso contrário (capturas de tela). O chamador fecha o documento.
+    """
+    with (fitz.open(source) if isinstance(source, str) else fitz.open(stream=source)) as img:
+        converted = img.convert_to_pdf()
+    src = fitz.open("pdf", converted)
+    if not target_dpi:
+        return src
+
+    out = fitz.open()
+    try:
+        for page in src:
+            rect = fit_page(page.rect, target_dpi)
+            images = page.get_images(full=True)
+            new_page = out.new_page(width=rect.width, height=rect.height)
+            long_px = max(images[0][2], images[0][3]) if images else 0
+            if long_px <= max(rect.width, rect.height) / 72 * target_dpi * DPI_TOLERANCE:
+                new_page.show_pdf_page(new_page.rect, src, page.number)
+                continue
+            zoom = target_dpi / 72 * rect.width / page.rect.width
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            if images and images[0][8] == "DCTDecode":
+                new_page.insert_image(new_page.rect, stream=pix.tobytes("jpeg", jpg_quality=jpeg_quality))
+            else:
+                new_page.insert_image(new_page.rect, pixmap=pix)
+    except Exception:
+        out.close()
+        raise
+    finally:
+        src.close()
+    return out
+
+
+def image_to_pdf(source: Union[str, bytes], dst: Union[str, Path], target_dpi: Optional[int] = None,
+                 jpeg_quality: int = 85) -> int:
+    """``image_document`` gravado em ``dst``; roda no worker e retorna o tamanho.
+
+    O PDF vai para o disco, não de volta pelo pipe: numa conversão de muitas
+    fotos, o processo principal só junta os caminhos no merge.
+    """
+    with image_document(source, target_dpi, jpeg_quality) as doc:
+        if target_dpi:
+            doc.save(str(dst), garbage=3, deflate=True)
+        else:
+            doc.save(str(dst))
+    return Path(dst).stat().st_size
@@ -0,0 +1,60 @@
+"""Etapas do pré-processamento em segundo plano (rodam no pool de services/preprocess.py).
+
+Cada função abre o PDF pelo caminho e devolve um resultado serializável; quem
+grava no cache de derivados é o processo principal.
+"""
+import os
+from typing import Optional
+
+import fitz
+
+from core.outline import OutlineIndex
+from core.pdf_scanner import smart_scan
+from core.render import thumbnail_entry
+
+
+def summarize(path: str, normalized: str, with_outline: bool = True) -> dict:
+    """Páginas e metadados; grava em ``normalized`` uma cópia reparada se o MuPDF precisou reparar o arquivo.
+
+    Um PDF com xref quebrado é reparado a cada abertura (e não aceita save
+    incremental); a cópia normalizada evita repetir isso em cada worker.
+    Com ``with_outline`` (o upload ainda não indexou o sumário), inclui o
+    índice serializado em ``"outline"``.
+    """
+    with fitz.open(path) as doc:
+        if doc.needs_pass:
+            return {"pages": 0, "metadata": {}, "encrypted": True, "normalized": False}
+        summary = {
+            "pages": doc.page_count,
+            "metadata": doc.metadata or {},
+            "encrypted": False,
+            "normalized": doc.is_repaired,
+        }
+        if with_outline:
+            summary["outline"] = OutlineIndex.from_doc(doc).to_dict()
+        if doc.is_repaired:
+            part = f"{normalized}.{os.getpid()}.part"
+            doc.save(part, garbage=1)
+            os.replace(part, normalized)
+    return summary
+
+
+def scan_text(path: str, outline: Optional[dict] = None) -> tuple[list[str], dict]:
+    """Texto de cada página e o resultado do ``smart_scan`` (uma única extração de texto).
+
+    ``outline`` é o índice do sumário já serializado no cache, se houver.
+    """
+    with fitz.open(path) as doc:
+        index = OutlineIndex.from_dict(outline) if outline is not None else OutlineIndex.from_doc(doc)
+        texts = [page.get_text("text") for page in doc]
+        return texts, {
+            "page_count": doc.page_count,
+            "pieces": smart_scan(doc, texts, index),
+            "bookmarks": index.ranges(),
+        }
+
+
+def first_thumbnails(path: str, count: int, dpi: int) -> list[dict]:
+    """Miniaturas das ``count`` primeiras páginas (as que o editor visual mostra primeiro)."""
+    with fitz.open(path) as doc:
+        return [thumbnail_entry(doc[i], dpi) for i in range(min(count, doc.page_count))]
@@ -0,0 +1,86 @@
+"""Renderização de páginas em lote (roda nos workers de services/workers.py).
+
+Sem dependências do app: as funções aqui são executadas em processos
+separados e recebem o caminho do PDF.
+"""
+import os
+import base64
+from collections import OrderedDict
+
+import fitz
+
+# Documentos abertos neste worker, por caminho: miniaturas chegam página a
+# página, e reabrir (reparsear o xref) a cada uma custaria mais que renderizar.
+_DOC_CACHE_SIZE = 4
+_docs: "OrderedDict[tuple, fitz.Document]" = OrderedDict()
+
+
+def _open_cached(path: str) -> fitz.Document:
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    doc = _docs.get(key)
+    if doc is not None:
+        _docs.move_to_end(key)
+        return doc
+    doc = fitz.open(path)
+    _docs[key] = doc
+    while len(_docs) > _DOC_CACHE_SIZE:
+        _docs.popitem(last=False)[1].close()
+    return doc
+
+
+def thumbnail_entry(page: fitz.Page, dpi: int) -> dict:
+    """Miniatura PNG de uma página no formato da API (data URI em base64)."""
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    pix = page.get_pixmap(matrix=mat)
+    b64 = base64.b64encode(pix.tobytes("png")).decode()
+    return {
+        "page": page.number,
+        "width": pix.width,
+        "height": pix.height,
+        "data": f"data:image/png;base64,{b64}",
+    }
+
+
+def render_thumbnail(path: str, page: int, dpi: int) -> dict:
+    """Uma miniatura (roda no worker; o documento fica aberto para as próximas)."""
+    return thumbnail_entry(_open_cached(path)[page], dpi)
+
+
+def render_tiles(path: str, pages: list[int], dpi: float) -> list[tuple[int, int, int, bytes]]:
+    """Renderiza ``pages`` em RGB e retorna ``(página, largura, altura, amostras)``."""
+    doc = fitz.open(path)
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    tiles = []
+    try:
+        for i in pages:
+            pix = doc[i].get_pixmap(matrix=mat, colorspace=fitz.csRGB, alpha=False)
+            tiles.append((i, pix.width, pix.height, pix.samples))
+    finally:
+        doc.close()
+    return tiles
+
+
+def compose_sprite(tiles: list[tuple[int, int, int, bytes]], columns: int, quality: int = 70) -> tuple[bytes, dict]:
+    """Monta as miniaturas numa única folha JPEG e devolve (imagem, mapa de posições).
+
+    Cada célula da grade tem o tamanho da maior miniatura; a página fica no
+    canto superior esquerdo da célula e o mapa traz sua posição exata.
+    """
+    cell_w = max(t[1] for t in tiles)
+    cell_h = max(t[2] for t in tiles)
+    columns = max(1, min(columns, len(tiles)))
+    rows = -(-len(tiles) // columns)
+
+    sheet = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, columns * cell_w, rows * cell_h), False)
+    sheet.clear_with(255)
+    positions = []
+    for n, (page, w, h, samples) in enumerate(tiles):
+        x, y = (n % columns) * cell_w, (n // columns) * cell_h
+        tile = fitz.Pixmap(fitz.csRGB, w, h, samples, False)
+        tile.set_origin(x, y)
+        sheet.copy(tile, tile.irect)
+        positions.append({"page": page, "x": x, "y": y, "width": w, "height": h})
+
+    layout = {"width": sheet.width, "height": sheet.height, "columns": columns, "tiles": positions}
+    return sheet.tobytes("jpg", jpg_quality=quality), layout
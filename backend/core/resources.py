@@ -0,0 +1,121 @@
+"""Fontes e recursos embutidos: subconjunto de fontes, limpeza e contabilidade por categoria.
+
+PDFs gerados por suítes de escritório costumam embutir fontes inteiras (CJK e
+Unicode completas passam fácil de 1 MB), XMP, miniaturas de página e anexos que,
+em documentos só de texto, pesam mais que o conteúdo.
+"""
+import fitz
+from typing import Dict, Set
+
+CATEGORIES = ("images", "fonts", "content", "metadata", "thumbnails", "attachments", "other")
+
+FONT_FILE_KEYS = ("FontFile", "FontFile2", "FontFile3")
+
+
+def _ref(value: str) -> int:
+    return int(value.split()[0])
+
+
+def stream_length(doc: fitz.Document, xref: int) -> int:
+    kind, value = doc.xref_get_key(xref, "Length")
+    if kind == "int":
+        return int(value)
+    if kind == "xref":
+        try:
+            return int(doc.xref_object(_ref(value)))
+        except ValueError:
+            pass
+    return len(doc.xref_stream_raw(xref) or b"")
+
+
+def category_sizes(doc: fitz.Document, file_size: int) -> Dict[str, int]:
+    """Bytes do arquivo por categoria (streams comprimidos, como estão no disco).
+
+    ``other`` fica com o resto: dicionários, tabela de xref e streams sem
+    categoria. Lê só os ``/Length`` — não decodifica nada.
+    """
+    fonts: Set[int] = set()
+    thumbnails: Set[int] = set()
+    content: Set[int] = set()
+    for page in doc:
+        kind, value = doc.xref_get_key(page.xref, "Thumb")
+        if kind == "xref":
+            thumbnails.add(_ref(value))
+        content.update(page.get_contents())
+
+    streams = []
+    for xref in range(1, doc.xref_length()):
+        kind, value = doc.xref_get_key(xref, "Type")
+        if value == "/FontDescriptor":
+            for key in FONT_FILE_KEYS:
+                kind, ref = doc.xref_get_key(xref, key)
+                if kind == "xref":
+                    fonts.add(_ref(ref))
+        if doc.xref_is_stream(xref):
+            streams.append((xref, value))
+
+    sizes = dict.fromkeys(CATEGORIES, 0)
+    for xref, type_ in streams:
+        if xref in fonts:
+            category = "fonts"
+        elif xref in thumbnails:
+            category = "thumbnails"
+        elif doc.xref_get_key(xref, "Subtype")[1] == "/Image":
+            category = "images"
+        elif xref in content or doc.xref_get_key(xref, "Subtype")[1] == "/Form":
+            category = "content"
+        elif type_ == "/Metadata":
+            category = "metadata"
+        elif type_ == "/EmbeddedFile":
+            category = "attachments"
+        else:
+            continue
+        sizes[category] += stream_length(doc, xref)
+    sizes["other"] = max(file_size - sum(sizes.values()), 0)
+    return sizes
+
+
+def scrub_resources(
+    doc: fitz.Document, xmp: bool = False, thumbnails: bool = False, attachments: bool = False,
+) -> int:
+    """Remove recursos que não aparecem na página impressa.
+
+    ``xmp``: metadados XMP e dados privados do editor (``/PieceInfo``);
+    ``thumbnails``: miniaturas de página (``/Thumb``); ``attachments``: anexos
+    do documento. O dicionário Info (título/autor) é preservado. O que fica sem
+    referência sai no ``garbage`` do save. Retorna quantos itens foram removidos.
+    """
+    catalog = doc.pdf_catalog()
+    removed = 0
+    if xmp:
+        if doc.xref_get_key(catalog, "Metadata")[0] != "null":
+            doc.del_xml_metadata()
+            removed += 1
+        holders = [catalog] + [page.xref for page in doc]
+        for xref in holders:
+            if doc.xref_get_key(xref, "PieceInfo")[0] != "null":
+                doc.xref_set_key(xref, "PieceInfo", "null")
+                removed += 1
+    if thumbnails:
+        for page in doc:
+            if doc.xref_get_key(page.xref, "Thumb")[0] != "null":
+                doc.xref_set_key(page.xref, "Thumb", "null")
+                removed += 1
+    if attachments:
+        for name in doc.embfile_names():
+            doc.embfile_del(name)
+            removed += 1
+    return removed
+
+
+def subset_fonts(doc: fitz.Document) -> bool:
+    """Reduz as fontes embutidas aos glifos usados (subconjunto nativo do MuPDF).
+
+    Fontes que o MuPDF não sabe recortar ficam como estão; qualquer falha
+    deixa o documento intacto.
+    """
+    try:
+        doc.subset_fonts()
+    except Exception:
+        return False
+    return True
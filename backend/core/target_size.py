@@ -0,0 +1,135 @@
+"""Otimização com tamanho-alvo (limites de upload dos sistemas de peticionamento).
+
+Em vez de tentar perfis às cegas, estima o tamanho final a partir de uma
+amostra das imagens recomprimidas em cada degrau da escada de qualidade
+(``LADDER``) e escolhe o degrau mais brando que cabe no alvo. As codificações
+de teste rodam nos workers (``trial_encode`` recebe o caminho do PDF).
+"""
+import hashlib
+import fitz
+from typing import Dict, List, Optional, Tuple
+
+from core.pdf_ops import encode_prepared, is_recompressible, prepare_tones
+
+# (max_image_dim, jpeg_quality), do mais brando ao mais agressivo.
+LADDER: List[Tuple[int, int]] = [
+    (2200, 85), (2200, 75), (1700, 75), (1700, 65), (1400, 60), (1240, 60),
+    (1240, 50), (1000, 50), (1000, 40), (800, 40), (800, 30), (600, 30),
+]
+
+# Margem sobre o alvo: a estimativa é por amostragem, o save final confirma.
+SAFETY = 0.95
+
+
+def image_inventory(doc: fitz.Document) -> Tuple[List[Tuple[int, int]], int]:
+    """Imagens recomprimíveis: ``([(xref, bytes do stream atual)], bytes de cópias)``.
+
+    Cópias byte a byte (timbres repetidos) ficam fora da lista e só somam no
+    segundo valor: ``dedupe_images`` as consolida antes da recompressão.
+    """
+    seen = set()
+    streams = set()
+    out = []
+    duplicates = 0
+    for page in doc:
+        for img in page.get_images(full=True):
+            xref = img[0]
+            if xref in seen or not is_recompressible(img):
+                continue
+            seen.add(xref)
+            try:
+                raw = doc.xref_stream_raw(xref) or b""
+            except Exception:
+                continue
+            digest = hashlib.sha1(raw).digest()
+            if digest in streams:
+                duplicates += len(raw)
+                continue
+            streams.add(digest)
+            out.append((xref, len(raw)))
+    return out, duplicates
+
+
+def sample_images(inventory: List[Tuple[int, int]], n: int = 24) -> List[Tuple[int, int]]:
+    """Amostra espalhada pela distribuição de tamanhos (inclui sempre a maior imagem)."""
+    if len(inventory) <= n:
+        return list(inventory)
+    ordered = sorted(inventory, key=lambda item: item[1])
+    step = (len(ordered) - 1) / (n - 1)
+    return [ordered[round(i * step)] for i in range(n)]
+
+
+def trial_encode(
+    path: str, xrefs: List[int], ladder: List[Tuple[int, int]], reduce_colors: Optional[str] = None,
+) -> Tuple[int, List[int]]:
+    """Recomprime as imagens ``xrefs`` em cada degrau (roda no worker).
+
+    Retorna ``(bytes originais, [bytes resultantes por degrau])``. Como em
+    ``recompress_images``, uma imagem só é trocada se ficar menor.
+    """
+    doc = fitz.open(path)
+    original = 0
+    totals = [0] * len(ladder)
+    # Dimensões em ordem decrescente: o mesmo pixmap vai sendo reduzido.
+    order = sorted(range(len(ladder)), key=lambda i: -ladder[i][0])
+    try:
+        for xref in xrefs:
+            old_len = len(doc.xref_stream_raw(xref) or b"")
+            original += old_len
+            try:
+                pix = fitz.Pixmap(doc, xref)
+                if pix.alpha or (pix.colorspace is not None and pix.n - pix.alpha >= 4):
+                    pix = fitz.Pixmap(fitz.csRGB, pix)
+                smask = doc.xref_get_key(xref, "SMask")[0] != "null"
+                pix, tones = prepare_tones(pix, reduce_colors, has_smask=smask)
+            except Exception:
+                for i in order:
+                    totals[i] += old_len
+                continue
+            for i in order:
+                max_dim, quality = ladder[i]
+                try:
+                    new_len = len(encode_prepared(pix, tones, quality, max_dim))
+                except Exception:
+                    new_len = old_len
+                totals[i] += min(new_len, old_len) if old_len else new_len
+    finally:
+        doc.close()
+    return original, totals
+
+
+def estimate_sizes(
+    file_size: int,
+    inventory: List[Tuple[int, int]],
+    trials: List[Tuple[int, List[int]]],
+    duplicate_bytes: int = 0,
+) -> List[int]:
+    """Extrapola o tamanho final por degrau a partir das amostras.
+
+    A parte que não é imagem recomprimível entra pelo tamanho atual (estimativa
+    conservadora: o save com ``garbage``/``deflate`` costuma reduzi-la); cópias
+    de imagens somem.
+    """
+    images_total = sum(size for _, size in inventory)
+    fixed = max(file_size - images_total - duplicate_bytes, 0)
+    sample_original = sum(original for original, _ in trials)
+    if not sample_original:
+        return [file_size] * len(LADDER)
+    estimates = []
+    for i in range(len(LADDER)):
+        sample_new = sum(totals[i] for _, totals in trials)
+        estimates.append(fixed + round(images_total * sample_new / sample_original))
+    return estimates
+
+
+def pick_step(estimates: List[int], target_bytes: int, start: int = 0) -> Optional[int]:
+    """Primeiro degrau (a partir de ``start``) cuja estimativa cabe no alvo com folga."""
+    for i in range(start, len(estimates)):
+        if estimates[i] <= target_bytes * SAFETY:
+            return i
+    return None
+
+
+def ladder_options(step: int) -> Dict[str, object]:
+    max_dim, quality = LADDER[step]
+    return {"recompress_images": True, "jpeg_quality": quality, "max_image_dim": max_dim}
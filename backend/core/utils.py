@@ -1,8 +1,12 @@
 import re
+from pathlib import Path
 from unidecode import unidecode
-from typing import List
+from typing import List, Union
 import fitz
 
+# Origem de um PDF: caminho (preferido) ou bytes já em memória.
+PdfSource = Union[str, Path, bytes]
+
 
 def safe_slug(text: str, maxlen: int = 60) -> str:
     """Gera um slug seguro para nomes de arquivos."""
@@ -44,3 +48,14 @@ def insert_pages(dst: fitz.Document, src: fitz.Document, pages: List[int]):
         except TypeError:
             for p in pages:
                 dst.insert_pdf(src, from_page=p, to_page=p)
+
+
+def open_pdf(src: PdfSource) -> fitz.Document:
+    """Abre um PDF por caminho ou bytes.
+
+    Por caminho o MuPDF lê o arquivo sob demanda, sem carregá-lo inteiro na
+    memória do processo.
+    """
+    if isinstance(src, (bytes, bytearray)):
+        return fitz.open(stream=src, filetype="pdf")
+    return fitz.open(str(src), filetype="pdf")
@@ -10,7 +10,11 @@ from fastapi.staticfiles import StaticFiles
 
 from auth import get_current_user
 from config import settings, DEFAULT_BRAND
-from services.file_manager import file_manager
+from services.file_manager import file_manager, StorageLimitError
+from services.upload_sessions import upload_sessions
+from services import admission, workers
+from services.doc_pool import doc_pool
+from services.preprocess import preprocessor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,10 +22,18 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await asyncio.to_thread(file_manager.reconcile)
     cleanup_task = asyncio.create_task(file_manager.cleanup_loop())
+    uploads_task = asyncio.create_task(upload_sessions.cleanup_loop())
+    preprocessor.start()
     logger.info("PDF Editor API started")
     yield
     cleanup_task.cancel()
+    uploads_task.cancel()
+    await preprocessor.stop()
+    workers.shutdown()
+    admission.shutdown()
+    doc_pool.clear()
     logger.info("PDF Editor API shutdown")
 
 
@@ -40,6 +52,12 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(StorageLimitError)
+async def storage_limit_handler(request: Request, exc: StorageLimitError):
+    logger.warning(f"Storage limit on {request.url}: {exc}")
+    return JSONResponse(status_code=507, content={"detail": str(exc)})
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception on {request.url}: {exc}", exc_info=True)
@@ -60,6 +78,7 @@ from api.scan import router as scan_router
 from api.diff import router as diff_router
 from api.converter import router as converter_router
 from api.thumbnails import router as thumbnails_router
+from api.outline import router as outline_router
 
 # auth_router (/me) tem dep proprio; health/brand ficam publicos (healthcheck Coolify).
 # Hardening: todo router de ferramenta exige usuario autenticado (defense-in-depth,
@@ -80,6 +99,7 @@ app.include_router(scan_router, prefix="/api", dependencies=_auth)
 app.include_router(diff_router, prefix="/api", dependencies=_auth)
 app.include_router(converter_router, prefix="/api", dependencies=_auth)
 app.include_router(thumbnails_router, prefix="/api", dependencies=_auth)
+app.include_router(outline_router, prefix="/api", dependencies=_auth)
 
 
 @app.get("/api/health")
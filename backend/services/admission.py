@@ -0,0 +1,285 @@
+"""Controle de admissão por custo, com uma faixa interativa e outra de lote.
+
+Sem isso, todo endpoint dividia o executor padrão do ``asyncio.to_thread``
+sem limite nem ordem: três otimizações ``maximum`` de digitalizações grandes
+seguravam as miniaturas e os metadados de todo mundo.
+
+- Faixa ``interactive`` (miniaturas, metadados, scan, análise): threads
+  próprias, nunca espera atrás de trabalho em lote.
+- Faixa ``stream`` (streams NDJSON de miniaturas): só conta streams abertos
+  (``STREAM_SLOTS``); a renderização roda no pool de processos, então um
+  editor aberto não ocupa thread da faixa interativa.
+- Faixa ``batch`` (otimizar, dividir, mesclar, carimbar, tarjar...): poucas
+  execuções simultâneas (``BATCH_SLOTS``) e fila FIFO limitada pelo custo
+  somado dos pedidos à espera (``BATCH_BACKLOG_COST``). Um pedido sozinho na
+  fila sempre entra, por maior que seja — senão nunca seria atendido.
+
+O custo de um pedido é estimado pelo tipo de operação, pelo tamanho do
+arquivo e pelo número de páginas (do cache do pré-processamento, se já
+houver). Com a fila cheia, a API responde ``429`` com ``Retry-After``
+estimado pela vazão observada, em vez de empilhar trabalho.
+
+Dentro de ``async with admit(...)``, ``to_thread`` roda no executor da faixa
+com um ``CancelToken`` instalado: o ``core`` para no próximo ``checkpoint()``
+quando o prazo da operação (``OPERATION_DEADLINES``) estoura (``504``) ou
+quando o cliente desconecta (``499``) — e nada é gravado como resultado.
+"""
+import math
+import time
+import asyncio
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from config import settings
+from core.cancel import DEADLINE, DISCONNECTED, CancelToken, OperationCancelled, current, installed
+from services.file_manager import file_manager
+from services.preprocess import META_KEY, cached
+
+# Peso de cada operação (custo por MB-equivalente de entrada) e sua faixa.
+OPERATIONS: Dict[str, Tuple[str, float]] = {
+    "metadata": ("interactive", 0.05),
+    "outline": ("interactive", 0.05),
+    "thumbnails": ("interactive", 0.2),
+    # Stream de miniaturas: aberto enquanto o editor rola, renderiza nos workers.
+    "thumbnails:stream": ("stream", 0.2),
+    "scan": ("interactive", 0.5),
+    "analysis": ("interactive", 0.2),
+    # Triagem de um pacote inteiro: muitos arquivos, vai para a faixa de lote.
+    "scan:bulk": ("batch", 0.5),
+    "diff": ("batch", 2.0),
+    "rotate": ("batch", 0.3),
+    "remove": ("batch", 0.5),
+    "extract": ("batch", 0.5),
+    "merge": ("batch", 1.0),
+    "split": ("batch", 1.0),
+    "bates": ("batch", 1.5),
+    "redact": ("batch", 2.0),
+    "convert": ("batch", 1.5),
+    "optimize:light": ("batch", 2.0),
+    "optimize:recommended": ("batch", 3.0),
+    "optimize:maximum": ("batch", 4.0),
+    "optimize:none": ("batch", 0.3),
+}
+# Uma página pesa como 100 KB de arquivo (texto puro é leve no disco, mas não no MuPDF).
+PAGE_MB = 0.1
+# Sem página em cache: estimativa pelo tamanho (~100 KB por página de processo digitalizado).
+BYTES_PER_PAGE_GUESS = 100 * 1024
+# Segundos por unidade de custo antes da primeira medição (depois, média móvel).
+INITIAL_SECONDS_PER_COST = 0.5
+_EWMA = 0.2
+
+_current_lane: contextvars.ContextVar[Optional["Lane"]] = contextvars.ContextVar("admission_lane", default=None)
+
+
+class Lane:
+    """Até ``slots`` execuções simultâneas; o resto espera em FIFO até somar ``backlog_cost``."""
+
+    def __init__(self, name: str, slots: int, backlog_cost: float):
+        self.name = name
+        self.slots = slots
+        self.backlog_cost = backlog_cost
+        self.executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix=f"lane-{name}")
+        self.running = 0
+        self.running_cost = 0.0
+        self.seconds_per_cost = INITIAL_SECONDS_PER_COST
+        self._waiting: Deque[Tuple[float, asyncio.Future]] = deque()
+
+    @property
+    def waiting_cost(self) -> float:
+        return sum(cost for cost, fut in self._waiting if not fut.done())
+
+    def retry_after(self, cost: float) -> int:
+        """Segundos até a fila provavelmente ter espaço, pela vazão observada."""
+        ahead = self.running_cost + self.waiting_cost + cost
+        return max(1, math.ceil(ahead * self.seconds_per_cost / self.slots))
+
+    async def acquire(self, cost: float):
+        if self.running < self.slots and not self._waiting:
+            self._start(cost)
+            return
+        if self._waiting and self.waiting_cost + cost > self.backlog_cost:
+            raise HTTPException(
+                status_code=429,
+                detail="Servidor ocupado; tente novamente em instantes",
+                headers={"Retry-After": str(self.retry_after(cost))},
+            )
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.append((cost, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Foi admitido no mesmo instante em que desistiu: devolve a vaga.
+                self.release(cost, None)
+            raise
+
+    def _start(self, cost: float):
+        self.running += 1
+        self.running_cost += cost
+
+    def release(self, cost: float, elapsed: Optional[float]):
+        self.running -= 1
+        self.running_cost -= cost
+        if elapsed is not None and cost > 0:
+            self.seconds_per_cost += _EWMA * (elapsed / cost - self.seconds_per_cost)
+        while self._waiting and self.running < self.slots:
+            next_cost, fut = self._waiting.popleft()
+            if fut.done():
+                continue
+            self._start(next_cost)
+            fut.set_result(None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_lanes: Dict[str, Lane] = {}
+
+
+def lane(name: str) -> Lane:
+    if name not in _lanes:
+        if name == "interactive":
+            _lanes[name] = Lane(name, settings.interactive_threads, settings.interactive_backlog_cost)
+        elif name == "stream":
+            _lanes[name] = Lane(name, settings.stream_slots, settings.stream_backlog_cost)
+        else:
+            _lanes[name] = Lane(name, settings.batch_slots, settings.batch_backlog_cost)
+    return _lanes[name]
+
+
+def shutdown():
+    for existing in _lanes.values():
+        existing.shutdown()
+    _lanes.clear()
+
+
+def estimate_cost(op: str, file_ids: Iterable[str] = ()) -> float:
+    """Custo em MB-equivalentes: peso da operação × (MB + páginas × PAGE_MB) das entradas."""
+    _, weight = OPERATIONS[op]
+    total = 0.0
+    for fid in file_ids:
+        info = file_manager.get_info(fid)
+        size = info["size"] if info else 0
+        meta = cached(fid, META_KEY)
+        pages = meta["pages"] if meta else size / BYTES_PER_PAGE_GUESS
+        total += size / (1024 * 1024) + pages * PAGE_MB
+    return weight * max(total, 1.0)
+
+
+def deadline_for(op: str) -> float:
+    return settings.operation_deadlines.get(op.split(":")[0], settings.operation_deadline_s)
+
+
+async def _watch_disconnect(request: Request, token: CancelToken):
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel(DISCONNECTED)
+            return
+        await asyncio.sleep(settings.disconnect_poll_s)
+
+
+@asynccontextmanager
+async def admit(op: str, file_ids: Iterable[str] = (), request: Optional[Request] = None) -> AsyncIterator[Lane]:
+    """Reserva lugar na faixa da operação (ou ``429``) e direciona ``to_thread`` para ela.
+
+    Com ``request``, um cliente que desconecta cancela a operação.
+    """
+    selected = lane(OPERATIONS[op][0])
+    cost = estimate_cost(op, file_ids)
+    await selected.acquire(cost)
+    token = CancelToken(time.monotonic() + deadline_for(op))
+    watcher = asyncio.ensure_future(_watch_disconnect(request, token)) if request is not None else None
+    lane_token = _current_lane.set(selected)
+    started = time.monotonic()
+    elapsed = None
+    try:
+        with installed(token):
+            yield selected
+        elapsed = time.monotonic() - started
+    except OperationCancelled as e:
+        if e.reason == DEADLINE:
+            raise HTTPException(status_code=504, detail="Tempo limite da operação excedido")
+        raise HTTPException(status_code=499, detail="Operação cancelada")
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        _current_lane.reset(lane_token)
+        selected.release(cost, elapsed)
+
+
+async def reserve(op: str, file_ids: Iterable[str] = ()) -> Callable[[], None]:
+    """Como ``admit``, para respostas em streaming: devolve ``release()``.
+
+    O corpo de uma ``StreamingResponse`` roda em outra tarefa, fora do
+    contexto do endpoint; entregue ``release`` a um ``ReservedStream``, que
+    devolve a vaga quando a resposta termina. Sem faixa nem prazo instalados:
+    o trabalho vai para o pool de processos.
+    """
+    selected = lane(OPERATIONS[op][0])
+    cost = estimate_cost(op, file_ids)
+    await selected.acquire(cost)
+    started = time.monotonic()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            selected.release(cost, time.monotonic() - started)
+
+    return release
+
+
+class ReservedStream(StreamingResponse):
+    """``StreamingResponse`` que chama o ``release`` de ``reserve`` ao terminar.
+
+    Devolve a vaga mesmo que o corpo nunca seja iterado (cliente que
+    desconecta antes do primeiro byte), caso em que o ``finally`` do gerador
+    não chega a rodar.
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+async def to_thread(fn, *args, **kwargs):
+    """Como ``asyncio.to_thread``, mas no executor da faixa admitida (se houver).
+
+    Se quem espera é cancelado, a thread para no próximo ``checkpoint()``; um
+    resultado que chega depois do cancelamento é descartado.
+    """
+    selected = _current_lane.get()
+    if selected is None:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    token = current()
+    ctx = contextvars.copy_context()
+    call = partial(ctx.run, fn, *args, **kwargs)
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(selected.executor, call)
+    except asyncio.CancelledError:
+        if token is not None:
+            token.cancel()
+        raise
+    if token is not None:
+        token.check()
+    return result
+
+
+async def run(op: str, file_ids: Iterable[str], fn, *args, request: Optional[Request] = None):
+    """Admite ``op`` e executa ``fn(*args)`` numa thread da faixa."""
+    async with admit(op, file_ids, request):
+        return await to_thread(fn, *args)
@@ -0,0 +1,140 @@
+"""Pool LRU de documentos abertos para leituras (miniaturas, metadados, scan).
+
+Cada janela de miniaturas, cada ``/metadata`` e cada contagem de páginas
+abria o PDF de novo; em processos grandes ou danificados o MuPDF relê (ou
+repara) a tabela xref a cada abertura. Aqui o ``fitz.Document`` fica aberto
+por ``file_id`` e é reaproveitado pelos pedidos seguintes.
+
+Só para uso somente-leitura: quem pega um documento emprestado não pode
+alterá-lo nem fechá-lo. Um lock por documento garante uma thread por vez em
+cada um (o MuPDF não aceita o mesmo documento em duas threads); documentos
+diferentes seguem em paralelo. Documentos saem do pool por LRU
+(``DOCUMENT_POOL_SIZE``), quando o arquivo é apagado ou expira, ou quando o
+caminho de leitura muda (cópia normalizada pelo pré-processamento); quem
+estiver em uso é fechado ao ser devolvido.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+import fitz
+
+from config import settings
+from core.utils import open_pdf
+from services.file_manager import file_manager
+
+
+class _Handle:
+    __slots__ = ("doc", "path", "lock", "retired")
+
+    def __init__(self, doc: fitz.Document, path: Path):
+        self.doc = doc
+        self.path = path
+        self.lock = threading.Lock()
+        self.retired = False
+
+
+class DocumentPool:
+    def __init__(self, size: Optional[int] = None):
+        self._size = size
+        self._handles: "OrderedDict[str, _Handle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return settings.document_pool_size if self._size is None else self._size
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    @contextmanager
+    def borrow(self, file_id: str, path: Path) -> Iterator[fitz.Document]:
+        """Empresta o documento aberto de ``file_id`` (lido de ``path``) com exclusividade."""
+        if self.size <= 0:
+            with open_pdf(path) as doc:
+                yield doc
+            return
+        path = Path(path)
+        while True:
+            handle = self._lookup(file_id, path) or self._open(file_id, path)
+            handle.lock.acquire()
+            try:
+                if handle.doc.is_closed:
+                    continue  # aposentado entre a busca e o lock: abre de novo
+                yield handle.doc
+                return
+            finally:
+                handle.lock.release()
+                if handle.retired:
+                    self._retire(handle)
+
+    def discard(self, file_id: str):
+        """Fecha o documento de um arquivo apagado (ao ser devolvido, se estiver em uso)."""
+        with self._lock:
+            handle = self._handles.pop(file_id, None)
+        if handle is not None:
+            self._retire(handle)
+
+    def clear(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            self._retire(handle)
+
+    def _lookup(self, file_id: str, path: Path) -> Optional[_Handle]:
+        with self._lock:
+            handle = self._handles.get(file_id)
+            if handle is None:
+                return None
+            if handle.path != path:
+                del self._handles[file_id]
+                stale = handle
+            else:
+                self._handles.move_to_end(file_id)
+                return handle
+        self._retire(stale)
+        return None
+
+    def _open(self, file_id: str, path: Path) -> _Handle:
+        # Abre fora do lock global: reparar um PDF grande não trava os outros arquivos.
+        handle = _Handle(open_pdf(path), path)
+        retired = []
+        with self._lock:
+            existing = self._handles.get(file_id)
+            if existing is not None and existing.path == path:
+                # Outra thread abriu o mesmo arquivo enquanto isso: fica a dela.
+                self._handles.move_to_end(file_id)
+                retired.append(handle)
+                handle = existing
+            else:
+                if existing is not None:
+                    retired.append(existing)
+                self._handles[file_id] = handle
+                self._handles.move_to_end(file_id)
+                # Arquivos expirados ou evictados pelo FileManager não seguram mais o disco.
+                for gone in [fid for fid, h in self._handles.items() if not h.path.exists()]:
+                    retired.append(self._handles.pop(gone))
+                while len(self._handles) > self.size:
+                    retired.append(self._handles.popitem(last=False)[1])
+        for old in retired:
+            self._retire(old)
+        return handle
+
+    @staticmethod
+    def _retire(handle: _Handle):
+        # Em uso: quem devolver fecha (o ``borrow`` chama de novo após soltar o lock).
+        handle.retired = True
+        if handle.lock.acquire(blocking=False):
+            try:
+                if not handle.doc.is_closed:
+                    handle.doc.close()
+            finally:
+                handle.lock.release()
+
+
+doc_pool = DocumentPool()
+# Arquivo apagado ou expirado (por qualquer caminho): fecha o documento.
+file_manager.on_delete(doc_pool.discard)
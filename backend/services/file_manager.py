@@ -1,83 +1,635 @@
 import os
+import re
 import time
 import uuid
+import errno
+import heapq
+import hashlib
+import shutil
 import asyncio
 import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
+from auth import current_user_email
 from config import settings
+from services.storage import FILE_ID, StorageBackend, make_storage
 
 logger = logging.getLogger(__name__)
 
 TEMP_DIR = Path(os.environ.get("TEMP_DIR", "/app/tmp"))
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
+INDEX_NAME = "index.sqlite3"
+# Arquivos gravados por store(): <file_id hex de 12><ext>, ou .part durante a escrita.
+_MANAGED_FILE = re.compile(r"^[0-9a-f]{12}(\.[^.]+)?(\.part)?$")
+# Arquivos sem entrada no índice só são removidos depois disso: outro worker pode
+# estar entre gravar o arquivo e inserir a linha.
+ORPHAN_GRACE_SECONDS = 120
+# Resultados em gravação (core -> doc.save) vivem em TEMP_DIR/scratch até o store_file.
+SCRATCH_DIR = "scratch"
+SCRATCH_GRACE_SECONDS = 3600
+# Teto do sono do cleanup_loop: também varre o índice (arquivos de outros workers).
+SWEEP_INTERVAL_SECONDS = 300
+# Artefatos derivados (sprites, miniaturas, ...) ficam em TEMP_DIR/derived/<file_id>/
+# e somem junto com o arquivo de origem.
+DERIVED_DIR = "derived"
+# Um resultado memoizado só é reaproveitado se ainda tiver esta fração do TTL pela
+# frente (senão o link entregue expiraria logo depois).
+RESULT_REUSE_MIN_TTL_FRACTION = 0.25
+# Espaço que nunca é usado no volume, mesmo com orçamento livre (SQLite/WAL, logs).
+DISK_RESERVE_BYTES = 64 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id      TEXT PRIMARY KEY,
+    name         TEXT NOT NULL,
+    filename     TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    created_at   REAL NOT NULL,
+    size         INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_created_at ON files (created_at);
+CREATE TABLE IF NOT EXISTS results (
+    key      TEXT PRIMARY KEY,
+    file_id  TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_file_id ON results (file_id);
+"""
+
+# Colunas adicionadas depois da primeira versão do índice (ALTER TABLE na subida).
+_MIGRATIONS = {
+    "owner": "ALTER TABLE files ADD COLUMN owner TEXT",
+    "last_access": "ALTER TABLE files ADD COLUMN last_access REAL NOT NULL DEFAULT 0",
+    "sha256": "ALTER TABLE files ADD COLUMN sha256 TEXT",
+    # Cópia por hard link: file_id da entrada que paga pelos bytes (ver copy()).
+    "linked_to": "ALTER TABLE files ADD COLUMN linked_to TEXT",
+}
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access);
+CREATE INDEX IF NOT EXISTS files_owner ON files (owner, last_access);
+CREATE INDEX IF NOT EXISTS files_linked_to ON files (linked_to);
+"""
+
+
+def connect_index(db_path: Path) -> sqlite3.Connection:
+    """Conexão (autocommit, WAL) com o índice SQLite do TEMP_DIR."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class StorageLimitError(Exception):
+    """O arquivo não cabe no orçamento de disco (global ou do usuário) nem após evicção."""
+
 
 class FileManager:
-    """Manages temporary files with auto-cleanup."""
+    """Manages temporary files with auto-cleanup.
+
+    O índice (file_id -> metadados) vive num SQLite em modo WAL dentro do
+    próprio TEMP_DIR, compartilhado por todos os workers do uvicorn e
+    persistente entre restarts. Cada thread usa sua própria conexão.
+
+    Expiração por TTL é dirigida por um min-heap de prazos (o loop dorme até o
+    próximo vencimento). Antes de gravar, o orçamento de disco e a cota do
+    usuário são garantidos evictando os arquivos usados há mais tempo (LRU).
+    """
+
+    def __init__(self, temp_dir: Path = TEMP_DIR, storage: Optional[StorageBackend] = None):
+        self.temp_dir = Path(temp_dir)
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        # Os bytes ficam no backend (disco local ou S3); o TEMP_DIR guarda o
+        # índice, a área de staging (.part) e o cache local do backend remoto.
+        self.storage = storage or make_storage(self.temp_dir)
+        self._db_path = self.temp_dir / INDEX_NAME
+        self.derived_dir = self.temp_dir / DERIVED_DIR
+        self.derived_dir.mkdir(exist_ok=True)
+        self.scratch_dir = self.temp_dir / SCRATCH_DIR
+        self.scratch_dir.mkdir(exist_ok=True)
+        self._local = threading.local()
+        self._expiry: list[tuple[float, str]] = []
+        self._expiry_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._delete_hooks: list[Callable[[str], None]] = []
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+        for column, ddl in _MIGRATIONS.items():
+            if column not in columns:
+                try:
+                    conn.execute(ddl)
+                except sqlite3.OperationalError:
+                    pass  # outro worker migrou primeiro
+        conn.executescript(_INDEXES)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_index(self._db_path)
+            self._local.conn = conn
+        return conn
+
+    def on_delete(self, hook: Callable[[str], None]):
+        """Registra ``hook(file_id)``, chamado sempre que um arquivo sai do índice.
+
+        Vale para exclusão pelo usuário, TTL, evicção LRU e arquivos que
+        sumiram do backend: quem guarda estado por ``file_id`` (documentos
+        abertos, pré-processamento em andamento) se registra aqui. Pode ser
+        chamado de qualquer thread.
+        """
+        self._delete_hooks.append(hook)
+
+    def _forgotten(self, file_id: str):
+        for hook in self._delete_hooks:
+            try:
+                hook(file_id)
+            except Exception as e:
+                logger.warning(f"Delete hook failed for {file_id}: {e}")
+
+    def _drop_missing(self, file_id: str):
+        """Tira do índice um arquivo cujo conteúdo sumiu do backend."""
+        self._conn().execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+        self._release_links(file_id)
+        self._forgotten(file_id)
+
+    def _release_links(self, file_id: str):
+        """Entrada que saiu do índice: a cópia linkada mais antiga passa a pagar pelos bytes.
+
+        O blob continua no disco enquanto houver um hard link para ele; sem
+        isso, o espaço deixaria de ser contado no orçamento e na cota.
+        """
+        conn = self._conn()
+        heir = conn.execute(
+            "SELECT file_id FROM files WHERE linked_to = ? ORDER BY created_at LIMIT 1", (file_id,),
+        ).fetchone()
+        if heir is None:
+            return
+        conn.execute("UPDATE files SET linked_to = NULL WHERE file_id = ?", (heir["file_id"],))
+        conn.execute("UPDATE files SET linked_to = ? WHERE linked_to = ?", (heir["file_id"], file_id))
+
+    def _info(self, row: sqlite3.Row) -> dict:
+        return {
+            "name": row["name"],
+            "path": str(self.temp_dir / row["name"]),
+            "filename": row["filename"],
+            "content_type": row["content_type"],
+            "created_at": row["created_at"],
+            "size": row["size"],
+            "owner": row["owner"],
+        }
+
+    # --- Expiração (min-heap de prazos) ---
 
-    def __init__(self):
-        self._files: dict[str, dict] = {}
+    def _ttl_seconds(self) -> float:
+        return settings.temp_file_ttl_minutes * 60
 
-    def store(self, data: bytes, filename: str, content_type: str = "application/pdf") -> str:
-        """Store bytes to a temp file and return a file_id."""
+    def _schedule_expiry(self, file_id: str, created_at: float):
+        deadline = created_at + self._ttl_seconds()
+        with self._expiry_lock:
+            heapq.heappush(self._expiry, (deadline, file_id))
+            is_next = self._expiry[0][1] == file_id
+        if is_next and self._loop is not None and self._wakeup is not None:
+            # Novo prazo mais cedo que o atual: acorda o loop para reagendar
+            # (store() pode rodar numa thread do to_thread).
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def next_expiry_delay(self) -> float:
+        """Segundos até o próximo vencimento conhecido (limitado a SWEEP_INTERVAL_SECONDS)."""
+        with self._expiry_lock:
+            if not self._expiry:
+                return SWEEP_INTERVAL_SECONDS
+            delay = self._expiry[0][0] - time.time()
+        return min(max(delay, 0.0), SWEEP_INTERVAL_SECONDS)
+
+    # --- Orçamento de disco / cotas ---
+
+    def _disk_budget(self, used: int) -> int:
+        """Bytes que o TEMP_DIR pode ocupar: o configurado, limitado pelo volume real."""
+        if not self.storage.is_local:
+            # No S3 o disco local é só cache (com teto próprio); vale o orçamento configurado.
+            return settings.temp_disk_budget_mb * 1024 * 1024 or 2**62
+        try:
+            disk = shutil.disk_usage(self.temp_dir)
+        except OSError:
+            return settings.temp_disk_budget_mb * 1024 * 1024 or 2**62
+        # O que já usamos + o que o volume ainda tem livre (menos a reserva).
+        physical = used + disk.free - DISK_RESERVE_BYTES
+        configured = settings.temp_disk_budget_mb * 1024 * 1024
+        return min(configured, physical) if configured else physical
+
+    def _evict_lru(self, needed: int, owner: Optional[str] = None) -> int:
+        """Remove arquivos menos usados recentemente até liberar ``needed`` bytes."""
+        if needed <= 0:
+            return 0
+        conn = self._conn()
+        # Cópias linkadas não liberam nada; o original só libera o disco se não
+        # tiver cópias (senão os bytes passam para uma delas, que pode ser de
+        # outro usuário: para a cota do dono, libera igual).
+        if owner is None:
+            rows = conn.execute(
+                "SELECT file_id, CASE WHEN linked_to IS NULL AND NOT EXISTS"
+                " (SELECT 1 FROM files AS l WHERE l.linked_to = files.file_id) THEN size ELSE 0 END AS freed"
+                " FROM files ORDER BY last_access"
+            )
+        else:
+            rows = conn.execute(
+                "SELECT file_id, CASE WHEN linked_to IS NULL THEN size ELSE 0 END AS freed"
+                " FROM files WHERE owner = ? ORDER BY last_access", (owner,)
+            )
+        freed = 0
+        victims = []
+        for row in rows:
+            if freed >= needed:
+                break
+            victims.append(row["file_id"])
+            freed += row["freed"]
+        for fid in victims:
+            self.delete(fid)
+        if victims:
+            scope = f"user {owner}" if owner else "disk budget"
+            logger.info(f"Evicted {len(victims)} LRU files ({freed} bytes) for {scope}")
+        return freed
+
+    def ensure_room(self, size: int, owner: Optional[str]):
+        """Garante espaço para ``size`` bytes (evicção LRU) ou levanta StorageLimitError."""
+        conn = self._conn()
+        quota = settings.temp_user_quota_mb * 1024 * 1024
+        if owner and quota:
+            if size > quota:
+                raise StorageLimitError("Arquivo excede a cota de armazenamento temporário do usuário")
+            used = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM files WHERE owner = ? AND linked_to IS NULL", (owner,)
+            ).fetchone()[0]
+            self._evict_lru(used + size - quota, owner)
+
+        used = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files WHERE linked_to IS NULL").fetchone()[0]
+        budget = self._disk_budget(used)
+        if size > budget:
+            raise StorageLimitError("Espaço temporário insuficiente para o arquivo")
+        self._evict_lru(used + size - budget)
+
+    # --- API ---
+
+    def _new_name(self, filename: str) -> tuple[str, str]:
         file_id = uuid.uuid4().hex[:12]
         ext = Path(filename).suffix or ".pdf"
-        path = TEMP_DIR / f"{file_id}{ext}"
-        path.write_bytes(data)
-        self._files[file_id] = {
-            "path": str(path),
-            "filename": filename,
-            "content_type": content_type,
-            "created_at": time.time(),
-            "size": len(data),
-        }
+        return file_id, f"{file_id}{ext}"
+
+    def _commit(self, src: Path, file_id: str, name: str, filename: str, content_type: str,
+                owner: Optional[str], size: int, linked_to: Optional[str] = None) -> str:
+        """Entrega ``src`` ao backend e registra a entrada no índice."""
+        now = time.time()
+        try:
+            self.storage.put(name, src, {
+                "filename": filename, "content_type": content_type, "owner": owner, "created_at": now,
+            })
+        finally:
+            src.unlink(missing_ok=True)
+
+        self._conn().execute(
+            "INSERT INTO files (file_id, name, filename, content_type, created_at, size, owner, last_access, linked_to)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (file_id, name, filename, content_type, now, size, owner, now, linked_to),
+        )
+        self._schedule_expiry(file_id, now)
         return file_id
 
+    def store(self, data: bytes, filename: str, content_type: str = "application/pdf", owner: Optional[str] = None) -> str:
+        """Store bytes to a temp file and return a file_id.
+
+        ``owner`` (email) conta para a cota por usuário; por padrão é o usuário
+        autenticado da requisição corrente.
+        """
+        owner = owner or current_user_email.get()
+        self.ensure_room(len(data), owner)
+
+        file_id, name = self._new_name(filename)
+        # Grava em .part e só então entrega ao backend: outro worker nunca
+        # enxerga arquivo pela metade.
+        part = self.temp_dir / (name + ".part")
+        try:
+            part.write_bytes(data)
+        except OSError as e:
+            part.unlink(missing_ok=True)
+            if e.errno != errno.ENOSPC:
+                raise
+            # Volume encheu por fora do orçamento (outro processo): libera e tenta uma vez.
+            self._evict_lru(2 * len(data))
+            try:
+                part.write_bytes(data)
+            except OSError:
+                part.unlink(missing_ok=True)
+                raise StorageLimitError("Espaço temporário insuficiente para o arquivo") from e
+        return self._commit(part, file_id, name, filename, content_type, owner, len(data))
+
+    def store_file(self, src: Path, filename: str, content_type: str = "application/pdf", owner: Optional[str] = None) -> str:
+        """Adota um arquivo já gravado no volume local (movido, sem passar pela memória)."""
+        owner = owner or current_user_email.get()
+        src = Path(src)
+        size = src.stat().st_size
+        self.ensure_room(size, owner)
+        file_id, name = self._new_name(filename)
+        return self._commit(src, file_id, name, filename, content_type, owner, size)
+
+    def copy(self, file_id: str, filename: str, owner: Optional[str] = None) -> Optional[str]:
+        """Nova entrada, com outro nome e dono, para o mesmo conteúdo de ``file_id``.
+
+        No volume local é um hard link (o blob não é duplicado): a cópia não
+        consome orçamento nem cota (``linked_to`` aponta quem paga pelos bytes).
+        Em backend remoto, ou se o link falhar, é uma cópia de verdade e conta
+        como qualquer ``store_file``.
+        """
+        info = self.get_info(file_id)
+        path = self.get_path(file_id)
+        if info is None or path is None:
+            return None
+        with self.scratch(Path(info["name"]).suffix) as dst:
+            linked_to = None
+            if self.storage.is_local:
+                try:
+                    os.link(path, dst)
+                    row = self._conn().execute("SELECT linked_to FROM files WHERE file_id = ?", (file_id,)).fetchone()
+                    linked_to = (row["linked_to"] if row else None) or file_id
+                except OSError:
+                    pass
+            if linked_to is None:
+                shutil.copyfile(path, dst)
+                new_id = self.store_file(dst, filename, info["content_type"], owner)
+            else:
+                new_id, name = self._new_name(filename)
+                self._commit(dst, new_id, name, filename, info["content_type"],
+                             owner or current_user_email.get(), info["size"], linked_to)
+        # Mesmo conteúdo: o hash já calculado vale para a cópia.
+        self._conn().execute(
+            "UPDATE files SET sha256 = (SELECT sha256 FROM files WHERE file_id = ?) WHERE file_id = ?", (file_id, new_id),
+        )
+        return new_id
+
+    @contextmanager
+    def scratch(self, suffix: str = ".pdf") -> Iterator[Path]:
+        """Caminho temporário no volume local para o core gravar um resultado.
+
+        O core salva direto ali (``doc.save``) e ``store_file`` adota o arquivo
+        sem passar pela memória. O que sobrar ao sair do bloco (erro, partes de
+        um split já zipadas) é apagado. Com ``suffix=""`` serve de diretório.
+        """
+        path = self.scratch_dir / f"{uuid.uuid4().hex}{suffix}"
+        try:
+            yield path
+        finally:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    def read_range(self, file_id: str, start: int, length: int) -> Optional[bytes]:
+        """Lê ``length`` bytes a partir de ``start`` (Range em downloads)."""
+        info = self.get_info(file_id)
+        if not info:
+            return None
+        try:
+            data = self.storage.read_range(info["name"], start, length)
+        except FileNotFoundError:
+            self._drop_missing(file_id)
+            return None
+        self._conn().execute("UPDATE files SET last_access = ? WHERE file_id = ?", (time.time(), file_id))
+        return data
+
+    def get_path(self, file_id: str) -> Optional[Path]:
+        """Caminho local do arquivo (baixado para o cache, se o backend for remoto)."""
+        info = self.get_info(file_id)
+        if not info:
+            return None
+        try:
+            path = self.storage.local_path(info["name"])
+        except FileNotFoundError:
+            self._drop_missing(file_id)
+            return None
+        self._conn().execute("UPDATE files SET last_access = ? WHERE file_id = ?", (time.time(), file_id))
+        return path
+
     def get_bytes(self, file_id: str) -> Optional[bytes]:
         """Read file bytes by ID."""
-        info = self._files.get(file_id)
-        if not info:
+        path = self.get_path(file_id)
+        if path is None:
             return None
-        path = Path(info["path"])
-        if not path.exists():
-            del self._files[file_id]
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            self._drop_missing(file_id)
             return None
-        return path.read_bytes()
 
     def get_info(self, file_id: str) -> Optional[dict]:
         """Get file metadata by ID."""
-        return self._files.get(file_id)
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        if row is None:
+            # Backend remoto: o arquivo pode ter sido gravado por outro nó.
+            # (só ids no formato gerado aqui: o id vem da URL do cliente).
+            found = self.storage.lookup(file_id) if not self.storage.is_local and FILE_ID.match(file_id) else None
+            if found is None:
+                return None
+            name, meta = found
+            now = time.time()
+            conn.execute(
+                "INSERT OR IGNORE INTO files (file_id, name, filename, content_type, created_at, size, owner, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_id, name, meta["filename"], meta["content_type"], meta["created_at"], meta["size"],
+                 meta["owner"], now),
+            )
+            self._schedule_expiry(file_id, meta["created_at"])
+            row = conn.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return self._info(row) if row else None
 
     def delete(self, file_id: str) -> bool:
-        """Delete a file by ID."""
-        info = self._files.pop(file_id, None)
-        if not info:
+        """Delete a file by ID (também por TTL e evicção LRU; avisa os ``on_delete``)."""
+        conn = self._conn()
+        row = conn.execute("SELECT name FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        if not row:
+            return False
+        conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+        conn.execute("DELETE FROM results WHERE file_id = ?", (file_id,))
+        self._release_links(file_id)
+        self._forgotten(file_id)
+        self.storage.delete(row["name"])
+        shutil.rmtree(self.derived_dir / file_id, ignore_errors=True)
+        return True
+
+    # --- Resultados memoizados ---
+
+    def content_hash(self, file_id: str) -> Optional[str]:
+        """SHA-256 do conteúdo (calculado na primeira consulta e guardado no índice)."""
+        row = self._conn().execute("SELECT sha256 FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        if row is not None and row["sha256"]:
+            return row["sha256"]
+        path = self.get_path(file_id)
+        if path is None:
+            return None
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        self._conn().execute("UPDATE files SET sha256 = ? WHERE file_id = ?", (sha256, file_id))
+        return sha256
+
+    def get_result(self, key: str) -> Optional[str]:
+        """Resposta guardada para ``key``, se o arquivo de resultado ainda existir com folga de TTL."""
+        conn = self._conn()
+        row = conn.execute("SELECT file_id, response FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        info = self.get_info(row["file_id"])
+        remaining = info["created_at"] + self._ttl_seconds() - time.time() if info else 0
+        if remaining < self._ttl_seconds() * RESULT_REUSE_MIN_TTL_FRACTION:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            return None
+        return row["response"]
+
+    def put_result(self, key: str, file_id: str, response: str):
+        """Memoiza a resposta de uma operação; sai junto com o arquivo ``file_id``."""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO results (key, file_id, response) VALUES (?, ?, ?)", (key, file_id, response),
+        )
+
+    # --- Artefatos derivados ---
+
+    def get_derived(self, file_id: str, key: str) -> Optional[bytes]:
+        """Artefato derivado de ``file_id`` (ex.: folha de miniaturas) já calculado, se houver."""
+        try:
+            return (self.derived_dir / file_id / key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put_derived(self, file_id: str, key: str, data: bytes) -> bool:
+        """Guarda um artefato derivado; é descartado quando ``file_id`` sai do índice.
+
+        Arquivo já apagado (ou apagado durante a gravação): nada fica em disco e
+        retorna ``False`` — um cálculo atrasado não recria ``derived/<file_id>``.
+        """
+        if not self._indexed(file_id):
+            return False
+        target = self.derived_dir / file_id
+        target.mkdir(exist_ok=True)
+        part = target / f"{key}.{os.getpid()}.part"
+        part.write_bytes(data)
+        os.replace(part, target / key)
+        if not self._indexed(file_id):
+            shutil.rmtree(target, ignore_errors=True)
             return False
-        path = Path(info["path"])
-        if path.exists():
-            path.unlink()
         return True
 
+    def _indexed(self, file_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM files WHERE file_id = ?", (file_id,)).fetchone() is not None
+
+    def reconcile(self):
+        """Alinha índice e disco na subida.
+
+        Remove entradas cujo arquivo sumiu e arquivos órfãos (sem entrada, p.ex.
+        gravados antes de um crash) com mais de ORPHAN_GRACE_SECONDS, e carrega
+        os prazos das entradas restantes no heap de expiração.
+        """
+        conn = self._conn()
+        known = {}
+        for row in conn.execute("SELECT file_id, name, created_at FROM files"):
+            known[row["name"]] = (row["file_id"], row["created_at"])
+
+        # No backend remoto a checagem seria um HEAD por arquivo: entradas
+        # órfãs lá são descobertas sob demanda (get_path) ou expiram pelo TTL.
+        dangling = [
+            fid for name, (fid, _) in known.items()
+            if self.storage.is_local and not self.storage.exists(name)
+        ]
+        conn.executemany("DELETE FROM files WHERE file_id = ?", [(fid,) for fid in dangling])
+        for fid in dangling:
+            self._release_links(fid)
+
+        now = time.time()
+        orphans = 0
+        for entry in self.temp_dir.iterdir():
+            if not entry.is_file() or entry.name in known or not _MANAGED_FILE.match(entry.name):
+                continue
+            try:
+                if now - entry.stat().st_mtime < ORPHAN_GRACE_SECONDS:
+                    continue
+                entry.unlink()
+                orphans += 1
+            except FileNotFoundError:
+                continue
+
+        # Resultados de jobs interrompidos por um crash.
+        for entry in self.scratch_dir.iterdir():
+            try:
+                if now - entry.stat().st_mtime < SCRATCH_GRACE_SECONDS:
+                    continue
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink()
+                orphans += 1
+            except FileNotFoundError:
+                continue
+
+        dangling_ids = set(dangling)
+        live_ids = {fid for fid, _ in known.values()} - dangling_ids
+        conn.execute("DELETE FROM results WHERE file_id NOT IN (SELECT file_id FROM files)")
+        for entry in self.derived_dir.iterdir():
+            if entry.name not in live_ids:
+                shutil.rmtree(entry, ignore_errors=True)
+
+        for fid, created_at in known.values():
+            if fid not in dangling_ids:
+                self._schedule_expiry(fid, created_at)
+
+        if dangling or orphans:
+            logger.info(f"Reconciled temp index: {len(dangling)} dangling entries, {orphans} orphan files")
+
     def cleanup_expired(self):
-        """Remove files older than TTL."""
-        ttl_seconds = settings.temp_file_ttl_minutes * 60
+        """Remove os arquivos cujo prazo no heap já venceu."""
         now = time.time()
+        expired = []
+        with self._expiry_lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expired.append(heapq.heappop(self._expiry)[1])
+        # delete() é idempotente: entradas já removidas (evicção, DELETE, outro worker) são ignoradas.
+        removed = sum(1 for fid in expired if self.delete(fid))
+        if removed:
+            logger.info(f"Cleaned up {removed} expired files")
+
+    def sweep_expired(self):
+        """Varredura do índice inteiro: pega vencidos que não estão no heap deste processo."""
+        cutoff = time.time() - self._ttl_seconds()
         expired = [
-            fid for fid, info in self._files.items()
-            if now - info["created_at"] > ttl_seconds
+            row["file_id"]
+            for row in self._conn().execute("SELECT file_id FROM files WHERE created_at < ?", (cutoff,))
         ]
-        for fid in expired:
-            self.delete(fid)
-        if expired:
-            logger.info(f"Cleaned up {len(expired)} expired files")
+        removed = sum(1 for fid in expired if self.delete(fid))
+        if removed:
+            logger.info(f"Swept {removed} expired files")
 
     async def cleanup_loop(self):
-        """Background loop that cleans up expired files."""
+        """Background loop: dorme até o próximo prazo do heap e expira o que venceu."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        last_sweep = time.monotonic()
         while True:
-            await asyncio.sleep(300)  # every 5 minutes
-            self.cleanup_expired()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.next_expiry_delay())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Com backend remoto cada remoção é um DELETE no bucket: fora do event loop.
+            await asyncio.to_thread(self.cleanup_expired)
+            if time.monotonic() - last_sweep >= SWEEP_INTERVAL_SECONDS:
+                await asyncio.to_thread(self.sweep_expired)
+                last_sweep = time.monotonic()
 
 
 file_manager = FileManager()
@@ -0,0 +1,248 @@
+"""Pré-processamento em segundo plano dos PDFs recém-enviados.
+
+Depois do upload o usuário quase sempre abre o editor visual e roda o
+``/scan``. Cada PDF enviado entra numa fila; um pool de processos próprio,
+pequeno e com prioridade baixa (``nice``), calcula metadados, o índice do
+sumário, texto das páginas, ``smart_scan``, as primeiras miniaturas e, se o
+arquivo precisou de reparo, uma cópia normalizada. Tudo vai para o cache de derivados do
+``FileManager``; os endpoints consultam esse cache antes de calcular.
+
+É trabalho de melhor esforço: fila cheia descarta, falha só é registrada no
+log, e um arquivo apagado (ou expirado) no meio do caminho tem as etapas
+restantes canceladas e os resultados descartados.
+"""
+import os
+import json
+import shutil
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from config import settings
+from core.outline import OutlineIndex
+from core.preprocess import first_thumbnails, scan_text, summarize
+from services.doc_pool import doc_pool
+from services.file_manager import file_manager
+
+logger = logging.getLogger(__name__)
+
+META_KEY = "meta.json"
+SCAN_KEY = "scan.json"
+TEXT_KEY = "text.json"
+NORMALIZED_KEY = "normalized.pdf"
+OUTLINE_KEY = "outline.json"
+# Incremento de nice dos workers: cedem a CPU às requisições interativas.
+NICENESS = 10
+# Índices de sumário mantidos em memória: expandir a árvore de um sumário
+# enorme não relê nem reparseia o JSON a cada clique.
+OUTLINE_MEMO_SIZE = 32
+
+_outlines: "OrderedDict[str, OutlineIndex]" = OrderedDict()
+_outlines_lock = threading.Lock()
+
+
+def thumbs_key(dpi: int) -> str:
+    return f"thumbs-{dpi}.json"
+
+
+def cached(file_id: str, key: str):
+    """Resultado JSON do pré-processamento de ``file_id``, se já estiver pronto."""
+    data = file_manager.get_derived(file_id, key)
+    return json.loads(data) if data is not None else None
+
+
+def source_path(file_id: str) -> Optional[Path]:
+    """Caminho para leitura: a cópia normalizada, se houver, senão o original."""
+    path = file_manager.get_path(file_id)
+    if path is None:
+        return None
+    normalized = file_manager.derived_dir / file_id / NORMALIZED_KEY
+    return normalized if normalized.exists() else path
+
+
+def store_outline(file_id: str, index: OutlineIndex):
+    file_manager.put_derived(file_id, OUTLINE_KEY, json.dumps(index.to_dict()).encode())
+
+
+def outline_for(file_id: str) -> Optional[OutlineIndex]:
+    """Índice do sumário de ``file_id``: da memória, do cache de derivados ou calculado agora (e guardado)."""
+    with _outlines_lock:
+        index = _outlines.get(file_id)
+        if index is not None:
+            _outlines.move_to_end(file_id)
+            return index
+    data = cached(file_id, OUTLINE_KEY)
+    if data is not None:
+        index = OutlineIndex.from_dict(data)
+    else:
+        path = source_path(file_id)
+        if path is None:
+            return None
+        with doc_pool.borrow(file_id, path) as doc:
+            index = OutlineIndex.from_doc(doc)
+            locked = doc.needs_pass
+        if locked:
+            return index  # sumário ilegível sem a senha: nada a guardar
+        store_outline(file_id, index)
+    with _outlines_lock:
+        _outlines[file_id] = index
+        while len(_outlines) > OUTLINE_MEMO_SIZE:
+            _outlines.popitem(last=False)
+    return index
+
+
+def forget_outline(file_id: str):
+    with _outlines_lock:
+        _outlines.pop(file_id, None)
+
+
+class Preprocessor:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumers: list[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: Set[str] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        if settings.preprocess_workers <= 0 or self._queue is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=settings.preprocess_queue_size)
+        self._pool = ProcessPoolExecutor(
+            max_workers=settings.preprocess_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=os.nice,
+            initargs=(NICENESS,),
+        )
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(settings.preprocess_workers)]
+
+    async def stop(self):
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        self._queue = None
+        self._loop = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def join(self):
+        """Espera a fila esvaziar (testes, benchmarks)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def enqueue(self, file_id: str) -> bool:
+        """Agenda o pré-processamento; ``False`` se desligado ou com a fila cheia."""
+        if self._queue is None:
+            return False
+        self._cancelled.discard(file_id)
+        try:
+            self._queue.put_nowait(file_id)
+        except asyncio.QueueFull:
+            logger.debug(f"Preprocess queue full; skipping {file_id}")
+            return False
+        return True
+
+    def cancel(self, file_id: str):
+        """Descarta o pré-processamento de um arquivo apagado (na fila ou em andamento).
+
+        Chamado pelo ``FileManager.delete``, que pode rodar numa thread (TTL,
+        evicção LRU dentro de um ``to_thread``): nesse caso vai para o loop.
+        """
+        if self._queue is None or self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:
+            self._loop.call_soon_threadsafe(self._cancel, file_id)
+            return
+        self._cancel(file_id)
+
+    def _cancel(self, file_id: str):
+        self._cancelled.add(file_id)
+        task = self._running.get(file_id)
+        if task is not None:
+            task.cancel()
+
+    async def _consume(self):
+        while True:
+            file_id = await self._queue.get()
+            try:
+                if file_id in self._cancelled:
+                    continue
+                task = asyncio.create_task(self._process(file_id))
+                self._running[file_id] = task
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    # Arquivo apagado: só a tarefa dele foi cancelada, o consumidor segue.
+                    if not task.cancelled() or asyncio.current_task().cancelling():
+                        raise
+                except Exception as e:
+                    logger.warning(f"Preprocess failed for {file_id}: {e}")
+            finally:
+                self._running.pop(file_id, None)
+                self._cancelled.discard(file_id)
+                self._queue.task_done()
+
+    async def _stage(self, file_id: str, fn, *args):
+        """Roda uma etapa no pool; ``None`` se o arquivo sumiu enquanto isso."""
+        result = await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        if file_manager.get_info(file_id) is None:
+            await asyncio.to_thread(shutil.rmtree, file_manager.derived_dir / file_id, True)
+            return None
+        return result
+
+    async def _put(self, file_id: str, key: str, value):
+        await asyncio.to_thread(file_manager.put_derived, file_id, key, json.dumps(value).encode())
+
+    async def _process(self, file_id: str):
+        path = await asyncio.to_thread(file_manager.get_path, file_id)
+        if path is None:
+            return
+        target = file_manager.derived_dir / file_id
+        await asyncio.to_thread(target.mkdir, exist_ok=True)
+
+        # O upload normalmente já indexou o sumário; só calcula se faltar.
+        outline = cached(file_id, OUTLINE_KEY)
+        meta = await self._stage(file_id, summarize, str(path), str(target / NORMALIZED_KEY), outline is None)
+        if meta is None:
+            return
+        if "outline" in meta:
+            outline = meta.pop("outline")
+            await self._put(file_id, OUTLINE_KEY, outline)
+        await self._put(file_id, META_KEY, meta)
+        if meta["encrypted"]:
+            return
+        if meta["normalized"]:
+            path = target / NORMALIZED_KEY
+
+        if settings.preprocess_thumbnails > 0:
+            dpi = settings.thumbnail_dpi
+            thumbs = await self._stage(file_id, first_thumbnails, str(path), settings.preprocess_thumbnails, dpi)
+            if thumbs is None:
+                return
+            await self._put(file_id, thumbs_key(dpi), thumbs)
+
+        scanned = await self._stage(file_id, scan_text, str(path), outline)
+        if scanned is None:
+            return
+        texts, scan = scanned
+        await self._put(file_id, TEXT_KEY, texts)
+        await self._put(file_id, SCAN_KEY, scan)
+
+
+preprocessor = Preprocessor()
+# Arquivo apagado ou expirado (por qualquer caminho): para o trabalho e solta o sumário.
+file_manager.on_delete(preprocessor.cancel)
+file_manager.on_delete(forget_outline)
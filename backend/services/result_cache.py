@@ -0,0 +1,96 @@
+"""Memoização de resultados de operações (``/optimize``, ``/split``, ``/bates``).
+
+A chave é o SHA-256 de (hash do conteúdo de cada entrada, nome da operação,
+parâmetros normalizados, versão do código). O mesmo processo reenviado por um
+colega, ou a mesma operação repetida depois de perder o link, devolve o
+arquivo de resultado que já existe em vez de recalcular. As entradas vivem no
+índice do ``FileManager`` e somem junto com o arquivo de resultado (TTL,
+evicção LRU ou exclusão).
+
+Só o conteúdo do resultado é reaproveitado: num acerto, o arquivo ganha uma
+entrada nova com o nome montado a partir do pedido atual (e o dono atual), e
+a resposta leva esse nome. Quem reenviar os mesmos bytes com outro nome não
+recebe o nome do primeiro envio.
+
+Saídas protegidas por senha nunca são memoizadas: a senha entraria na chave
+e o resultado cifrado ficaria disponível para quem repetisse o pedido.
+"""
+import json
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import fitz
+from pydantic import BaseModel
+
+from services.file_manager import file_manager
+
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Tudo que decide o conteúdo de um resultado memoizado: o core e os routers que
+# montam parâmetros e perfis (PROFILES e _optimize em api/optimize.py, nomes das
+# partes do split, ...). Um router novo que use este cache entra aqui.
+_VERSIONED_SOURCES = ("core/*.py", "api/optimize.py", "api/split.py", "api/bates.py")
+
+
+def _code_version() -> str:
+    """Hash do código que gera os resultados e da versão do MuPDF: qualquer mudança invalida o cache."""
+    digest = hashlib.sha256(fitz.VersionBind.encode())
+    for pattern in _VERSIONED_SOURCES:
+        for source in sorted(_BACKEND_DIR.glob(pattern)):
+            digest.update(str(source.relative_to(_BACKEND_DIR)).encode())
+            digest.update(source.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = _code_version()
+
+
+async def key_for(op: str, file_ids: List[str], params: BaseModel, exclude: Iterable[str] = ("file_id",),
+                  extra: Optional[dict] = None) -> Optional[str]:
+    """Chave de memoização, ou ``None`` quando o resultado não deve ser reaproveitado.
+
+    ``extra`` entra na chave quando algo além dos parâmetros muda os bytes do
+    resultado (os nomes das partes dentro do ZIP do split, por exemplo).
+    """
+    if getattr(params, "password", None):
+        return None
+    hashes = []
+    for fid in file_ids:
+        digest = await asyncio.to_thread(file_manager.content_hash, fid)
+        if digest is None:
+            return None
+        hashes.append(digest)
+    payload = json.dumps({
+        "op": op,
+        "inputs": hashes,
+        # Valores padrão entram explicitamente: omitir um campo e mandá-lo com o default dá a mesma chave.
+        "params": params.model_dump(exclude=set(exclude)),
+        "extra": extra or {},
+        "version": CODE_VERSION,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def get(key: Optional[str], filename: Optional[str] = None) -> Optional[dict]:
+    """Resposta memoizada (com ``cached: true``), se o resultado ainda existir.
+
+    O resultado é registrado de novo como ``filename`` (por padrão, o nome
+    guardado, para quando a chave já cobre o nome) em nome do usuário atual.
+    """
+    if key is None:
+        return None
+    stored = await asyncio.to_thread(file_manager.get_result, key)
+    if stored is None:
+        return None
+    response = json.loads(stored)
+    filename = filename or response["filename"]
+    result_id = await asyncio.to_thread(file_manager.copy, response["result_file_id"], filename)
+    if result_id is None:
+        return None
+    return {**response, "result_file_id": result_id, "filename": filename, "cached": True}
+
+
+def put(key: Optional[str], response: dict):
+    if key is not None:
+        file_manager.put_result(key, response["result_file_id"], json.dumps(response))
@@ -0,0 +1,54 @@
+"""Coalescência de requisições idênticas em andamento (single-flight).
+
+O frontend (e usuários impacientes) disparam o mesmo ``/thumbnails``,
+``/scan`` ou ``/metadata`` várias vezes seguidas. Chamadas concorrentes com a
+mesma chave compartilham uma única tarefa: a primeira executa, as demais
+esperam o mesmo resultado (ou a mesma exceção). Nada é guardado depois que a
+tarefa termina — isso é papel dos caches de derivados/resultados.
+
+Um participante que desiste (cliente desconectou) não cancela o trabalho dos
+outros; a tarefa só é cancelada quando o último participante desiste.
+Coalesce dentro de um processo; cada worker do uvicorn tem o seu.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Executa ``fn()`` ou se junta à execução em andamento com a mesma ``key``."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._forget(key, t))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._calls.get(key) is task and self._waiters[key] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if not task.cancelled():
+            task.exception()  # já entregue aos participantes (ou ninguém mais espera)
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+
+
+flights = SingleFlight()
@@ -0,0 +1,336 @@
+"""Backends de armazenamento dos arquivos temporários.
+
+O ``FileManager`` mantém o índice (SQLite) e delega os bytes a um backend:
+
+- ``LocalStorage`` (padrão): arquivos direto no TEMP_DIR, como sempre foi;
+- ``S3Storage``: bucket S3-compatível (AWS, MinIO), para rodar vários nós
+  atrás do balanceador. Uploads multipart, leituras por faixa (Range) e um
+  cache local read-through em disco — as operações pesadas do MuPDF sempre
+  rodam sobre um arquivo local.
+
+Os objetos são endereçados pelo ``name`` do índice (``<file_id><ext>``).
+
+No S3 cada nó tem o próprio índice e o próprio cache. Uma cópia em cache é
+conferida no bucket (``HEAD``: existência e ETag) antes de ser servida, no
+máximo uma vez a cada ``STORAGE_REVALIDATE_S``: objeto apagado por outro nó
+vira FileNotFoundError (e sai do índice local) e objeto substituído é baixado
+de novo. Dentro dessa janela uma cópia velha ainda pode ser servida.
+"""
+import os
+import re
+import time
+import shutil
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger(__name__)
+
+# Formato dos file_id gerados pelo FileManager (uuid4 hex, 12 caracteres).
+FILE_ID = re.compile(r"^[0-9a-f]{12}$")
+
+
+class StorageBackend(ABC):
+    """Interface comum. ``meta`` carrega filename/content_type/owner/created_at/size."""
+
+    #: Os arquivos já estão no volume local (sem cache nem rede).
+    is_local = True
+
+    @abstractmethod
+    def put(self, name: str, src: Path, meta: dict) -> None:
+        """Assume o arquivo ``src`` (já gravado no volume local) como ``name``."""
+
+    @abstractmethod
+    def local_path(self, name: str) -> Path:
+        """Caminho local legível para ``name``. FileNotFoundError se não existir."""
+
+    @abstractmethod
+    def read_range(self, name: str, start: int, length: int) -> bytes:
+        """``length`` bytes de ``name`` a partir de ``start``. FileNotFoundError se não existir."""
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """Apaga ``name`` (sem erro se já não existir)."""
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        """``name`` existe no armazenamento."""
+
+    def lookup(self, file_id: str) -> Optional[Tuple[str, dict]]:
+        """Procura um arquivo que não está no índice local (gravado por outro nó)."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, name: str, src: Path, meta: dict) -> None:
+        shutil.move(src, self.root / name)
+
+    def local_path(self, name: str) -> Path:
+        path = self.root / name
+        if not path.exists():
+            raise FileNotFoundError(name)
+        return path
+
+    def read_range(self, name: str, start: int, length: int) -> bytes:
+        with open(self.local_path(name), "rb") as fh:
+            fh.seek(start)
+            return fh.read(length)
+
+    def delete(self, name: str) -> None:
+        (self.root / name).unlink(missing_ok=True)
+
+    def exists(self, name: str) -> bool:
+        return (self.root / name).exists()
+
+
+class DiskCache:
+    """Cache local LRU (por mtime) com teto de bytes, para objetos remotos."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def path(self, name: str) -> Path:
+        return self.root / name
+
+    def get(self, name: str) -> Optional[Path]:
+        path = self.root / name
+        try:
+            os.utime(path)  # marca como usado recentemente
+        except FileNotFoundError:
+            return None
+        return path
+
+    def adopt(self, name: str, src: Path) -> Path:
+        """Move ``src`` para o cache e aplica o teto."""
+        path = self.root / name
+        os.replace(src, path)
+        self.trim(keep=name)
+        return path
+
+    def discard(self, name: str):
+        (self.root / name).unlink(missing_ok=True)
+
+    def trim(self, keep: Optional[str] = None):
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            if not entry.is_file() or entry.name.endswith(".part"):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, entry, st.st_size))
+            total += st.st_size
+        entries.sort()
+        for _, entry, size in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+class S3Storage(StorageBackend):
+    is_local = False
+
+    # Partes de 8 MB: acima disso o boto3 faz upload multipart em paralelo.
+    MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+    def __init__(
+        self,
+        bucket: str,
+        cache_dir: Path,
+        cache_max_bytes: int,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        revalidate_s: float = 2.0,
+        client=None,
+    ):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError as e:  # dependência opcional
+            raise RuntimeError("STORAGE_BACKEND=s3 requer o pacote boto3 (pip install boto3)") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+        )
+        self.transfer = TransferConfig(
+            multipart_threshold=self.MULTIPART_THRESHOLD,
+            multipart_chunksize=self.MULTIPART_THRESHOLD,
+        )
+        self.cache = DiskCache(cache_dir, cache_max_bytes)
+        self.revalidate_s = revalidate_s
+        # name -> (ETag da cópia em cache, instante da última conferência no bucket)
+        self._checked: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    def _is_missing(self, exc: Exception) -> bool:
+        code = getattr(exc, "response", {}).get("Error", {}).get("Code", "")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, name: str, src: Path, meta: dict) -> None:
+        extra = {
+            "ContentType": meta.get("content_type") or "application/octet-stream",
+            # Metadados S3 são ASCII: filename/owner vão url-encoded.
+            "Metadata": {
+                "filename": quote(meta.get("filename") or name),
+                "owner": quote(meta.get("owner") or ""),
+                "created-at": repr(meta.get("created_at") or time.time()),
+            },
+        }
+        self.client.upload_file(str(src), self.bucket, self._key(name), ExtraArgs=extra, Config=self.transfer)
+        # Quem gravou quase sempre é quem lê em seguida: mantém a cópia no cache.
+        self.cache.adopt(name, src)
+        self._remember(name, self._head(name).get("ETag"))
+
+    def _head(self, name: str) -> dict:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+
+    def _remember(self, name: str, etag: Optional[str]):
+        self._checked[name] = (etag, time.monotonic())
+
+    def _forget(self, name: str):
+        self._checked.pop(name, None)
+        self.cache.discard(name)
+
+    def _cached(self, name: str) -> Optional[Path]:
+        """Cópia do cache, se ainda corresponde ao objeto no bucket.
+
+        Apagado no bucket (por outro nó): descarta a cópia e levanta
+        FileNotFoundError. ETag diferente (substituído): descarta e devolve
+        None, para baixar de novo.
+        """
+        cached = self.cache.get(name)
+        if cached is None:
+            return None
+        etag, checked_at = self._checked.get(name, (None, float("-inf")))
+        if time.monotonic() - checked_at < self.revalidate_s:
+            return cached
+        try:
+            head = self._head(name)
+        except FileNotFoundError:
+            self._forget(name)
+            raise
+        if etag is not None and head.get("ETag") != etag:
+            self._forget(name)
+            return None
+        self._remember(name, head.get("ETag"))
+        return cached
+
+    def local_path(self, name: str) -> Path:
+        cached = self._cached(name)
+        if cached is not None:
+            return cached
+        etag = self._head(name).get("ETag")
+        part = self.cache.path(name + f".{os.getpid()}.part")
+        try:
+            self.client.download_file(self.bucket, self._key(name), str(part), Config=self.transfer)
+        except Exception as e:
+            part.unlink(missing_ok=True)
+            if self._is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+        path = self.cache.adopt(name, part)
+        self._remember(name, etag)
+        return path
+
+    def read_range(self, name: str, start: int, length: int) -> bytes:
+        cached = self._cached(name)
+        if cached is not None:
+            with open(cached, "rb") as fh:
+                fh.seek(start)
+                return fh.read(length)
+        if length <= 0:
+            return b""
+        try:
+            resp = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(name), Range=f"bytes={start}-{start + length - 1}"
+            )
+        except Exception as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+        return resp["Body"].read()
+
+    def delete(self, name: str) -> None:
+        self._forget(name)
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name: str) -> bool:
+        try:
+            if self._cached(name) is not None:
+                return True
+            self._head(name)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def lookup(self, file_id: str) -> Optional[Tuple[str, dict]]:
+        # O id vem do cliente: um prefixo curto ("a", "3f") casaria com o
+        # arquivo de outra pessoa.
+        if not FILE_ID.match(file_id):
+            return None
+        resp = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._key(file_id), MaxKeys=2)
+        for obj in resp.get("Contents", []):
+            name = obj["Key"][len(self.prefix):]
+            if name != file_id and not name.startswith(file_id + "."):
+                continue
+            head = self.client.head_object(Bucket=self.bucket, Key=obj["Key"])
+            md = head.get("Metadata", {})
+            try:
+                created_at = float(md.get("created-at", ""))
+            except ValueError:
+                created_at = obj["LastModified"].timestamp()
+            return name, {
+                "filename": unquote(md.get("filename", name)),
+                "content_type": head.get("ContentType") or "application/octet-stream",
+                "owner": unquote(md.get("owner", "")) or None,
+                "created_at": created_at,
+                "size": head.get("ContentLength", obj.get("Size", 0)),
+            }
+        return None
+
+
+def make_storage(temp_dir: Path) -> StorageBackend:
+    """Instancia o backend configurado em ``settings.storage_backend``."""
+    from config import settings
+
+    if settings.storage_backend == "s3":
+        return S3Storage(
+            bucket=settings.s3_bucket,
+            prefix=settings.s3_prefix,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key=settings.s3_access_key,
+            secret_key=settings.s3_secret_key,
+            cache_dir=Path(temp_dir) / "cache",
+            cache_max_bytes=settings.storage_cache_mb * 1024 * 1024,
+            revalidate_s=settings.storage_revalidate_s,
+        )
+    if settings.storage_backend != "local":
+        raise RuntimeError(f"STORAGE_BACKEND desconhecido: {settings.storage_backend}")
+    return LocalStorage(temp_dir)
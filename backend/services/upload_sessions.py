@@ -0,0 +1,242 @@
+"""Sessões de upload resumível: criar → anexar blocos por offset → finalizar.
+
+Cada bloco é gravado direto no volume temporário (``TEMP_DIR/uploads``) e
+entra num SHA-256 incremental. Se a conexão cair, o cliente consulta o offset
+confirmado e reenvia só o que falta. O estado da sessão fica no mesmo índice
+SQLite do FileManager (compartilhado entre workers); o hasher incremental é
+por processo — se o próximo bloco cair em outro worker, ele recalcula o hash
+do que já está em disco antes de seguir.
+
+Anexar, finalizar e abortar seguram um ``flock`` exclusivo no arquivo
+``<upload_id>.lock``, que vale entre os workers do uvicorn. Um segundo pedido
+na mesma sessão enquanto outro está em andamento falha na hora com
+``SessionBusy`` em vez de intercalar gravações.
+"""
+import time
+import uuid
+import fcntl
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+from config import settings
+from services.file_manager import FileManager, INDEX_NAME, connect_index, file_manager
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    upload_id    TEXT PRIMARY KEY,
+    filename     TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    size         INTEGER NOT NULL,
+    received     INTEGER NOT NULL DEFAULT 0,
+    owner        TEXT,
+    created_at   REAL NOT NULL
+);
+"""
+# Colunas adicionadas depois (ALTER TABLE na subida, como no índice de arquivos).
+_MIGRATIONS = {
+    "updated_at": "ALTER TABLE upload_sessions ADD COLUMN updated_at REAL NOT NULL DEFAULT 0",
+}
+
+_HASH_READ_CHUNK = 4 * 1024 * 1024
+
+
+class OffsetMismatch(Exception):
+    """O bloco não começa no offset confirmado da sessão."""
+
+    def __init__(self, expected: int):
+        super().__init__(f"offset esperado: {expected}")
+        self.expected = expected
+
+
+class SessionBusy(Exception):
+    """Outro pedido (neste ou em outro worker) está gravando ou finalizando a sessão."""
+
+
+class UploadSessions:
+    def __init__(self, files: FileManager):
+        self.files = files
+        self.dir = files.temp_dir / "uploads"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = files.temp_dir / INDEX_NAME
+        self._local = threading.local()
+        # upload_id -> (hasher, bytes já incluídos no hash); só deste processo.
+        self._hashers: dict[str, tuple] = {}
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(upload_sessions)")}
+        for column, ddl in _MIGRATIONS.items():
+            if column not in columns:
+                try:
+                    conn.execute(ddl)
+                except sqlite3.OperationalError:
+                    pass  # outro worker migrou primeiro
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_index(self._db_path)
+            self._local.conn = conn
+        return conn
+
+    def _path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}.part"
+
+    def _lock_path(self, upload_id: str) -> Path:
+        return self.dir / f"{upload_id}.lock"
+
+    @contextmanager
+    def _locked(self, upload_id: str) -> Iterator[dict]:
+        """Segura o lock da sessão (entre processos) e devolve o estado lido já com ele."""
+        if self.get(upload_id) is None:
+            raise KeyError(upload_id)
+        with open(self._lock_path(upload_id), "a+b") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise SessionBusy(upload_id)
+            try:
+                # Relido com o lock: outro worker pode ter anexado ou finalizado antes.
+                session = self.get(upload_id)
+                if session is None:
+                    raise KeyError(upload_id)
+                yield session
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def create(self, filename: str, size: int, content_type: str, owner: Optional[str]) -> dict:
+        # Reserva o espaço já na criação: falha cedo, antes de o usuário enviar 150 MB.
+        self.files.ensure_room(size, owner)
+        upload_id = uuid.uuid4().hex
+        self._path(upload_id).touch()
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO upload_sessions (upload_id, filename, content_type, size, received, owner, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+            (upload_id, filename, content_type, size, owner, now, now),
+        )
+        self._hashers[upload_id] = (hashlib.sha256(), 0)
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _hasher_at(self, upload_id: str, offset: int):
+        """Hasher cobrindo exatamente [0, offset) do arquivo (recalcula do disco se preciso)."""
+        hasher, upto = self._hashers.get(upload_id, (None, 0))
+        if hasher is None or upto > offset:
+            hasher, upto = hashlib.sha256(), 0
+        if upto < offset:
+            with open(self._path(upload_id), "rb") as fh:
+                fh.seek(upto)
+                while upto < offset:
+                    block = fh.read(min(_HASH_READ_CHUNK, offset - upto))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    upto += len(block)
+        return hasher, upto
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Grava o corpo recebido a partir de ``offset``; retorna o novo offset confirmado.
+
+        Bytes recebidos antes de uma queda de conexão ficam confirmados — o
+        cliente retoma de onde parou.
+        """
+        with self._locked(upload_id) as session:
+            if offset != session["received"]:
+                raise OffsetMismatch(session["received"])
+
+            hasher, _ = await asyncio.to_thread(self._hasher_at, upload_id, offset)
+            written = 0
+            try:
+                with open(self._path(upload_id), "r+b") as fh:
+                    # Descarta sobras de uma tentativa anterior que não foi confirmada.
+                    fh.truncate(offset)
+                    fh.seek(offset)
+                    async for chunk in chunks:
+                        if not chunk:
+                            continue
+                        if offset + written + len(chunk) > session["size"]:
+                            raise ValueError("Bloco ultrapassa o tamanho declarado da sessão")
+                        fh.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+            finally:
+                new_offset = offset + written
+                self._hashers[upload_id] = (hasher, new_offset)
+                # Cada bloco renova a sessão: a expiração conta da última atividade.
+                self._conn().execute(
+                    "UPDATE upload_sessions SET received = ?, updated_at = ? WHERE upload_id = ? AND received = ?",
+                    (new_offset, time.time(), upload_id, offset),
+                )
+            return new_offset
+
+    async def finalize(self, upload_id: str, expected_sha256: Optional[str] = None) -> tuple[str, str, dict]:
+        """Valida tamanho/hash e registra o arquivo no FileManager: (file_id, sha256, sessão)."""
+        with self._locked(upload_id) as session:
+            if session["received"] != session["size"]:
+                raise ValueError(f"Upload incompleto: {session['received']} de {session['size']} bytes")
+
+            hasher, _ = await asyncio.to_thread(self._hasher_at, upload_id, session["size"])
+            digest = hasher.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != digest:
+                raise ValueError("SHA-256 não confere com o arquivo recebido")
+
+            file_id = await asyncio.to_thread(
+                self.files.store_file, self._path(upload_id), session["filename"],
+                session["content_type"], session["owner"],
+            )
+            self._forget(upload_id)
+        return file_id, digest, session
+
+    def _forget(self, upload_id: str):
+        # Chamado com o lock seguro: quem abrir o .lock depois não acha mais a sessão.
+        self._conn().execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+        self._hashers.pop(upload_id, None)
+        self._lock_path(upload_id).unlink(missing_ok=True)
+
+    def abort(self, upload_id: str) -> bool:
+        try:
+            with self._locked(upload_id):
+                self._forget(upload_id)
+                self._path(upload_id).unlink(missing_ok=True)
+        except KeyError:
+            return False
+        return True
+
+    def cleanup_expired(self):
+        """Remove sessões abandonadas: sem bloco novo há mais que o TTL dos temporários.
+
+        Um envio longo que cai e retoma continua vivo enquanto recebe blocos.
+        """
+        cutoff = time.time() - settings.temp_file_ttl_minutes * 60
+        expired = [
+            row["upload_id"]
+            for row in self._conn().execute(
+                "SELECT upload_id FROM upload_sessions WHERE MAX(created_at, updated_at) < ?", (cutoff,),
+            )
+        ]
+        for upload_id in expired:
+            try:
+                self.abort(upload_id)
+            except SessionBusy:
+                pass  # ainda recebendo blocos: fica para a próxima rodada
+        if expired:
+            logger.info(f"Cleaned up {len(expired)} abandoned upload sessions")
+
+    async def cleanup_loop(self):
+        while True:
+            await asyncio.sleep(300)
+            await asyncio.to_thread(self.cleanup_expired)
+
+
+upload_sessions = UploadSessions(file_manager)
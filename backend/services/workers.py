@@ -0,0 +1,65 @@
+"""Pool de processos compartilhado para trabalho CPU-bound do MuPDF.
+
+O PyMuPDF não libera o GIL: ``asyncio.to_thread`` evita travar o event loop,
+mas não paraleliza. Renderizações em lote vão para este pool. As funções
+enviadas precisam ser importáveis sem efeitos colaterais (ficam em ``core``)
+e recebem caminhos de arquivo, não bytes — cada worker abre o PDF por conta
+própria.
+"""
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def pool_size() -> int:
+    return settings.render_workers or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: o processo pai tem threads (SQLite, to_thread) — fork herdaria locks.
+        _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def run(fn, *args):
+    """Executa ``fn(*args)`` num worker do pool."""
+    global _pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pool(), fn, *args)
+    except BrokenProcessPool:
+        # Um worker morreu (OOM, segfault do MuPDF): recria o pool para as próximas chamadas.
+        logger.error("Render worker pool broken; restarting it")
+        shutdown()
+        raise
+
+
+def batches(items: list, parts: int) -> list[list]:
+    """Divide ``items`` em até ``parts`` fatias contíguas de tamanho parecido."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    out, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        out.append(items[start:end])
+        start = end
+    return out
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
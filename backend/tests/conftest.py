@@ -2,9 +2,15 @@
 (o app roda com cwd=backend/, sem pacote `backend.*` — ver backend/main.py)."""
 from __future__ import annotations
 
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 BACKEND_DIR = Path(__file__).resolve().parent.parent
 if str(BACKEND_DIR) not in sys.path:
     sys.path.insert(0, str(BACKEND_DIR))
+
+# services.file_manager cria TEMP_DIR (e o índice SQLite) na importação: nos
+# testes isso vai para um diretório descartável, nunca para /app/tmp.
+os.environ.setdefault("TEMP_DIR", tempfile.mkdtemp(prefix="pdf-tests-"))
@@ -0,0 +1,203 @@
+"""Controle de admissão: faixas, fila limitada por custo, prazos e cancelamento."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import fitz
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from api.bates import BatesRequest, bates
+from api.files import get_metadata
+from config import settings
+from core import bates as core_bates, diff as core_diff, pdf_ops, redact as core_redact
+from core.cancel import CancelToken, OperationCancelled, checkpoint, installed
+from services import admission
+from services.admission import Lane
+from services.file_manager import file_manager
+
+
+def _pdf(pages: int) -> str:
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page()
+    file_id = file_manager.store(doc.tobytes(), "a.pdf")
+    doc.close()
+    return file_id
+
+
+async def test_fila_cheia_responde_429_com_retry_after():
+    lane = Lane("test", slots=1, backlog_cost=10)
+    await lane.acquire(4)
+    waiting = asyncio.ensure_future(lane.acquire(8))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc:
+        await lane.acquire(5)
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+    # Sozinho na fila, um pedido entra por maior que seja.
+    lane.release(4, 4.0)
+    await waiting
+    assert lane.running == 1
+    # Vazão observada (1 s por unidade) entra na média móvel do Retry-After.
+    assert lane.seconds_per_cost == pytest.approx(0.6)
+    lane.release(8, None)
+    lane.shutdown()
+
+
+async def test_fila_e_fifo_e_desistencia_libera_a_vez():
+    lane = Lane("test", slots=1, backlog_cost=100)
+    await lane.acquire(1)
+    order = []
+
+    async def job(name):
+        await lane.acquire(1)
+        order.append(name)
+
+    first = asyncio.ensure_future(job("a"))
+    gone = asyncio.ensure_future(job("b"))
+    third = asyncio.ensure_future(job("c"))
+    await asyncio.sleep(0)
+    gone.cancel()
+    await asyncio.sleep(0)
+
+    lane.release(1, None)
+    await first
+    lane.release(1, None)
+    await third
+    assert order == ["a", "c"]
+    assert lane.running == 1
+    lane.shutdown()
+
+
+async def test_lote_saturado_nao_bloqueia_metadados(monkeypatch):
+    monkeypatch.setattr(admission, "_lanes", {})
+    monkeypatch.setattr(admission.settings, "batch_slots", 1)
+    file_id = _pdf(1)
+
+    gate = threading.Event()
+    threads = []
+
+    def busy():
+        threads.append(threading.current_thread().name)
+        gate.wait(5)
+
+    batch = asyncio.ensure_future(admission.run("optimize:maximum", [file_id], busy))
+    await asyncio.sleep(0.05)
+    try:
+        meta = await asyncio.wait_for(get_metadata(file_id), 5)
+        assert meta["pages"] == 1
+        assert threads[0].startswith("lane-batch")
+    finally:
+        gate.set()
+        await batch
+        admission.shutdown()
+
+
+async def test_prazo_estourado_responde_504_sem_deixar_temporarios(monkeypatch):
+    monkeypatch.setattr(admission.settings, "operation_deadlines", {"bates": 0})
+    file_id = _pdf(3)
+    before = set(file_manager.scratch_dir.iterdir())
+
+    with pytest.raises(HTTPException) as exc:
+        await bates(BatesRequest(file_id=file_id), _Connected())
+    assert exc.value.status_code == 504
+    assert set(file_manager.scratch_dir.iterdir()) == before
+
+
+@pytest.mark.parametrize("module, call", [
+    (core_bates, lambda src, out: core_bates.apply_bates_stamping(src, out / "out.pdf")),
+    (core_redact, lambda src, out: core_redact.redact_text_matches(src, out / "out.pdf", ["x"])),
+    (core_diff, lambda src, out: core_diff.compare_pdfs(src, src)),
+    (pdf_ops, lambda src, out: pdf_ops.split_pdf_by_size(src, out / "partes", 1)),
+])
+def test_cancelamento_fecha_os_documentos(module, call, monkeypatch, tmp_path):
+    opened = []
+    real = module.open_pdf
+    monkeypatch.setattr(module, "open_pdf", lambda src: opened.append(real(src)) or opened[-1])
+    src = file_manager.get_path(_pdf(3))
+
+    with installed(CancelToken(time.monotonic() - 1)), pytest.raises(OperationCancelled):
+        call(src, tmp_path)
+    assert opened and all(doc.is_closed for doc in opened)
+
+
+async def test_cliente_desconectado_interrompe_o_core():
+    class Request:
+        gone = False
+
+        async def is_disconnected(self):
+            return self.gone
+
+    request = Request()
+    pages_done = []
+
+    def slow_loop():
+        for page in range(200):
+            checkpoint()
+            pages_done.append(page)
+            time.sleep(0.01)
+
+    task = asyncio.ensure_future(admission.run("diff", [], slow_loop, request=request))
+    await asyncio.sleep(0.1)
+    request.gone = True
+    with pytest.raises(HTTPException) as exc:
+        await task
+    assert exc.value.status_code == 499
+    assert len(pages_done) < 200
+
+
+class _Connected:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+async def test_stream_de_miniaturas_segura_a_vaga_ate_o_fim(monkeypatch):
+    from api.thumbnails import stream_thumbnails
+
+    monkeypatch.setattr(admission, "_lanes", {})
+    fid = _pdf(3)
+    response = await stream_thumbnails(fid, _Connected(), page_start=0, page_end=2, dpi=36)
+    assert admission.lane("stream").running == 1
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("cliente foi embora")  # antes do primeiro byte do corpo
+
+    # O corpo nunca é iterado, e a vaga volta mesmo assim.
+    with pytest.raises(ClientDisconnect):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert admission.lane("stream").running == 0
+    admission.shutdown()
+
+
+async def test_streams_abertos_nao_ocupam_a_faixa_interativa(monkeypatch):
+    from api.thumbnails import stream_thumbnails
+
+    monkeypatch.setattr(admission, "_lanes", {})
+    monkeypatch.setattr(settings, "interactive_threads", 2)
+    fid = _pdf(3)
+    # Mais editores abertos que threads interativas.
+    streams = [
+        await asyncio.wait_for(stream_thumbnails(fid, _Connected(), page_start=0, page_end=2, dpi=36), timeout=1)
+        for _ in range(4)
+    ]
+    assert admission.lane("stream").running == 4
+
+    async def metadata():
+        async with admission.admit("metadata", [fid]):
+            return admission.lane("interactive").running
+
+    # Entra na hora: nenhuma thread interativa está presa a um stream.
+    assert await asyncio.wait_for(metadata(), timeout=1) == 1
+    for response in streams:
+        response._release()
+    assert admission.lane("stream").running == 0
+    admission.shutdown()
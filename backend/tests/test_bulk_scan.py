@@ -0,0 +1,104 @@
+"""Triagem em lote: smart scan de um pacote inteiro com índice agregado."""
+from __future__ import annotations
+
+import json
+
+import fitz
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect
+
+from api import scan as scan_api
+from api.scan import BulkScanRequest, bulk_scan, scan
+from config import settings
+from services import admission, workers
+from services.file_manager import file_manager
+from services.preprocess import SCAN_KEY, cached
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _processo(*headings: str) -> bytes:
+    doc = fitz.open()
+    for heading in headings:
+        doc.new_page().insert_text((72, 72), heading, fontsize=14)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+async def _lines(response) -> list[dict]:
+    return [json.loads(chunk) async for chunk in response.body_iterator]
+
+
+async def test_emite_cada_arquivo_e_termina_com_indice_por_categoria(monkeypatch):
+    monkeypatch.setattr(settings, "render_workers", 2)
+    a = file_manager.store(_processo("SENTENÇA", "texto", "DESPACHO"), "a.pdf")
+    b = file_manager.store(_processo("CONTESTAÇÃO", "SENTENÇA"), "b.pdf")
+    broken = file_manager.store(b"%PDF-1.7 nada aqui", "quebrado.pdf")
+    try:
+        response = await bulk_scan(BulkScanRequest(file_ids=[a, b, broken, a]), _FakeRequest())
+        lines = await _lines(response)
+    finally:
+        workers.shutdown()
+
+    files = {line["file_id"]: line for line in lines if line["type"] == "file"}
+    assert set(files) == {a, b}
+    assert files[a]["filename"] == "a.pdf" and files[a]["page_count"] == 3
+    assert [line["file_id"] for line in lines if line["type"] == "error"] == [broken]
+
+    index = lines[-1]
+    assert index["type"] == "index"
+    assert (index["files"], index["errors"], index["pages"]) == (2, 1, 5)
+    sentences = index["categories"]["Sentença"]
+    assert [(p["file_id"], p["start_page_0_idx"]) for p in sentences] == [(a, 0), (b, 1)]
+    # Ordem das categorias segue LEGAL_KEYWORDS, não a ordem de chegada.
+    assert list(index["categories"]).index("Sentença") < list(index["categories"]).index("Despacho")
+    # O próximo /scan do arquivo sai do cache.
+    assert cached(a, SCAN_KEY)["page_count"] == 3
+
+
+async def test_valida_antes_de_abrir_o_stream_e_libera_a_vaga(monkeypatch):
+    monkeypatch.setattr(admission, "_lanes", {})
+    with pytest.raises(HTTPException) as exc:
+        await bulk_scan(BulkScanRequest(file_ids=["nao-existe"]), _FakeRequest())
+    assert exc.value.status_code == 404
+
+    fid = file_manager.store(_processo("DECISÃO"), "c.pdf")
+    file_manager.put_derived(fid, SCAN_KEY, json.dumps({"page_count": 1, "pieces": [], "bookmarks": []}).encode())
+    response = await bulk_scan(BulkScanRequest(file_ids=[fid]), _FakeRequest())
+    assert admission.lane("batch").running == 1
+    lines = await _lines(response)
+    assert [line["type"] for line in lines] == ["file", "index"]
+    assert admission.lane("batch").running == 0
+    admission.shutdown()
+
+
+async def test_vaga_volta_se_o_cliente_some_antes_do_corpo(monkeypatch):
+    monkeypatch.setattr(admission, "_lanes", {})
+    fid = file_manager.store(_processo("DECISÃO"), "d.pdf")
+    response = await bulk_scan(BulkScanRequest(file_ids=[fid]), _FakeRequest())
+    assert admission.lane("batch").running == 1
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("cliente foi embora")
+
+    with pytest.raises(ClientDisconnect):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    assert admission.lane("batch").running == 0
+    admission.shutdown()
+
+
+async def test_scan_de_arquivo_que_some_no_meio_e_404(monkeypatch):
+    fid = file_manager.store(_processo("DECISÃO"), "e.pdf")
+    # Apagado entre a validação e o cálculo do sumário.
+    monkeypatch.setattr(scan_api, "outline_for", lambda file_id: None)
+    with pytest.raises(HTTPException) as exc:
+        await scan(fid)
+    assert exc.value.status_code == 404
@@ -0,0 +1,106 @@
+"""Imagens -> PDF: JPEG embutido sem recodificar, o resto convertido nos workers."""
+from __future__ import annotations
+
+import struct
+
+import fitz
+import pytest
+
+from services import workers
+from services.file_manager import file_manager
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _photo(width: int = 160, height: int = 90, orientation: int = 1) -> bytes:
+    """JPEG com um canto vermelho (para conferir rotação) e tag EXIF Orientation."""
+    canvas = fitz.open()
+    page = canvas.new_page(width=width, height=height)
+    page.draw_rect(fitz.Rect(0, 0, width // 4, height // 4), color=None, fill=(1, 0, 0))
+    data = page.get_pixmap(dpi=72).tobytes("jpeg")
+    tiff = b"II*\x00" + struct.pack("<IH", 8, 1) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0) + b"\x00" * 4
+    app1 = b"\xff\xe1" + struct.pack(">H", 8 + len(tiff)) + b"Exif\x00\x00" + tiff
+    return data[:2] + app1 + data[2:]
+
+
+def _red_corner(page: fitz.Page) -> str:
+    pix = page.get_pixmap(dpi=72)
+    corners = {"tl": (2, 2), "tr": (pix.width - 3, 2), "bl": (2, pix.height - 3), "br": (pix.width - 3, pix.height - 3)}
+    return next(name for name, (x, y) in corners.items() if pix.pixel(x, y)[1] < 100)
+
+
+@pytest.mark.parametrize("orientation", [1, 3, 6, 8])
+def test_jpeg_embutido_sem_recodificar(orientation, tmp_path):
+    from core.pdf_ops import images_to_pdf
+
+    photo = _photo(orientation=orientation)
+    reference = fitz.open("pdf", fitz.open(stream=photo).convert_to_pdf())[0]
+
+    (tmp_path / "foto.jpg").write_bytes(photo)
+    (tmp_path / "copia.jpg").write_bytes(photo)
+    images_to_pdf([tmp_path / "foto.jpg", tmp_path / "copia.jpg"], tmp_path / "out.pdf")
+    out = fitz.open(tmp_path / "out.pdf")
+
+    assert out.page_count == 2
+    assert out[0].rect == reference.rect
+    assert _red_corner(out[0]) == _red_corner(reference)
+    xrefs = {img[0] for page in out for img in page.get_images(full=True)}
+    assert len(xrefs) == 1
+    assert out.xref_stream_raw(xrefs.pop()) == photo
+
+
+@pytest.fixture
+def uploaded(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "render_workers", 2)
+    ids = []
+
+    def store(data: bytes, name: str) -> str:
+        ids.append(file_manager.store(data, name))
+        return ids[-1]
+
+    yield store
+    workers.shutdown()
+    for fid in ids:
+        file_manager.delete(fid)
+
+
+async def test_png_e_reducao_de_dpi_nos_workers(uploaded, monkeypatch):
+    from api.converter import ConverterRequest, convert_images
+
+    # Os workers gravam cada página num scratch: pelo pipe volta só o tamanho.
+    returned = []
+    run = workers.run
+
+    async def spy(fn, *args):
+        returned.append(await run(fn, *args))
+        return returned[-1]
+
+    monkeypatch.setattr(workers, "run", spy)
+    scratch_before = set(file_manager.scratch_dir.iterdir())
+
+    screenshot = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 300, 200), False)
+    screenshot.set_rect(screenshot.irect, (20, 120, 220))
+    ids = [
+        uploaded(_photo(), "foto.jpg"),
+        uploaded(screenshot.tobytes("png"), "captura.png"),
+        uploaded(_photo(4000, 3000), "celular.jpg"),
+    ]
+
+    res = await convert_images(ConverterRequest(file_ids=ids, target_dpi=150), _FakeRequest())
+
+    out = fitz.open("pdf", file_manager.get_bytes(res["result_file_id"]))
+    assert out.page_count == 3
+    assert out[0].get_images(full=True)[0][8] == "DCTDecode"
+    assert out[1].get_images(full=True)[0][8] != "DCTDecode"
+    # Foto de 4000 px: página encaixada em A4 deitado (4:3, limitada pela altura) e reduzida a ~150 dpi.
+    assert out[2].rect.height == pytest.approx(fitz.paper_rect("a4").width)
+    width = out[2].get_images(full=True)[0][2]
+    assert width == pytest.approx(out[2].rect.width / 72 * 150, abs=2)
+    assert len(returned) == 2 and all(isinstance(size, int) for size in returned)
+    assert set(file_manager.scratch_dir.iterdir()) == scratch_before
+    file_manager.delete(res["result_file_id"])
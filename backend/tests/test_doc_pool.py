@@ -0,0 +1,108 @@
+"""Pool LRU de documentos abertos para leituras."""
+from __future__ import annotations
+
+import threading
+
+import fitz
+
+from api import thumbnails
+from services.doc_pool import DocumentPool
+from services.file_manager import file_manager
+
+
+def _save(path, pages: int = 2):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Folha {i + 1}")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_reaproveita_o_documento_e_evicta_o_menos_usado(tmp_path):
+    pool = DocumentPool(size=2)
+    a, b, c = (_save(tmp_path / f"{n}.pdf") for n in "abc")
+
+    with pool.borrow("a", a) as doc_a:
+        pass
+    with pool.borrow("a", a) as again:
+        assert again is doc_a
+    with pool.borrow("b", b):
+        pass
+    with pool.borrow("a", a):
+        pass
+    with pool.borrow("c", c):
+        pass
+
+    assert len(pool) == 2
+    assert doc_a.is_closed is False
+    with pool.borrow("b", b) as doc_b:
+        assert doc_b.page_count == 2  # "b" foi evictado e reaberto
+    pool.clear()
+    assert doc_a.is_closed
+
+
+def test_descartado_em_uso_fecha_ao_ser_devolvido(tmp_path):
+    pool = DocumentPool(size=4)
+    path = _save(tmp_path / "a.pdf")
+
+    with pool.borrow("a", path) as doc:
+        pool.discard("a")
+        assert not doc.is_closed
+        assert doc.page_count == 2
+    assert doc.is_closed
+
+    with pool.borrow("a", path) as fresh:
+        assert fresh is not doc
+
+
+def test_caminho_novo_substitui_o_documento(tmp_path):
+    pool = DocumentPool(size=4)
+    original = _save(tmp_path / "a.pdf", pages=2)
+    normalized = _save(tmp_path / "normalized.pdf", pages=3)
+
+    with pool.borrow("a", original) as doc:
+        pass
+    with pool.borrow("a", normalized) as replaced:
+        assert replaced.page_count == 3
+    assert doc.is_closed
+    pool.clear()
+
+
+def test_uma_thread_por_documento(tmp_path):
+    pool = DocumentPool(size=4)
+    path = _save(tmp_path / "a.pdf")
+    inside, overlaps = [], []
+
+    def read():
+        for _ in range(50):
+            with pool.borrow("a", path) as doc:
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                doc.load_page(0).get_text()
+                inside.pop()
+
+    workers = [threading.Thread(target=read) for _ in range(4)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert not overlaps
+    pool.clear()
+
+
+async def test_janelas_de_miniaturas_nao_reabrem_o_pdf(tmp_path, monkeypatch):
+    path = _save(tmp_path / "processo.pdf", pages=6)
+    file_id = file_manager.store(path.read_bytes(), "processo.pdf")
+    monkeypatch.setattr(thumbnails, "doc_pool", DocumentPool(size=4))
+    opened = []
+    real_open = fitz.open
+    monkeypatch.setattr(fitz, "open", lambda *a, **k: opened.append(a) or real_open(*a, **k))
+
+    for start in (0, 2, 4):
+        result = await thumbnails.get_thumbnails(file_id, page_start=start, page_end=start + 1, dpi=36)
+        assert [t["page"] for t in result["thumbnails"]] == [start, start + 1]
+
+    assert len(opened) == 1
+    thumbnails.doc_pool.clear()
@@ -0,0 +1,209 @@
+"""Índice de arquivos temporários compartilhado (SQLite/WAL no TEMP_DIR).
+
+Duas instâncias de FileManager no mesmo diretório simulam dois workers do
+uvicorn (ou o mesmo worker antes e depois de um restart).
+"""
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+
+from services.file_manager import ORPHAN_GRACE_SECONDS, SCRATCH_GRACE_SECONDS, FileManager
+
+
+def test_arquivo_de_um_worker_visivel_no_outro(tmp_path):
+    a = FileManager(tmp_path)
+    b = FileManager(tmp_path)
+
+    fid = a.store(b"%PDF-1.7 conteudo", "peticao.pdf")
+
+    assert b.get_bytes(fid) == b"%PDF-1.7 conteudo"
+    assert b.get_info(fid)["filename"] == "peticao.pdf"
+    assert b.delete(fid)
+    assert a.get_info(fid) is None
+
+
+def test_indice_sobrevive_a_restart(tmp_path):
+    fid = FileManager(tmp_path).store(b"abc", "x.pdf")
+
+    restarted = FileManager(tmp_path)
+    restarted.reconcile()
+
+    assert restarted.get_bytes(fid) == b"abc"
+
+
+def test_reconcile_remove_entradas_sem_arquivo_e_orfaos_antigos(tmp_path):
+    fm = FileManager(tmp_path)
+    gone = fm.store(b"1", "a.pdf")
+    os.unlink(fm.get_info(gone)["path"])
+
+    old_orphan = tmp_path / "0123456789ab.pdf"
+    old_orphan.write_bytes(b"perdido no crash")
+    past = time.time() - ORPHAN_GRACE_SECONDS - 10
+    os.utime(old_orphan, (past, past))
+    fresh_orphan = tmp_path / "ba9876543210.pdf"  # outro worker pode estar no meio do store()
+    fresh_orphan.write_bytes(b"recente")
+    unrelated = tmp_path / "nao-gerenciado.txt"
+    unrelated.write_text("fica")
+
+    fm.reconcile()
+
+    assert fm.get_info(gone) is None
+    assert not old_orphan.exists()
+    assert fresh_orphan.exists()
+    assert unrelated.exists()
+
+
+def test_resultado_gravado_em_scratch_e_adotado_sem_copia(tmp_path):
+    import fitz
+    from core.pdf_ops import rotate_pages
+
+    fm = FileManager(tmp_path)
+    with fitz.open() as doc:
+        doc.new_page()
+        src = fm.get_path(fm.store(doc.tobytes(), "a.pdf"))
+
+    with fm.scratch() as out:
+        size = rotate_pages(src, out, {0: 90})
+        fid = fm.store_file(out, "a_rotacionado.pdf")
+    with fm.scratch("") as parts:
+        parts.mkdir()
+        (parts / "0001.pdf").write_bytes(b"sobra")
+
+    assert fm.get_info(fid)["size"] == size
+    with fitz.open(fm.get_path(fid)) as doc:
+        assert doc[0].rotation == 90
+    assert list(fm.scratch_dir.iterdir()) == []
+
+
+def test_reconcile_remove_scratch_abandonado(tmp_path):
+    fm = FileManager(tmp_path)
+    old = fm.scratch_dir / "antigo.pdf"
+    old.write_bytes(b"worker morreu no meio do save")
+    past = time.time() - SCRATCH_GRACE_SECONDS - 10
+    os.utime(old, (past, past))
+    fresh = fm.scratch_dir / "recente.pdf"
+    fresh.write_bytes(b"save em andamento")
+
+    fm.reconcile()
+
+    assert not old.exists()
+    assert fresh.exists()
+
+
+def test_cleanup_expired(tmp_path, monkeypatch):
+    fm = FileManager(tmp_path)
+    fid = fm.store(b"abc", "x.pdf")
+    monkeypatch.setattr(time, "time", lambda: 10**10)
+
+    fm.cleanup_expired()
+
+    assert fm.get_info(fid) is None
+    assert list(tmp_path.glob("*.pdf")) == []
+
+
+def test_heap_expira_so_o_que_venceu(tmp_path, monkeypatch):
+    fm = FileManager(tmp_path)
+    monkeypatch.setattr(time, "time", lambda: 1000.0)
+    old = fm.store(b"a", "a.pdf")
+    monkeypatch.setattr(time, "time", lambda: 1600.0)
+    new = fm.store(b"b", "b.pdf")
+
+    # TTL padrão de 30 min: `old` vence em 2800, `new` em 3400.
+    monkeypatch.setattr(time, "time", lambda: 3000.0)
+    assert fm.next_expiry_delay() == 0
+    fm.cleanup_expired()
+
+    assert fm.get_info(old) is None
+    assert fm.get_info(new) is not None
+    assert fm.next_expiry_delay() == 300  # próximo prazo (400 s) limitado ao intervalo de varredura
+
+
+def test_orcamento_de_disco_evicta_lru(tmp_path, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "temp_disk_budget_mb", 1)
+    fm = FileManager(tmp_path)
+    half = b"x" * (400 * 1024)
+    a = fm.store(half, "a.pdf")
+    b = fm.store(half, "b.pdf")
+    fm.get_bytes(a)  # `a` passa a ser o mais recente
+
+    c = fm.store(half, "c.pdf")
+
+    assert fm.get_info(b) is None
+    assert fm.get_info(a) is not None and fm.get_info(c) is not None
+
+
+def test_cota_por_usuario_evicta_so_arquivos_do_proprio_usuario(tmp_path, monkeypatch):
+    from config import settings
+    from services.file_manager import StorageLimitError
+
+    monkeypatch.setattr(settings, "temp_user_quota_mb", 1)
+    fm = FileManager(tmp_path)
+    chunk = b"x" * (600 * 1024)
+    mine = fm.store(chunk, "a.pdf", owner="ana@soarespicon.adv.br")
+    other = fm.store(chunk, "b.pdf", owner="bia@soarespicon.adv.br")
+
+    fm.store(chunk, "c.pdf", owner="ana@soarespicon.adv.br")
+
+    assert fm.get_info(mine) is None
+    assert fm.get_info(other) is not None
+    with pytest.raises(StorageLimitError):
+        fm.store(b"x" * (2 * 1024 * 1024), "grande.pdf", owner="ana@soarespicon.adv.br")
+
+
+def test_copia_linkada_nao_conta_na_cota_ate_o_original_sair(tmp_path, monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "temp_user_quota_mb", 1)
+    fm = FileManager(tmp_path)
+    chunk = b"x" * (600 * 1024)
+    original = fm.store(chunk, "a.pdf", owner="ana@soarespicon.adv.br")
+
+    copy = fm.copy(original, "a-copia.pdf", owner="ana@soarespicon.adv.br")
+    mine = fm.store(b"y" * (300 * 1024), "b.pdf", owner="ana@soarespicon.adv.br")
+
+    # Os bytes são os mesmos no disco: a cópia não evictou nada.
+    assert os.path.samefile(fm.get_path(original), fm.get_path(copy))
+    assert fm.get_info(original) is not None and fm.get_info(mine) is not None
+    assert fm.get_bytes(copy) == chunk
+
+    # Sem o original, a cópia passa a pagar pelos bytes: o próximo store evicta.
+    fm.get_bytes(mine)  # a cópia passa a ser a menos usada
+    fm.delete(original)
+    fm.store(b"z" * (300 * 1024), "c.pdf", owner="ana@soarespicon.adv.br")
+    assert fm.get_info(copy) is None
+    assert fm.get_info(mine) is not None
+
+
+async def test_dono_vem_do_usuario_autenticado(tmp_path, monkeypatch):
+    from auth import get_current_user
+
+    monkeypatch.setenv("PROXY_SHARED_SECRET", "")
+    fm = FileManager(tmp_path)
+    await get_current_user(email="Ana@SoaresPicon.adv.br", oid=None, preferred=None, proxy_secret=None)
+
+    fid = fm.store(b"abc", "x.pdf")
+
+    assert fm.get_info(fid)["owner"] == "ana@soarespicon.adv.br"
+
+
+async def test_upload_acima_da_cota_responde_507(monkeypatch):
+    import httpx
+
+    from config import settings
+    from main import app
+
+    monkeypatch.setenv("PROXY_SHARED_SECRET", "")
+    monkeypatch.setattr(settings, "temp_user_quota_mb", 1)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/api/upload",
+            files={"files": ("grande.pdf", b"x" * (2 * 1024 * 1024), "application/pdf")},
+            headers={"X-Auth-Request-Email": "ana@soarespicon.adv.br"},
+        )
+    assert response.status_code == 507
+    assert "cota" in response.json()["detail"]
@@ -0,0 +1,58 @@
+"""Edições baratas (rotação, metadados) acrescentadas ao original sem reescrevê-lo."""
+from __future__ import annotations
+
+import fitz
+
+from services.file_manager import file_manager
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _pdf(pages: int = 3) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"pagina {i}")
+    return doc.tobytes()
+
+
+def test_rotacao_acrescenta_so_as_paginas_alteradas(tmp_path):
+    from core.pdf_ops import rotate_pages
+
+    src = tmp_path / "a.pdf"
+    src.write_bytes(_pdf())
+
+    size = rotate_pages(src, tmp_path / "rot.pdf", {1: 90})
+    out = (tmp_path / "rot.pdf").read_bytes()
+
+    assert out.startswith(src.read_bytes())
+    assert size == len(out)
+    with fitz.open(tmp_path / "rot.pdf") as doc:
+        assert [p.rotation for p in doc] == [0, 90, 0]
+
+
+def test_rotacao_com_optimize_reescreve(tmp_path):
+    from core.pdf_ops import rotate_pages
+
+    src = tmp_path / "a.pdf"
+    src.write_bytes(_pdf())
+
+    rotate_pages(src, tmp_path / "rot.pdf", {0: 180}, optimize=True)
+
+    assert not (tmp_path / "rot.pdf").read_bytes().startswith(src.read_bytes())
+
+
+async def test_perfil_none_so_edita_metadados():
+    from api.optimize import OptimizeRequest, optimize
+
+    original = _pdf()
+    fid = file_manager.store(original, "a.pdf")
+
+    res = await optimize(OptimizeRequest(file_id=fid, profile="none", metadata={"title": "Petição"}), _FakeRequest())
+
+    out = file_manager.get_bytes(res["result_file_id"])
+    assert out.startswith(original)
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        assert doc.metadata["title"] == "Petição"
@@ -0,0 +1,223 @@
+"""Otimização com tamanho-alvo (target_mb)."""
+from __future__ import annotations
+
+import random
+from functools import lru_cache
+
+import fitz
+import pytest
+
+from services import workers
+from services.file_manager import file_manager
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+@lru_cache(maxsize=1)
+def _scanned_pdf(pages: int = 3) -> bytes:
+    """PDF com uma "digitalização" JPEG por página (manchas coloridas, como foto)."""
+    rnd = random.Random(7)
+    doc = fitz.open()
+    for _ in range(pages):
+        canvas = fitz.open()
+        sheet = canvas.new_page(width=800, height=550)
+        for _ in range(300):
+            x, y = rnd.uniform(0, 780), rnd.uniform(0, 530)
+            sheet.draw_rect(fitz.Rect(x, y, x + rnd.uniform(2, 50), y + rnd.uniform(2, 50)),
+                            color=None, fill=(rnd.random(), rnd.random(), rnd.random()))
+        pix = sheet.get_pixmap(dpi=144)
+        canvas.close()
+        page = doc.new_page()
+        page.insert_image(page.rect, stream=pix.tobytes("jpeg", jpg_quality=95))
+    return doc.tobytes(garbage=4, deflate=True)
+
+
+@pytest.fixture
+def scanned_id(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "render_workers", 2)
+    fid = file_manager.store(_scanned_pdf(), "digitalizado.pdf")
+    yield fid
+    workers.shutdown()
+    file_manager.delete(fid)
+
+
+async def test_target_mb_cabe_no_alvo_com_um_save(scanned_id):
+    from api.optimize import OptimizeRequest, optimize
+
+    original = file_manager.get_info(scanned_id)["size"]
+    target_mb = original / 3 / (1024 * 1024)
+
+    res = await optimize(OptimizeRequest(file_id=scanned_id, target_mb=target_mb), _FakeRequest())
+
+    assert res["target_met"]
+    assert res["size_bytes"] <= res["target_bytes"]
+    assert res["attempts"] == 1
+    assert file_manager.get_info(res["result_file_id"])["size"] == res["size_bytes"]
+
+
+async def test_target_inalcancavel_devolve_o_menor_possivel(scanned_id):
+    from api.optimize import OptimizeRequest, optimize
+    from core.target_size import LADDER
+
+    res = await optimize(OptimizeRequest(file_id=scanned_id, target_mb=0.001), _FakeRequest())
+
+    assert not res["target_met"]
+    assert (res["max_image_dim"], res["jpeg_quality"]) == LADDER[-1]
+    assert res["size_bytes"] < res["original_size_bytes"]
+
+
+async def test_target_mb_nao_apaga_anexos_nem_binariza(scanned_id):
+    from api.optimize import OptimizeRequest, optimize
+
+    doc = fitz.open("pdf", file_manager.get_path(scanned_id).read_bytes())
+    doc.embfile_add("procuracao.docx", b"PK" * 5_000)
+    fid = file_manager.store(doc.tobytes(garbage=3, deflate=True), "com_anexo.pdf")
+    doc.close()
+    target_mb = file_manager.get_info(fid)["size"] / 3 / (1024 * 1024)
+    try:
+        res = await optimize(OptimizeRequest(file_id=fid, target_mb=target_mb), _FakeRequest())
+    finally:
+        file_manager.delete(fid)
+
+    assert res["target_met"]
+    out = fitz.open(file_manager.get_path(res["result_file_id"]))
+    assert out.embfile_names() == ["procuracao.docx"]
+    # Fotos coloridas continuam JPEG, não imagens de 1 bit.
+    assert {out.extract_image(img[0])["ext"] for img in out[0].get_images()} == {"jpeg"}
+    out.close()
+    file_manager.delete(res["result_file_id"])
+
+
+def _letterhead_pieces() -> fitz.Document:
+    """Três "peças" mescladas, cada uma com sua cópia do mesmo timbre."""
+    stamp = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 40), False)
+    stamp.set_rect(stamp.irect, (15, 61, 115))
+    stamp.set_rect(fitz.IRect(10, 10, 60, 30), (255, 255, 255))
+    merged = fitz.open()
+    for _ in range(3):
+        piece = fitz.open()
+        page = piece.new_page()
+        page.insert_image(fitz.Rect(56, 20, 176, 60), stream=stamp.tobytes("png"))
+        page.insert_text((72, 120), "Excelentíssimo Senhor Doutor Juiz")
+        merged.insert_pdf(piece)
+    return merged
+
+
+def test_dedupe_aponta_copias_para_um_xref():
+    from core.images import dedupe_images
+
+    doc = _letterhead_pieces()
+    xrefs = [img[0] for page in doc for img in page.get_images(full=True)]
+    assert len(set(xrefs)) == 3
+    # Mesmos pixels, bytes diferentes: a terceira cópia fica sem compressão.
+    raw = fitz.Pixmap(doc, xrefs[2]).samples
+    doc.update_stream(xrefs[2], raw, compress=False)
+    doc.xref_set_key(xrefs[2], "Filter", "null")
+
+    assert dedupe_images(doc) == 2
+
+    assert {img[0] for page in doc for img in page.get_images(full=True)} == {min(xrefs)}
+    out = fitz.open("pdf", doc.tobytes(garbage=3, deflate=True))
+    assert len({img[0] for page in out for img in page.get_images(full=True)}) == 1
+
+
+def _text_scan_rgb() -> fitz.Pixmap:
+    """Texto preto em papel branco, salvo em RGB como um scanner faria."""
+    tmp = fitz.open()
+    page = tmp.new_page()
+    page.insert_textbox(fitz.Rect(56, 56, 540, 780), "Vistos, etc. " * 300, fontsize=11)
+    return page.get_pixmap(dpi=150)
+
+
+def test_classify_tones():
+    from core.images import classify_tones
+
+    text = _text_scan_rgb()
+    gradient = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 256, 64), False)
+    for x in range(0, 256, 8):
+        gradient.set_rect(fitz.IRect(x, 0, x + 8, 64), (x, x, x))
+    colorful = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    colorful.set_rect(fitz.IRect(0, 0, 32, 64), (200, 30, 30))
+    colorful.set_rect(fitz.IRect(32, 0, 64, 64), (30, 30, 200))
+
+    assert classify_tones(text) == "bilevel"
+    assert classify_tones(gradient) == "gray"
+    assert classify_tones(colorful) == "color"
+
+
+def test_recompress_reduz_texto_para_1_bit_e_cinza():
+    from core.pdf_ops import recompress_images
+
+    jpeg = _text_scan_rgb().tobytes("jpeg", jpg_quality=90)
+    sizes = {}
+    for mode in ("gray", "bilevel"):
+        doc = fitz.open()
+        doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=jpeg)
+        assert recompress_images(doc, jpeg_quality=75, max_dim=1700, reduce_colors=mode) == 1
+        img = doc[0].get_images(full=True)[0]
+        assert fitz.Pixmap(doc, img[0]).n == 1
+        assert img[4] == (1 if mode == "bilevel" else 8)
+        sizes[mode] = len(doc.xref_stream_raw(img[0]))
+
+    assert sizes["bilevel"] < sizes["gray"] < len(jpeg)
+
+
+def _office_pdf() -> bytes:
+    """Documento só de texto com fonte CJK inteira, XMP, miniatura e anexo."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_font(fontname="F0", fontbuffer=fitz.Font("cjk").buffer)
+    page.insert_text((72, 72), "Excelentíssimo Senhor Doutor Juiz", fontname="F0")
+    doc.set_xml_metadata("<x:xmpmeta>" + "gerado pelo editor " * 200 + "</x:xmpmeta>")
+    doc.embfile_add("rascunho.docx", b"PK" * 20_000)
+    thumb = doc.get_new_xref()
+    doc.update_object(thumb, "<<>>")
+    doc.update_stream(thumb, bytes(range(256)) * 64)
+    doc.xref_set_key(page.xref, "Thumb", f"{thumb} 0 R")
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+async def test_maximum_recorta_fontes_e_remove_recursos():
+    from api.optimize import OptimizeRequest, optimize
+
+    fid = file_manager.store(_office_pdf(), "peticao.pdf")
+    try:
+        res = await optimize(OptimizeRequest(file_id=fid, profile="maximum"), _FakeRequest())
+    finally:
+        file_manager.delete(fid)
+
+    cats = res["categories"]
+    assert cats["fonts"]["bytes"] < cats["fonts"]["original_bytes"] / 10
+    for name in ("metadata", "thumbnails", "attachments"):
+        assert cats[name]["original_bytes"] > 0 and cats[name]["bytes"] == 0
+    assert res["size_bytes"] < res["original_size_bytes"] / 10
+
+    out = fitz.open("pdf", file_manager.get_path(res["result_file_id"]).read_bytes())
+    assert "Excelentíssimo" in out[0].get_text()
+    assert out.embfile_count() == 0
+    file_manager.delete(res["result_file_id"])
+
+
+async def test_analise_estima_perfis_sem_salvar(scanned_id):
+    from api.optimize import analyze, optimize, OptimizeRequest
+
+    before = file_manager.get_path(scanned_id).read_bytes()
+    res = await analyze(scanned_id)
+
+    assert file_manager.get_path(scanned_id).read_bytes() == before
+    assert res["categories"]["images"] > 0.9 * res["size_bytes"]
+    assert [g["filter"] for g in res["images"]] == ["DCTDecode"]
+    # 1600 px de largura em 595 pt (a imagem mantém a proporção na página A4).
+    assert res["images"][0]["count"] == 3 and res["images"][0]["dpi_max"] == 194
+    assert len(res["pages"]) == 3
+    est = {name: e["estimated_size_bytes"] for name, e in res["estimates"].items()}
+    assert est["maximum"] <= est["recommended"] <= est["light"] <= res["size_bytes"]
+
+    real = await optimize(OptimizeRequest(file_id=scanned_id, profile="recommended"), _FakeRequest())
+    assert abs(est["recommended"] - real["size_bytes"]) < 0.5 * real["size_bytes"]
+    file_manager.delete(real["result_file_id"])
@@ -0,0 +1,137 @@
+"""Índice do sumário: uma passada, compartilhado por metadados, scan, split e árvore sob demanda."""
+from __future__ import annotations
+
+import random
+
+import fitz
+import pytest
+from fastapi import HTTPException
+
+from api.outline import get_outline, outline_at_page
+from api.split import SplitRequest, split
+from core.outline import ROOT, OutlineIndex
+from core.pdf_scanner import get_bookmark_ranges
+from services.file_manager import file_manager
+from services.preprocess import OUTLINE_KEY, cached, forget_outline, outline_for
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _ranges_quadraticos(toc, page_count):
+    # Cópia da busca antiga (O(n²)) de get_bookmark_ranges, como referência.
+    res = []
+    for i, (lvl, title, page1) in enumerate(toc):
+        if not (1 <= page1 <= page_count):
+            continue
+        start0, end0 = page1 - 1, page_count - 1
+        for j in range(i + 1, len(toc)):
+            if toc[j][0] <= lvl:
+                end0 = toc[j][2] - 2
+                break
+        end0 = max(start0, min(end0, page_count - 1))
+        res.append((f"bm_{i}_{page1}", start0, end0, lvl, title))
+    return res
+
+
+def _toc_aleatorio(rng: random.Random, n: int, page_count: int):
+    toc, level, page = [], 1, 1
+    for i in range(n):
+        level = rng.randint(1, level + 1)
+        page = min(page + rng.choice((0, 0, 1, 2, 5)), page_count)
+        # Algumas entradas apontam para fora do documento.
+        target = rng.choice((page, page, page, 0, page_count + 3))
+        toc.append([level, f"M{i}", target])
+    return toc
+
+
+def _processo(pages: int, toc) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Folha {i + 1}")
+    doc.set_toc(toc)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+TOC = [
+    [1, "Petição inicial", 1],
+    [2, "Procuração", 2],
+    [2, "Documentos", 3],
+    [1, "Contestação", 5],
+    [1, "Sentença", 7],
+]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_intervalos_iguais_aos_da_busca_antiga(seed):
+    rng = random.Random(seed)
+    page_count = rng.randint(1, 40)
+    toc = _toc_aleatorio(rng, rng.randint(0, 120), page_count)
+
+    ranges = OutlineIndex(toc, page_count).ranges()
+    assert [(r["id"], r["start_page_0_idx"], r["end_page_0_idx"], r["level"], r["title"]) for r in ranges] == \
+        _ranges_quadraticos(toc, page_count)
+
+
+def test_arvore_paginada_e_busca_por_pagina():
+    index = OutlineIndex(TOC, 8)
+
+    top = index.children_of(ROOT)
+    assert [(n["title"], n["child_count"]) for n in top] == [("Petição inicial", 2), ("Contestação", 0), ("Sentença", 0)]
+    assert [n["title"] for n in index.children_of(0, offset=1, limit=5)] == ["Documentos"]
+    assert (top[0]["start_page_0_idx"], top[0]["end_page_0_idx"]) == (0, 3)
+
+    assert [n["title"] for n in index.at_page(2)] == ["Petição inicial", "Documentos"]
+    assert [n["title"] for n in index.at_page(0)] == ["Petição inicial"]
+    assert [n["title"] for n in index.at_page(7)] == ["Sentença"]
+    assert OutlineIndex.from_dict(index.to_dict()).ranges() == index.ranges()
+
+
+def test_pdf_sem_sumario():
+    doc = fitz.open()
+    doc.new_page()
+    assert get_bookmark_ranges(doc) == []
+    assert OutlineIndex.from_doc(doc).at_page(0) == []
+    doc.close()
+
+
+async def test_endpoint_da_arvore_usa_o_indice_guardado():
+    fid = file_manager.store(_processo(8, TOC), "processo.pdf")
+
+    top = await get_outline(fid, parent=ROOT, offset=0, limit=2)
+    assert (top["entries"], top["total"], top["page_count"]) == (5, 3, 8)
+    assert [n["title"] for n in top["children"]] == ["Petição inicial", "Contestação"]
+    assert cached(fid, OUTLINE_KEY)["toc"][0] == [1, "Petição inicial", 1]
+
+    kids = await get_outline(fid, parent=0, offset=0, limit=200)
+    assert [n["title"] for n in kids["children"]] == ["Procuração", "Documentos"]
+
+    path = await outline_at_page(fid, 1)
+    assert [n["title"] for n in path["path"]] == ["Petição inicial", "Procuração"]
+
+    with pytest.raises(HTTPException) as exc:
+        await get_outline(fid, parent=99, offset=0, limit=200)
+    assert exc.value.status_code == 404
+    with pytest.raises(HTTPException) as exc:
+        await outline_at_page(fid, 8)
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        await get_outline("nao-existe", parent=ROOT, offset=0, limit=200)
+    assert exc.value.status_code == 404
+
+
+async def test_split_por_marcador_nao_rele_o_sumario(monkeypatch):
+    fid = file_manager.store(_processo(8, TOC), "processo.pdf")
+    assert len(outline_for(fid)) == 5
+    forget_outline(fid)  # só o cache de derivados: nada na memória
+
+    def _sem_get_toc(self, *a, **k):
+        raise AssertionError("get_toc relido")
+
+    monkeypatch.setattr(fitz.Document, "get_toc", _sem_get_toc)
+    result = await split(SplitRequest(file_id=fid, mode="bookmark", value=1), _FakeRequest())
+    assert result["parts"] == 3
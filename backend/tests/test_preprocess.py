@@ -0,0 +1,137 @@
+"""Pré-processamento em segundo plano após o upload."""
+from __future__ import annotations
+
+import re
+
+import fitz
+import pytest
+
+from services.file_manager import file_manager
+from services.preprocess import META_KEY, SCAN_KEY, TEXT_KEY, cached, preprocessor, thumbs_key
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _pdf(pages: int = 4) -> bytes:
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), "SENTENÇA" if i == 2 else f"pagina {i}")
+    return doc.tobytes()
+
+
+@pytest.fixture
+async def running(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "preprocess_workers", 1)
+    monkeypatch.setattr(settings, "preprocess_thumbnails", 2)
+    preprocessor.start()
+    yield preprocessor
+    await preprocessor.stop()
+
+
+async def test_resultados_prontos_antes_do_clique(running):
+    from api.scan import scan
+    from api.thumbnails import get_thumbnails
+    from config import settings
+
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    assert running.enqueue(fid)
+    await running.join()
+
+    assert cached(fid, META_KEY)["pages"] == 4
+    assert len(cached(fid, TEXT_KEY)) == 4
+    assert [p["start_page_0_idx"] for p in cached(fid, SCAN_KEY)["pieces"]] == [2]
+    assert [t["page"] for t in cached(fid, thumbs_key(settings.thumbnail_dpi))] == [0, 1]
+
+    res = await scan(fid)
+    assert res["pieces"] == cached(fid, SCAN_KEY)["pieces"]
+    thumbs = await get_thumbnails(fid, page_start=0, page_end=1, dpi=settings.thumbnail_dpi)
+    assert thumbs["thumbnails"] == cached(fid, thumbs_key(settings.thumbnail_dpi))
+    file_manager.delete(fid)
+
+
+async def test_arquivo_apagado_descarta_o_trabalho(running):
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    running.enqueue(fid)
+    file_manager.delete(fid)  # o próprio delete cancela o pré-processamento
+    await running.join()
+
+    assert not (file_manager.derived_dir / fid).exists()
+
+
+async def test_expiracao_por_ttl_fecha_o_documento_e_cancela(running, monkeypatch):
+    import asyncio
+    import time
+
+    from config import settings
+    from services.doc_pool import doc_pool
+    from services.preprocess import _outlines, outline_for
+
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    outline_for(fid)
+    with doc_pool.borrow(fid, file_manager.get_path(fid)) as doc:
+        pass
+    assert fid in _outlines
+
+    ttl = settings.temp_file_ttl_minutes * 60
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + ttl + 1)
+    # A varredura roda numa thread, como no cleanup_loop.
+    await asyncio.to_thread(file_manager.sweep_expired)
+    await asyncio.sleep(0)
+
+    assert file_manager.get_info(fid) is None
+    assert doc.is_closed
+    assert fid not in _outlines
+    assert fid in running._cancelled
+
+
+def test_derivado_de_arquivo_apagado_nao_e_gravado():
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    file_manager.delete(fid)
+
+    assert not file_manager.put_derived(fid, META_KEY, b"{}")
+    assert not (file_manager.derived_dir / fid).exists()
+
+
+async def test_diff_usa_o_texto_extraido(running, monkeypatch):
+    from api.diff import DiffRequest, diff
+    from core import diff as core_diff
+
+    a = file_manager.store(_pdf(), "a.pdf")
+    b = file_manager.store(_pdf(5), "b.pdf")
+    running.enqueue(a)
+    running.enqueue(b)
+    await running.join()
+    expected = core_diff.compare_pdfs(file_manager.get_path(a), file_manager.get_path(b))
+
+    def _sem_abrir(src):
+        raise AssertionError("PDF reaberto para extrair texto")
+
+    monkeypatch.setattr(core_diff, "open_pdf", _sem_abrir)
+    res = await diff(DiffRequest(file_id_a=a, file_id_b=b), _FakeRequest())
+    # Só as âncoras mudam (o HtmlDiff numera cada instância).
+    anchors = re.compile(r"(from|to)\d+_")
+    assert anchors.sub("", res.body.decode()) == anchors.sub("", expected)
+    assert "pagina&nbsp;4" in expected
+    file_manager.delete(a)
+    file_manager.delete(b)
+
+
+async def test_pdf_danificado_ganha_copia_normalizada(running):
+    from services.preprocess import source_path
+
+    data = _pdf()
+    broken = data[:data.rindex(b"xref")]  # sem tabela de xref: o MuPDF reconstrói
+    fid = file_manager.store(broken, "danificado.pdf")
+    running.enqueue(fid)
+    await running.join()
+
+    assert cached(fid, META_KEY)["normalized"]
+    with fitz.open(source_path(fid)) as doc:
+        assert not doc.is_repaired
+        assert doc.page_count == 4
+    file_manager.delete(fid)
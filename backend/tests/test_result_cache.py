@@ -0,0 +1,111 @@
+"""Memoização de resultados por (hash da entrada, operação, parâmetros, versão)."""
+from __future__ import annotations
+
+import time
+
+import fitz
+
+from services.file_manager import file_manager
+
+
+class _FakeRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def _pdf() -> bytes:
+    doc = fitz.open()
+    for i in range(3):
+        doc.new_page().insert_text((72, 72), f"pagina {i}")
+    return doc.tobytes()
+
+
+async def test_mesmo_conteudo_e_parametros_reaproveita_o_resultado():
+    from api.bates import BatesRequest, bates
+
+    data = _pdf()
+    mine = file_manager.store(data, "processo.pdf")
+    colleague = file_manager.store(data, "copia.pdf")
+
+    first = await bates(BatesRequest(file_id=mine), _FakeRequest())
+    again = await bates(BatesRequest(file_id=colleague, start_doc_idx=1), _FakeRequest())
+    other = await bates(BatesRequest(file_id=mine, start_doc_idx=2), _FakeRequest())
+
+    assert "cached" not in first
+    assert again["cached"]
+    assert file_manager.get_bytes(again["result_file_id"]) == file_manager.get_bytes(first["result_file_id"])
+    assert other["result_file_id"] != first["result_file_id"]
+
+
+async def test_acerto_usa_o_nome_do_pedido_atual():
+    from api.optimize import OptimizeRequest, optimize
+
+    data = _pdf()
+    mine = file_manager.store(data, "processo_sigiloso.pdf")
+    colleague = file_manager.store(data, "copia.pdf")
+
+    first = await optimize(OptimizeRequest(file_id=mine, profile="light"), _FakeRequest())
+    again = await optimize(OptimizeRequest(file_id=colleague, profile="light"), _FakeRequest())
+
+    assert again["cached"] and again["filename"] == "copia_otimizado.pdf"
+    assert file_manager.get_info(again["result_file_id"])["filename"] == "copia_otimizado.pdf"
+    assert file_manager.get_info(first["result_file_id"])["filename"] == "processo_sigiloso_otimizado.pdf"
+    # Apagar a cópia de um não tira o resultado do outro.
+    file_manager.delete(again["result_file_id"])
+    assert file_manager.get_path(first["result_file_id"]) is not None
+
+
+async def test_split_com_outro_nome_nao_reaproveita_o_zip():
+    from api.split import SplitRequest, split
+
+    data = _pdf()
+    first = await split(SplitRequest(file_id=file_manager.store(data, "processo.pdf"), mode="count", value=1), _FakeRequest())
+    other = await split(SplitRequest(file_id=file_manager.store(data, "copia.pdf"), mode="count", value=1), _FakeRequest())
+
+    assert "cached" not in other
+    assert other["filename"] == "copia_partes.zip" != first["filename"]
+
+
+def test_versao_cobre_os_routers_memoizados(monkeypatch):
+    from services import result_cache
+
+    original = result_cache._code_version()
+    optimize_py = result_cache._BACKEND_DIR / "api" / "optimize.py"
+    read_bytes = type(optimize_py).read_bytes
+    monkeypatch.setattr(
+        type(optimize_py), "read_bytes",
+        lambda self: read_bytes(self) + (b"# perfil novo" if self == optimize_py else b""),
+    )
+    assert result_cache._code_version() != original
+
+
+async def test_resultado_apagado_ou_perto_de_expirar_recalcula(monkeypatch):
+    from api.split import SplitRequest, split
+    from config import settings
+
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    req = SplitRequest(file_id=fid, mode="count", value=1)
+
+    first = await split(req, _FakeRequest())
+    file_manager.delete(first["result_file_id"])
+    second = await split(req, _FakeRequest())
+    assert "cached" not in second
+
+    ttl = settings.temp_file_ttl_minutes * 60
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + ttl * 0.9)
+    third = await split(req, _FakeRequest())
+    assert "cached" not in third
+    assert third["result_file_id"] != second["result_file_id"]
+
+
+async def test_saida_com_senha_nunca_e_memoizada():
+    from api.optimize import OptimizeRequest, optimize
+
+    fid = file_manager.store(_pdf(), "processo.pdf")
+    req = OptimizeRequest(file_id=fid, profile="light", password="segredo")
+
+    first = await optimize(req, _FakeRequest())
+    second = await optimize(req, _FakeRequest())
+
+    assert "cached" not in second
+    assert second["result_file_id"] != first["result_file_id"]
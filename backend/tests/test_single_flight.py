@@ -0,0 +1,95 @@
+"""Coalescência de requisições idênticas concorrentes."""
+from __future__ import annotations
+
+import time
+import asyncio
+
+import fitz
+import pytest
+
+from services.file_manager import file_manager
+from services.single_flight import SingleFlight
+
+
+async def test_chamadas_concorrentes_compartilham_uma_execucao():
+    flights = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return {"ok": runs}
+
+    results = await asyncio.gather(*[flights.do("k", work) for _ in range(5)])
+    again = await flights.do("k", work)
+
+    assert runs == 2
+    assert all(r is results[0] for r in results)
+    assert again == {"ok": 2}
+    assert not flights.in_flight("k")
+
+
+async def test_excecao_chega_a_todos_e_desistencia_nao_cancela_os_outros():
+    flights = SingleFlight()
+    gate = asyncio.Event()
+
+    async def fails():
+        await gate.wait()
+        raise ValueError("PDF inválido")
+
+    first = asyncio.ensure_future(flights.do("k", fails))
+    second = asyncio.ensure_future(flights.do("k", fails))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    assert flights.in_flight("k")
+
+    gate.set()
+    with pytest.raises(ValueError):
+        await second
+    assert first.cancelled()
+
+
+async def test_ultimo_participante_que_desiste_cancela_o_trabalho():
+    flights = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiter = asyncio.ensure_future(flights.do("k", slow))
+    await started.wait()
+    waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert not flights.in_flight("k")
+
+
+async def test_metadata_repetido_abre_o_pdf_uma_vez(monkeypatch):
+    from api import files
+
+    doc = fitz.open()
+    doc.new_page()
+    fid = file_manager.store(doc.tobytes(), "a.pdf")
+    opened = []
+    real = files._read_metadata
+
+    def slow_read(file_id):
+        # get_path roda numa thread: os pedidos chegam em momentos diferentes;
+        # a leitura dura o bastante para todos encontrarem a execução em voo.
+        opened.append(file_id)
+        time.sleep(0.2)
+        return real(file_id)
+
+    monkeypatch.setattr(files, "_read_metadata", slow_read)
+
+    results = await asyncio.gather(*[files.get_metadata(fid) for _ in range(4)])
+
+    assert len(opened) == 1
+    assert {r["pages"] for r in results} == {1}
@@ -0,0 +1,169 @@
+"""Backends de armazenamento (services/storage.py).
+
+Os testes de S3 rodam contra um MinIO local e são pulados sem ele:
+
+    docker compose -f docker-compose.minio.yml up -d
+    S3_TEST_ENDPOINT=http://localhost:9000 pytest tests/test_storage.py
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+
+import pytest
+
+from services.file_manager import FileManager
+from services.storage import DiskCache, LocalStorage, StorageBackend
+
+
+def test_local_range_e_delete(tmp_path):
+    st = LocalStorage(tmp_path)
+    src = tmp_path / "x.part"
+    src.write_bytes(b"0123456789")
+
+    st.put("abc.pdf", src, {})
+
+    assert st.read_range("abc.pdf", 2, 3) == b"234"
+    assert st.local_path("abc.pdf").read_bytes() == b"0123456789"
+    st.delete("abc.pdf")
+    assert not st.exists("abc.pdf")
+    with pytest.raises(FileNotFoundError):
+        st.local_path("abc.pdf")
+
+
+def test_backend_incompleto_nao_instancia():
+    class SemDelete(StorageBackend):
+        def put(self, name, src, meta): ...
+        def local_path(self, name): ...
+        def read_range(self, name, start, length): ...
+        def exists(self, name): ...
+
+    with pytest.raises(TypeError):
+        SemDelete()
+
+
+class _Remoto(StorageBackend):
+    """Backend remoto mínimo: só registra as buscas por arquivos de outro nó."""
+
+    is_local = False
+
+    def __init__(self):
+        self.lookups = []
+
+    def put(self, name, src, meta): ...
+    def local_path(self, name): raise FileNotFoundError(name)
+    def read_range(self, name, start, length): raise FileNotFoundError(name)
+    def delete(self, name): ...
+    def exists(self, name): return False
+
+    def lookup(self, file_id):
+        self.lookups.append(file_id)
+        return None
+
+
+def test_id_fora_do_formato_nao_consulta_o_backend(tmp_path):
+    remote = _Remoto()
+    fm = FileManager(tmp_path, storage=remote)
+
+    for bad in ("a", "3f", "../index.sqlite3", "0123456789abcdef"):
+        assert fm.get_info(bad) is None
+    assert fm.get_info("0123456789ab") is None
+    assert remote.lookups == ["0123456789ab"]
+
+
+class _ListagemFalsa:
+    """``list_objects_v2``/``head_object`` de um bucket com dois objetos."""
+
+    def __init__(self, *names):
+        self.names = names
+        self.listed = []
+
+    def list_objects_v2(self, Bucket, Prefix, MaxKeys):
+        self.listed.append(Prefix)
+        keys = [n for n in self.names if n.startswith(Prefix)]
+        return {"Contents": [{"Key": k, "Size": 3, "LastModified": None} for k in keys[:MaxKeys]]}
+
+    def head_object(self, Bucket, Key):
+        return {"Metadata": {"created-at": "1", "filename": Key}, "ContentType": "application/pdf", "ContentLength": 3}
+
+
+def test_s3_lookup_exige_id_completo(tmp_path):
+    pytest.importorskip("boto3")
+    from services.storage import S3Storage
+
+    client = _ListagemFalsa("0123456789abcdef01.pdf", "0123456789ab.pdf")
+    st = S3Storage(bucket="b", cache_dir=tmp_path / "cache", cache_max_bytes=1024, client=client)
+
+    assert st.lookup("01") is None and client.listed == []
+    # Prefixo de 12 hex que também é prefixo de outro objeto: só o nome exato vale.
+    assert st.lookup("0123456789ab")[0] == "0123456789ab.pdf"
+    assert st.lookup("0123456789ac") is None
+
+
+def test_disk_cache_descarta_o_menos_usado(tmp_path):
+    cache = DiskCache(tmp_path / "cache", max_bytes=25)
+    for i, name in enumerate(["a", "b"]):
+        src = tmp_path / f"{name}.part"
+        src.write_bytes(b"x" * 10)
+        cache.adopt(name, src)
+        past = time.time() - 100 + i
+        os.utime(cache.path(name), (past, past))
+
+    cache.get("a")  # `a` volta a ser o mais recente
+    src = tmp_path / "c.part"
+    src.write_bytes(b"x" * 10)
+    cache.adopt("c", src)
+
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.get("b") is None
+
+
+@pytest.fixture
+def s3_storage_factory(tmp_path):
+    endpoint = os.environ.get("S3_TEST_ENDPOINT")
+    if not endpoint:
+        pytest.skip("S3_TEST_ENDPOINT não configurado (MinIO local)")
+    pytest.importorskip("boto3")
+    from services.storage import S3Storage
+
+    bucket = os.environ.get("S3_TEST_BUCKET", "pdf-tests")
+    prefix = f"t-{uuid.uuid4().hex[:8]}/"
+
+    def make(node: str) -> S3Storage:
+        st = S3Storage(
+            bucket=bucket,
+            prefix=prefix,
+            endpoint_url=endpoint,
+            region="us-east-1",
+            access_key=os.environ.get("S3_TEST_ACCESS_KEY", "minioadmin"),
+            secret_key=os.environ.get("S3_TEST_SECRET_KEY", "minioadmin"),
+            cache_dir=tmp_path / node / "cache",
+            cache_max_bytes=64 * 1024 * 1024,
+            revalidate_s=0,
+        )
+        try:
+            st.client.create_bucket(Bucket=bucket)
+        except Exception:
+            pass
+        return st
+
+    return make
+
+
+def test_s3_arquivo_gravado_num_no_e_lido_no_outro(tmp_path, s3_storage_factory):
+    node_a = FileManager(tmp_path / "a", storage=s3_storage_factory("a"))
+    node_b = FileManager(tmp_path / "b", storage=s3_storage_factory("b"))
+    payload = os.urandom(20 * 1024 * 1024)  # acima do limiar multipart
+
+    fid = node_a.store(payload, "Petição.pdf", owner="ana@soarespicon.adv.br")
+
+    info = node_b.get_info(fid)
+    assert info["filename"] == "Petição.pdf"
+    assert info["owner"] == "ana@soarespicon.adv.br"
+    assert node_b.storage.read_range(info["name"], 1000, 16) == payload[1000:1016]
+    assert node_b.get_bytes(fid) == payload  # agora via cache local de B
+    assert node_a.delete(fid)
+    # A cópia no cache de B é conferida no bucket antes de ser servida.
+    assert node_b.get_bytes(fid) is None
+    assert not node_b.storage.cache.path(info["name"]).exists()
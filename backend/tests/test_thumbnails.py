@@ -0,0 +1,130 @@
+"""Miniaturas: folha única (sprite) para a visão geral do processo."""
+from __future__ import annotations
+
+import base64
+import json
+
+import fitz
+import pytest
+
+from core.render import compose_sprite, render_tiles
+from services import workers
+from services.file_manager import file_manager
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    doc = fitz.open()
+    for i in range(7):
+        # Uma página em paisagem no meio: células têm o tamanho da maior miniatura.
+        page = doc.new_page(width=842 if i == 3 else 595, height=595 if i == 3 else 842)
+        page.insert_text((72, 72), f"Folha {i + 1}", fontsize=40)
+    path = tmp_path / "processo.pdf"
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_compose_sprite_posiciona_cada_pagina(pdf_path):
+    tiles = render_tiles(str(pdf_path), list(range(7)), 8)
+
+    image, layout = compose_sprite(tiles, columns=3)
+
+    sheet = fitz.Pixmap(image)
+    assert (sheet.width, sheet.height) == (layout["width"], layout["height"])
+    assert layout["columns"] == 3
+    assert [t["page"] for t in layout["tiles"]] == list(range(7))
+    cell_w = max(t["width"] for t in layout["tiles"])
+    cell_h = max(t["height"] for t in layout["tiles"])
+    assert layout["tiles"][4]["x"] == cell_w and layout["tiles"][4]["y"] == cell_h
+    assert layout["height"] == 3 * cell_h
+
+
+async def test_sprite_renderiza_em_paralelo_e_fica_em_cache(pdf_path, monkeypatch):
+    from api.thumbnails import get_thumbnail_sprite
+    from config import settings
+
+    monkeypatch.setattr(settings, "render_workers", 2)
+    fid = file_manager.store(pdf_path.read_bytes(), "processo.pdf")
+    try:
+        first = await get_thumbnail_sprite(fid, page_start=0, page_end=None, dpi=8, columns=4)
+        assert first["page_end"] == 6
+        assert len(first["tiles"]) == 7
+        assert base64.b64decode(first["sprite"].split(",", 1)[1])[:2] == b"\xff\xd8"  # JPEG
+
+        assert file_manager.get_derived(fid, "sprite-0-6-8-4.json") is not None
+        assert await get_thumbnail_sprite(fid, page_start=0, page_end=None, dpi=8, columns=4) == first
+    finally:
+        workers.shutdown()
+        file_manager.delete(fid)
+
+    assert not (file_manager.derived_dir / fid).exists()
+
+
+class _FakeRequest:
+    def __init__(self, disconnect_after: int | None = None):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.disconnect_after is not None and self.polls > self.disconnect_after
+
+
+async def test_stream_emite_cada_pagina_e_para_quando_cliente_sai(pdf_path, monkeypatch):
+    from api.thumbnails import _stream_thumbnails
+    from config import settings
+
+    monkeypatch.setattr(settings, "render_workers", 1)
+    try:
+        lines = [json.loads(line) async for line in _stream_thumbnails(_FakeRequest(), str(pdf_path), list(range(7)), 36)]
+        assert sorted(t["page"] for t in lines) == list(range(7))
+        assert all(t["data"].startswith("data:image/png;base64,") for t in lines)
+
+        partial = [line async for line in _stream_thumbnails(_FakeRequest(disconnect_after=1), str(pdf_path), list(range(7)), 36)]
+        assert 0 < len(partial) < 7
+    finally:
+        workers.shutdown()
+
+
+async def test_folha_limitada_pela_area_e_nao_so_pelas_paginas(pdf_path, monkeypatch):
+    from fastapi import HTTPException
+
+    from api import thumbnails
+    from config import settings
+
+    monkeypatch.setattr(settings, "render_workers", 2)
+    fid = file_manager.store(pdf_path.read_bytes(), "processo.pdf")
+    try:
+        estimate = thumbnails._sprite_pixels(fid, str(file_manager.get_path(fid)), list(range(7)), 36, 4)
+        monkeypatch.setattr(thumbnails, "MAX_SPRITE_PIXELS", estimate)
+        sprite = await thumbnails.get_thumbnail_sprite(fid, page_start=0, page_end=None, dpi=36, columns=4)
+        # A estimativa cobre a folha montada e as amostras que o processo principal segura.
+        assert sprite["width"] * sprite["height"] <= estimate
+        assert sum(t["width"] * t["height"] for t in sprite["tiles"]) <= estimate
+
+        monkeypatch.setattr(thumbnails, "MAX_SPRITE_PIXELS", estimate - 1)
+        with pytest.raises(HTTPException) as exc:
+            await thumbnails.get_thumbnail_sprite(fid, page_start=0, page_end=None, dpi=36, columns=5)
+        assert exc.value.status_code == 400
+    finally:
+        workers.shutdown()
+        file_manager.delete(fid)
+
+
+def test_maior_folha_aceita_cabe_no_orcamento_de_memoria(tmp_path):
+    from api import thumbnails
+
+    doc = fitz.open()
+    for _ in range(thumbnails.MAX_SPRITE_PAGES):
+        doc.new_page(width=595, height=842)
+    fid = file_manager.store(doc.tobytes(), "a4.pdf")
+    doc.close()
+    path, pages = str(file_manager.get_path(fid)), list(range(thumbnails.MAX_SPRITE_PAGES))
+    try:
+        # Amostras RGB das miniaturas + folha montada: ~6 bytes por pixel aceito.
+        assert thumbnails.MAX_SPRITE_PIXELS * 6 <= 160 * 1024 * 1024
+        assert thumbnails._sprite_pixels(fid, path, pages, 8, 25) <= thumbnails.MAX_SPRITE_PIXELS
+        assert thumbnails._sprite_pixels(fid, path, pages, 36, 100) > thumbnails.MAX_SPRITE_PIXELS
+    finally:
+        file_manager.delete(fid)
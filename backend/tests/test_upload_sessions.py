@@ -0,0 +1,192 @@
+"""Upload resumível (services/upload_sessions.py) e downloads com Range."""
+from __future__ import annotations
+
+import fcntl
+import hashlib
+
+import pytest
+from fastapi import HTTPException
+
+from api.files import _parse_range
+from services.file_manager import FileManager
+from services.upload_sessions import OffsetMismatch, SessionBusy, UploadSessions
+
+
+async def _body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _dropped(chunk: bytes):
+    yield chunk
+    raise ConnectionResetError("VPN caiu")
+
+
+async def test_upload_retoma_do_offset_confirmado(tmp_path):
+    sessions = UploadSessions(FileManager(tmp_path))
+    payload = bytes(range(256)) * 40
+    s = sessions.create("peticao.pdf", len(payload), "application/pdf", None)
+
+    with pytest.raises(ConnectionResetError):
+        await sessions.append(s["upload_id"], 0, _dropped(payload[:4000]))
+    assert sessions.get(s["upload_id"])["received"] == 4000
+
+    with pytest.raises(OffsetMismatch) as exc:
+        await sessions.append(s["upload_id"], 0, _body(payload))
+    assert exc.value.expected == 4000
+
+    await sessions.append(s["upload_id"], 4000, _body(payload[4000:]))
+    file_id, digest, _ = await sessions.finalize(s["upload_id"], hashlib.sha256(payload).hexdigest())
+
+    assert digest == hashlib.sha256(payload).hexdigest()
+    assert sessions.files.get_bytes(file_id) == payload
+    assert sessions.get(s["upload_id"]) is None
+
+
+async def test_bloco_em_outro_worker_recalcula_hash(tmp_path):
+    payload = b"%PDF-1.7 " + b"x" * 5000
+    a = UploadSessions(FileManager(tmp_path))
+    b = UploadSessions(FileManager(tmp_path))
+    s = a.create("x.pdf", len(payload), "application/pdf", None)
+
+    await a.append(s["upload_id"], 0, _body(payload[:3000]))
+    await b.append(s["upload_id"], 3000, _body(payload[3000:]))
+
+    with pytest.raises(ValueError):
+        await b.finalize(s["upload_id"], "0" * 64)
+    _, digest, _ = await b.finalize(s["upload_id"])
+    assert digest == hashlib.sha256(payload).hexdigest()
+
+
+async def test_sessao_em_uso_por_outro_worker_nao_intercala(tmp_path):
+    payload = b"%PDF-1.7 " + b"x" * 100
+    sessions = UploadSessions(FileManager(tmp_path))
+    s = sessions.create("x.pdf", len(payload), "application/pdf", None)
+    await sessions.append(s["upload_id"], 0, _body(payload))
+
+    # Outro processo gravando na mesma sessão (flock é por descritor aberto).
+    with open(sessions.dir / f"{s['upload_id']}.lock", "a+b") as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        with pytest.raises(SessionBusy):
+            await sessions.append(s["upload_id"], len(payload), _body(b""))
+        with pytest.raises(SessionBusy):
+            await sessions.finalize(s["upload_id"])
+        with pytest.raises(SessionBusy):
+            sessions.abort(s["upload_id"])
+        fcntl.flock(other, fcntl.LOCK_UN)
+
+    file_id, _, _ = await sessions.finalize(s["upload_id"])
+    assert sessions.files.get_bytes(file_id) == payload
+    assert not (sessions.dir / f"{s['upload_id']}.lock").exists()
+
+
+async def test_finalizar_incompleto_falha(tmp_path):
+    sessions = UploadSessions(FileManager(tmp_path))
+    s = sessions.create("x.pdf", 10, "application/pdf", None)
+    await sessions.append(s["upload_id"], 0, _body(b"12345"))
+
+    with pytest.raises(ValueError):
+        await sessions.finalize(s["upload_id"])
+    with pytest.raises(ValueError):
+        await sessions.append(s["upload_id"], 5, _body(b"123456"))  # passa do tamanho declarado
+
+
+async def test_sessao_ativa_nao_expira_pelo_tempo_de_criacao(tmp_path, monkeypatch):
+    import time
+
+    from config import settings
+
+    sessions = UploadSessions(FileManager(tmp_path))
+    payload = b"x" * 300
+    s = sessions.create("peticao.pdf", len(payload), "application/pdf", None)
+    idle = sessions.create("abandonado.pdf", 10, "application/pdf", None)
+    ttl = settings.temp_file_ttl_minutes * 60
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+
+    # VPN lenta: um bloco a cada 2/3 do TTL, bem depois do TTL desde a criação.
+    for i in range(3):
+        clock[0] += ttl * 2 / 3
+        await sessions.append(s["upload_id"], i * 100, _body(payload[i * 100:(i + 1) * 100]))
+        sessions.cleanup_expired()
+        assert sessions.get(s["upload_id"]) is not None
+    assert sessions.get(idle["upload_id"]) is None
+
+    file_id, _, _ = await sessions.finalize(s["upload_id"])
+    assert sessions.files.get_bytes(file_id) == payload
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=900-", (900, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=990-5000", (990, 999)),
+        ("bytes=0-9,20-29", None),  # multi-range: responde com o corpo inteiro
+        ("items=0-9", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+def test_range_fora_do_arquivo_e_416():
+    with pytest.raises(HTTPException) as exc:
+        _parse_range("bytes=1000-", 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
+
+
+async def _get(path: str, **headers):
+    import httpx
+
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers={"X-Auth-Request-Email": "ana@soarespicon.adv.br", **headers})
+
+
+async def test_download_com_range_sai_do_disco_em_streaming(monkeypatch):
+    from services.file_manager import file_manager
+
+    monkeypatch.setenv("PROXY_SHARED_SECRET", "")
+    payload = bytes(range(256)) * 4096
+    fid = file_manager.store(payload, "grande.pdf")
+
+    resumed = await _get(f"/api/download/{fid}", range="bytes=1000-")
+    assert resumed.status_code == 206
+    assert resumed.headers["content-range"] == f"bytes 1000-{len(payload) - 1}/{len(payload)}"
+    assert resumed.content == payload[1000:]
+    assert (await _get(f"/api/download/{fid}", range=f"bytes={len(payload)}-")).status_code == 416
+
+
+async def test_download_com_range_no_backend_remoto_le_em_pedacos(tmp_path, monkeypatch):
+    from api import files
+    from services.storage import LocalStorage
+
+    class Remoto(LocalStorage):
+        is_local = False
+        reads = []
+
+        def read_range(self, name, start, length):
+            self.reads.append(length)
+            with open(self.root / name, "rb") as fh:
+                fh.seek(start)
+                return fh.read(length)
+
+        def local_path(self, name):
+            raise AssertionError("retomada não deve baixar o objeto inteiro")
+
+    monkeypatch.setenv("PROXY_SHARED_SECRET", "")
+    monkeypatch.setattr(files, "RANGE_CHUNK_BYTES", 64 * 1024)
+    fm = FileManager(tmp_path, storage=Remoto(tmp_path / "bucket"))
+    monkeypatch.setattr(files, "file_manager", fm)
+    payload = bytes(range(256)) * 4096
+    fid = fm.store(payload, "grande.pdf")
+
+    resumed = await _get(f"/api/download/{fid}", range="bytes=100-")
+    assert resumed.status_code == 206
+    assert resumed.content == payload[100:]
+    assert resumed.headers["content-length"] == str(len(payload) - 100)
+    assert max(Remoto.reads) == 64 * 1024
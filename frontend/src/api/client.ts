@@ -10,8 +10,17 @@ function handleUnauthorized(): never {
   throw new Error("Redirecionando para o login (SSO)");
 }
 
+// Servidor ocupado (429): espera o Retry-After e tenta de novo algumas vezes.
+const MAX_BUSY_RETRIES = 3;
+const MAX_RETRY_AFTER_S = 30;
+
 async function request<T>(path: string, init?: RequestInit): Promise<T> {
-  const res = await fetch(`${BASE}${path}`, { ...init });
+  let res = await fetch(`${BASE}${path}`, { ...init });
+  for (let attempt = 0; res.status === 429 && attempt < MAX_BUSY_RETRIES; attempt++) {
+    const wait = Math.min(Number(res.headers.get("Retry-After")) || 1, MAX_RETRY_AFTER_S);
+    await new Promise((resolve) => setTimeout(resolve, wait * 1000));
+    res = await fetch(`${BASE}${path}`, { ...init });
+  }
   if (res.status === 401) handleUnauthorized();
   if (!res.ok) {
     const body = await res.json().catch(() => ({ detail: res.statusText }));
@@ -44,6 +53,8 @@ export interface OperationResult {
   result_file_id: string;
   filename: string;
   size_bytes: number;
+  // Resultado reaproveitado de uma execução idêntica (mesmo conteúdo e parâmetros).
+  cached?: boolean;
   [key: string]: unknown;
 }
 
@@ -63,6 +74,36 @@ export async function getMetadata(fileId: string) {
   return request<UploadResult & { pages: number }>(`/metadata/${fileId}`);
 }
 
+// --- Sumário (árvore sob demanda) ---
+
+export interface OutlineNode {
+  id: number;
+  title: string;
+  level: number;
+  page: number;
+  start_page_0_idx: number | null;
+  end_page_0_idx: number | null;
+  child_count: number;
+}
+
+/** Filhos diretos de `parent` (-1 = primeiro nível), uma página por vez. */
+export async function getOutline(fileId: string, parent = -1, offset = 0, limit = 200) {
+  return request<{
+    file_id: string;
+    page_count: number;
+    entries: number;
+    parent: number;
+    total: number;
+    offset: number;
+    children: OutlineNode[];
+  }>(`/outline/${fileId}?parent=${parent}&offset=${offset}&limit=${limit}`);
+}
+
+/** Caminho de marcadores (do primeiro nível ao mais profundo) que cobre a página (0-based). */
+export async function outlineAtPage(fileId: string, page: number) {
+  return request<{ file_id: string; page: number; path: OutlineNode[] }>(`/outline/${fileId}/page/${page}`);
+}
+
 // --- Operations ---
 
 export async function merge(body: {
@@ -138,14 +179,45 @@ export async function optimize(body: {
   password?: string;
   remove_annotations?: boolean;
   metadata?: Record<string, string>;
+  target_mb?: number;
 }) {
-  return request<OperationResult & { original_size_bytes: number; reduction_percent: number }>("/optimize", {
+  return request<
+    OperationResult & {
+      original_size_bytes: number;
+      reduction_percent: number;
+      categories: Record<string, { original_bytes: number; bytes: number }>;
+      target_met?: boolean;
+    }
+  >("/optimize", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(body),
   });
 }
 
+export interface OptimizeAnalysis {
+  file_id: string;
+  size_bytes: number;
+  page_count: number;
+  categories: Record<string, number>;
+  images: {
+    filter: string;
+    colorspace: string;
+    count: number;
+    bytes: number;
+    dpi_min: number | null;
+    dpi_max: number | null;
+  }[];
+  fonts: { name: string; bytes: number; subset: boolean }[];
+  pages: { page: number; bytes: number }[];
+  estimates: Record<string, { estimated_size_bytes: number; estimated_reduction_percent: number }>;
+}
+
+/** Pré-voo somente leitura: onde estão os bytes e quanto cada perfil deve reduzir. */
+export async function analyzeOptimize(fileId: string) {
+  return request<OptimizeAnalysis>(`/optimize/${fileId}/analysis`);
+}
+
 export async function bates(body: {
   file_id: string;
   text_pattern?: string;
@@ -197,6 +269,77 @@ export async function scan(fileId: string) {
   }>(`/scan?file_id=${fileId}`, { method: "POST" });
 }
 
+export interface BulkScanFile {
+  type: "file";
+  file_id: string;
+  filename: string;
+  page_count: number;
+  pieces: ScanPiece[];
+  bookmarks: unknown[];
+}
+
+export interface BulkScanError {
+  type: "error";
+  file_id: string;
+  detail: string;
+}
+
+export interface BulkScanIndexEntry {
+  file_id: string;
+  filename: string;
+  title: string;
+  start_page_0_idx: number;
+  end_page_0_idx: number;
+  unique_id: string;
+  preselect: boolean;
+}
+
+export interface BulkScanIndex {
+  type: "index";
+  files: number;
+  errors: number;
+  pages: number;
+  categories: Record<string, BulkScanIndexEntry[]>;
+}
+
+/** Triagem de um pacote: cada arquivo chega em `onFile` ao terminar; resolve com o índice agregado. */
+export async function bulkScan(
+  fileIds: string[],
+  onFile: (result: BulkScanFile | BulkScanError) => void,
+  signal?: AbortSignal
+): Promise<BulkScanIndex> {
+  const res = await fetch(`${BASE}/scan/bulk`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ file_ids: fileIds }),
+    signal,
+  });
+  if (res.status === 401) handleUnauthorized();
+  if (!res.ok || !res.body) {
+    const body = await res.json().catch(() => ({ detail: res.statusText }));
+    throw new Error(body.detail || `HTTP ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  let index: BulkScanIndex | null = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    for (const line of lines) {
+      if (!line) continue;
+      const item = JSON.parse(line) as BulkScanFile | BulkScanError | BulkScanIndex;
+      if (item.type === "index") index = item;
+      else onFile(item);
+    }
+  }
+  if (!index) throw new Error("Triagem interrompida");
+  return index;
+}
+
 export async function diff(body: { file_id_a: string; file_id_b: string }) {
   const res = await fetch(`${BASE}/diff`, {
     method: "POST",
@@ -211,6 +354,7 @@ export async function diff(body: { file_id_a: string; file_id_b: string }) {
 export async function imagesToPdf(body: {
   file_ids: string[];
   optimize?: boolean;
+  target_dpi?: number;
 }) {
   return request<OperationResult>("/images-to-pdf", {
     method: "POST",
@@ -236,3 +380,56 @@ export async function getThumbnails(
     `/thumbnails/${fileId}?page_start=${pageStart}&page_end=${pageEnd}&dpi=${dpi}`
   );
 }
+
+/** NDJSON: chama `onThumb` para cada página assim que ela termina de renderizar (ordem não garantida). */
+export async function streamThumbnails(
+  fileId: string,
+  pageStart: number,
+  pageEnd: number,
+  onThumb: (thumb: Thumbnail) => void,
+  signal?: AbortSignal,
+  dpi = 72
+) {
+  const res = await fetch(
+    `${BASE}/thumbnails/${fileId}/stream?page_start=${pageStart}&page_end=${pageEnd}&dpi=${dpi}`,
+    { signal }
+  );
+  if (res.status === 401) handleUnauthorized();
+  if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    for (const line of lines) if (line) onThumb(JSON.parse(line) as Thumbnail);
+  }
+}
+
+export interface SpriteTile {
+  page: number;
+  x: number;
+  y: number;
+  width: number;
+  height: number;
+}
+
+export interface ThumbnailSprite {
+  file_id: string;
+  page_start: number;
+  page_end: number;
+  dpi: number;
+  width: number;
+  height: number;
+  columns: number;
+  tiles: SpriteTile[];
+  sprite: string;
+}
+
+export async function getThumbnailSprite(fileId: string, pageStart = 0, pageEnd?: number, dpi = 8) {
+  const end = pageEnd === undefined ? "" : `&page_end=${pageEnd}`;
+  return request<ThumbnailSprite>(`/thumbnails/${fileId}/sprite?page_start=${pageStart}${end}&dpi=${dpi}`);
+}
@@ -9,6 +9,7 @@ const PROFILES = [
   { value: "light", label: "Leve", desc: "Compressao basica" },
   { value: "recommended", label: "Recomendado", desc: "Bom equilibrio" },
   { value: "maximum", label: "Maximo", desc: "Menor tamanho possivel" },
+  { value: "none", label: "Sem compressao", desc: "So metadados e anotacoes" },
 ];
 
 export function OptimizeTool() {
@@ -17,7 +18,9 @@ export function OptimizeTool() {
   const [password, setPassword] = useState("");
   const [removeAnnotations, setRemoveAnnotations] = useState(false);
   const [metadata, setMetadata] = useState({ title: "", author: "", subject: "" });
+  const [targetMb, setTargetMb] = useState("");
   const [reduction, setReduction] = useState<number | null>(null);
+  const [targetMissed, setTargetMissed] = useState(false);
 
   const file = files[0];
 
@@ -26,6 +29,7 @@ export function OptimizeTool() {
     setLoading(true);
     setError(null);
     setReduction(null);
+    setTargetMissed(false);
     try {
       const meta: Record<string, string> = {};
       if (metadata.title) meta.title = metadata.title;
@@ -38,9 +42,11 @@ export function OptimizeTool() {
         password: password || undefined,
         remove_annotations: removeAnnotations,
         metadata: Object.keys(meta).length > 0 ? meta : undefined,
+        target_mb: Number(targetMb) > 0 ? Number(targetMb) : undefined,
       });
       setResult(res.result_file_id, res.filename);
       setReduction(res.reduction_percent);
+      setTargetMissed(res.target_met === false);
     } catch (e) {
       setError(e instanceof Error ? e.message : "Erro ao otimizar");
     }
@@ -71,6 +77,14 @@ export function OptimizeTool() {
         </div>
       </div>
 
+      <div>
+        <label className="block text-sm font-medium text-gray-700 mb-2">
+          Tamanho maximo em MB (opcional, ex.: limite do tribunal)
+        </label>
+        <input type="number" min="0" step="0.5" placeholder="Ex.: 10" value={targetMb} onChange={(e) => setTargetMb(e.target.value)}
+          className="w-full border border-gray-300 rounded-lg px-3 py-2 text-sm focus:ring-2 focus:ring-[#5BA8D9] outline-none" />
+      </div>
+
       <label className="flex items-center gap-2 text-sm">
         <input type="checkbox" checked={removeAnnotations} onChange={(e) => setRemoveAnnotations(e.target.checked)} className="rounded" />
         Remover anotacoes
@@ -101,6 +115,11 @@ export function OptimizeTool() {
           Reducao de {reduction}% ({formatBytes(file?.size_bytes ?? 0)} original)
         </p>
       )}
+      {targetMissed && (
+        <p className="text-sm text-amber-600">
+          Nao foi possivel atingir o tamanho pedido; este e o menor resultado alcancado.
+        </p>
+      )}
     </ToolWrapper>
   );
 }
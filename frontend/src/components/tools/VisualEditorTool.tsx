@@ -1,6 +1,6 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import { usePdfStore } from "@/stores/pdf-store";
-import { getThumbnails, extract, remove, rotate, type Thumbnail } from "@/api/client";
+import { streamThumbnails, extract, remove, rotate, type Thumbnail } from "@/api/client";
 import { ToolWrapper } from "@/components/shared/ToolWrapper";
 import { RotateCw, Check, Trash2, FileOutput, Loader2 } from "lucide-react";
 
@@ -17,13 +17,25 @@ export function VisualEditorTool() {
   const file = files[0];
   const totalPages = file?.pages ?? 0;
 
+  const abortRef = useRef<AbortController | null>(null);
+
   const loadMore = useCallback(async () => {
     if (!file || loadingThumbs) return;
     setLoadingThumbs(true);
+    const controller = new AbortController();
+    abortRef.current = controller;
     try {
-      const res = await getThumbnails(file.file_id, loadedPages, loadedPages + PAGE_BATCH - 1);
-      setThumbs((prev) => [...prev, ...res.thumbnails]);
-      setLoadedPages((prev) => prev + res.thumbnails.length);
+      // Cada página aparece assim que fica pronta (podem chegar fora de ordem).
+      await streamThumbnails(
+        file.file_id,
+        loadedPages,
+        loadedPages + PAGE_BATCH - 1,
+        (thumb) => {
+          setThumbs((prev) => [...prev, thumb].sort((a, b) => a.page - b.page));
+          setLoadedPages((prev) => prev + 1);
+        },
+        controller.signal
+      );
     } catch {
       // ignore
     } finally {
@@ -31,6 +43,9 @@ export function VisualEditorTool() {
     }
   }, [file, loadedPages, loadingThumbs]);
 
+  // Sair da ferramenta cancela a renderização pendente no servidor.
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   useEffect(() => {
     if (file && thumbs.length === 0) {
       loadMore();